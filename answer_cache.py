@@ -0,0 +1,111 @@
+import hashlib
+import re
+import sys
+import time
+from collections import OrderedDict
+from config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_BYTES
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_query(query):
+    """Case-fold, collapse whitespace and drop trailing punctuation so near-identical questions share a key."""
+    return _WHITESPACE_RE.sub(" ", query.casefold()).strip().rstrip("?!. ")
+
+class AnswerCache:
+    """
+    LRU + TTL cache of Grok answers keyed by normalized query and the version of the context
+    (market snapshot, Tesla posts, system prompt) they were answered against.
+    Entries for an older context version are dropped as soon as a newer version is seen; an
+    answer that finishes after that (it was built from the older data) is not stored.
+    Context versions are tuples of counters that only increase.
+    Data only some queries include (e.g. the watchlist tickers a query mentions) is versioned
+    by `data_key` instead: it is part of the key but never invalidates other answers.
+    Args:
+        max_entries (int): Maximum number of answers kept.
+        ttl (float): Seconds an answer stays valid.
+        max_bytes (int): Approximate memory cap for the cached answers.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL, max_bytes=ANSWER_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (answer, expires_at, size)
+        self._bytes = 0
+        self._context_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @staticmethod
+    def _key(query, context_version, data_key):
+        return hashlib.sha256(f"{context_version}|{data_key}|{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def _observe_version(self, context_version):
+        """Move to a newer context version, dropping all answers. Returns False for an older version."""
+        current = self._context_version
+        if context_version == current:
+            return True
+        if current is not None and any(new < old for new, old in zip(context_version, current)):
+            return False
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+        self._context_version = context_version
+        return True
+
+    def get(self, query, context_version, data_key=None):
+        """Return the cached answer for this query, context and query-specific data, or None."""
+        if not self._observe_version(context_version):
+            self.misses += 1
+            return None
+        key = self._key(query, context_version, data_key)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._evict(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, query, context_version, answer, data_key=None):
+        """Cache an answer. Error replies and answers to a context that is no longer current are not cached."""
+        if not answer or answer.startswith("Error:"):
+            return
+        if context_version != self._context_version:
+            self.stale_puts += 1
+            return
+        key = self._key(query, context_version, data_key)
+        if key in self._entries:
+            self._evict(key)
+        size = sys.getsizeof(answer)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (answer, time.monotonic() + self.ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        """Return hit rate, saved API calls and memory use."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_api_calls": self.hits,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
+
+answer_cache = AnswerCache()
@@ -0,0 +1,459 @@
+"""
+Offline end-to-end benchmark for the mention pipeline.
+
+Drives bot.on_message with synthetic mention bursts against local stand-ins: fake Discord
+channels and messages, a local aiohttp server mimicking xAI's /v1/chat/completions (with
+configurable latency and optional SSE streaming) that also serves NewsAPI headlines, and
+stubbed yfinance responses.
+Reports p50/p95/p99 latency, throughput and upstream call counts. No network access or
+credentials are needed.
+
+Usage:
+    python benchmark.py --mentions 200 --burst 20 --grok-latency 0.3
+    python benchmark.py --stream --output bench_output.txt
+
+With --output, one JSON line per run (parameters, git commit, results) is appended, so runs
+with the same parameters can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BOT_USER_ID = 900000000000000001
+TESLA_CHANNEL_ID = 900000000000000002
+MENTION_CHANNEL_ID = 900000000000000003
+GUILD_ID = 900000000000000004
+
+NEWS_ETAG = '"bench-news-1"'
+
+calls = Counter()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the mention pipeline.")
+    parser.add_argument("--mentions", type=int, default=200, help="Total mentions to send.")
+    parser.add_argument("--burst", type=int, default=20, help="Mentions sent at once per burst.")
+    parser.add_argument("--burst-interval", type=float, default=0.0, help="Seconds between burst starts.")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users sending mentions.")
+    parser.add_argument("--unique-queries", type=int, default=0,
+                        help="Size of the query pool; 0 makes every query unique (no answer cache hits).")
+    parser.add_argument("--grok-latency", type=float, default=0.3, help="Seconds before the fake Grok answers.")
+    parser.add_argument("--grok-jitter", type=float, default=0.1, help="Random extra Grok latency, up to this many seconds.")
+    parser.add_argument("--stream", action="store_true", help="Use GROK_STREAMING=true against a streaming fake.")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="SSE chunks per streamed answer.")
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="Seconds between SSE chunks.")
+    parser.add_argument("--yfinance-latency", type=float, default=0.2, help="Seconds per stubbed yfinance call.")
+    parser.add_argument("--news-latency", type=float, default=0.2, help="Seconds per stubbed NewsAPI call.")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="Seconds per fake Discord send/edit.")
+    parser.add_argument("--cold", action="store_true", help="Do not pre-warm the market cache.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for jitter and query selection.")
+    parser.add_argument("--output", help="Append the results as one JSON line to this file.")
+    return parser.parse_args()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+# === Fake xAI and NewsAPI server ===
+
+class FakeUpstreamServer:
+    """
+    Minimal stand-in for xAI's /v1/chat/completions and NewsAPI's /v2/top-headlines (with ETag
+    revalidation), run on its own thread and event loop so its work
+    does not count against the bot's loop.
+    """
+
+    def __init__(self, port, latency, jitter, chunks, chunk_interval, news_latency, seed):
+        self.port = port
+        self.news_latency = news_latency
+        self.latency = latency
+        self.jitter = jitter
+        self.chunks = chunks
+        self.chunk_interval = chunk_interval
+        self._random = random.Random(seed)
+        self._ready = threading.Event()
+        self._loop = None
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+        body = await request.json()
+        calls["grok"] += 1
+        await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        prompt_tokens = sum(len(message["content"]) for message in body["messages"]) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": self.chunks * 5,
+            "prompt_tokens_details": {"cached_tokens": prompt_tokens // 2},
+        }
+        words = [f"word{i} " for i in range(self.chunks * 5)]
+        if not body.get("stream"):
+            return web.json_response({"choices": [{"message": {"content": "".join(words)}}], "usage": usage})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i in range(self.chunks):
+            chunk = {"choices": [{"delta": {"content": "".join(words[i * 5:(i + 1) * 5])}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.chunk_interval)
+        await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def _handle_news(self, request):
+        from aiohttp import web
+        calls["newsapi"] += 1
+        await asyncio.sleep(self.news_latency)
+        if request.headers.get("If-None-Match") == NEWS_ETAG:
+            return web.Response(status=304)
+        return web.json_response({"articles": [
+            {"title": f"Headline {i}", "source": {"name": "Bench Wire"}, "publishedAt": "2025-06-27T12:00:00Z"}
+            for i in range(3)
+        ]}, headers={"ETag": NEWS_ETAG})
+
+    def start(self):
+        threading.Thread(target=self._serve, name="fake-upstream", daemon=True).start()
+        self._ready.wait()
+
+    def _serve(self):
+        from aiohttp import web
+        self._loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle)
+        app.router.add_get("/v2/top-headlines", self._handle_news)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, "127.0.0.1", self.port).start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        future = asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop)
+        future.result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+# === Stubbed yfinance ===
+
+def fake_bars(start=None):
+    """Daily OHLCV bars on business days, from `start` or for the last 400 days."""
+    import numpy as np
+    import pandas as pd
+    end = pd.Timestamp.now(tz="America/New_York").normalize()
+    begin = pd.Timestamp(start, tz="America/New_York") if start else end - pd.Timedelta(days=400)
+    index = pd.bdate_range(begin, end, tz="America/New_York")
+    closes = 300 + 20 * np.sin(np.arange(len(index)) / 5)
+    return pd.DataFrame({
+        "Open": closes - 1, "High": closes + 2, "Low": closes - 2, "Close": closes, "Volume": 1e8,
+    }, index=index)
+
+class FakeTicker:
+    """Deterministic stand-in for yfinance.Ticker; every attribute access costs one simulated round trip."""
+    latency = 0.0
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def _call(self, kind):
+        calls[f"yfinance.{kind}"] += 1
+        time.sleep(self.latency)
+
+    @property
+    def info(self):
+        self._call("info")
+        price = {"TSLA": 320.0, "^VIX": 17.5, "SPY": 610.0}.get(self.symbol, 100.0)
+        return {
+            "regularMarketPrice": price, "previousClose": price * 0.99,
+            "marketCap": 1.03e12, "trailingPE": 180.2, "trailingEps": 1.76, "sharesOutstanding": 3.22e9,
+        }
+
+    @property
+    def fast_info(self):
+        from types import SimpleNamespace
+        self._call("fast_info")
+        price = {"TSLA": 320.0, "^VIX": 17.5, "SPY": 610.0}.get(self.symbol, 100.0)
+        return SimpleNamespace(last_price=price, previous_close=price * 0.99)
+
+    @property
+    def calendar(self):
+        self._call("calendar")
+        return {"Earnings Date": [datetime.now(timezone.utc).date() + timedelta(days=30)]}
+
+    def history(self, period=None, start=None, **kwargs):
+        self._call("history")
+        return fake_bars(start)
+
+    @property
+    def quarterly_financials(self):
+        import pandas as pd
+        self._call("quarterly_financials")
+        return pd.DataFrame(
+            {pd.Timestamp("2025-03-31"): [19.3e9, 409e6]}, index=["Total Revenue", "Net Income"]
+        )
+
+def fake_download(tickers, period=None, **kwargs):
+    """Stand-in for yf.download: one simulated round trip for the whole batch, columns as (field, ticker)."""
+    import pandas as pd
+    calls["yfinance.download"] += 1
+    time.sleep(FakeTicker.latency)
+    frames = {symbol: fake_bars() for symbol in tickers}
+    return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+def install_upstream_stubs(yfinance_latency):
+    import data_fetcher
+    import price_store
+
+    FakeTicker.latency = yfinance_latency
+    data_fetcher.yf.Ticker = FakeTicker
+    data_fetcher.yf.download = fake_download
+    price_store.yf.Ticker = FakeTicker
+
+# === Fake Discord objects ===
+
+class FakeUser:
+    def __init__(self, user_id, name, bot=False):
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeChannel:
+    """
+    A text channel as seen by the bot. Mentions each get their own instance (with a shared ID),
+    so the time of the first reply can be attributed to the mention.
+    """
+
+    def __init__(self, channel_id, send_latency, history=()):
+        self.id = channel_id
+        self.name = f"bench-{channel_id}"
+        self.send_latency = send_latency
+        self._history = list(history)
+        self.first_send_at = None
+
+    def typing(self):
+        return FakeTyping()
+
+    async def send(self, content=None, **kwargs):
+        calls["discord.send"] += 1
+        await asyncio.sleep(self.send_latency)
+        if self.first_send_at is None:
+            self.first_send_at = time.perf_counter()
+        return FakeMessage(next_snowflake(), content or "", BOT_USER, self, send_latency=self.send_latency)
+
+    async def fetch_message(self, message_id):
+        calls["discord.fetch_message"] += 1
+        for message in self._history:
+            if message.id == message_id:
+                return message
+        import discord
+        raise discord.errors.NotFound(FakeHTTPResponse(404), "Unknown Message")
+
+    async def history(self, limit=100):
+        calls["discord.history"] += 1
+        for message in sorted(self._history, key=lambda m: m.id, reverse=True)[:limit]:
+            yield message
+
+class FakeHTTPResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Not Found"
+
+class FakeMessage:
+    def __init__(self, message_id, content, author, channel, mentions=(), guild=None, send_latency=0.0):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.mentions = list(mentions)
+        self.guild = guild
+        self.reference = None
+        self.embeds = []
+        self.attachments = []
+        self.created_at = datetime.now(timezone.utc)
+        self.edited_at = None
+        self._send_latency = send_latency
+
+    async def edit(self, content=None, **kwargs):
+        calls["discord.edit"] += 1
+        await asyncio.sleep(self._send_latency)
+        self.content = content
+        self.edited_at = datetime.now(timezone.utc)
+        return self
+
+_snowflake = [1 << 40]
+
+def next_snowflake():
+    _snowflake[0] += 1 << 22
+    return _snowflake[0]
+
+BOT_USER = FakeUser(BOT_USER_ID, "hyperbullish", bot=True)
+
+def tesla_history(send_latency):
+    channel = FakeChannel(TESLA_CHANNEL_ID, send_latency)
+    author = FakeUser(800, "tesla_feed", bot=False)
+    start = datetime.now(timezone.utc) - timedelta(hours=12)
+    for i in range(30):
+        post = FakeMessage(next_snowflake(), f"Tesla update {i}: deliveries, FSD and energy storage news "
+                           f"https://x.com/Tesla/status/{1900000000000000000 + i}", author, channel)
+        post.created_at = start + timedelta(minutes=20 * i)
+        channel._history.append(post)
+    return channel
+
+# === Benchmark ===
+
+async def run(args):
+    import bot
+    from http_client import http_client
+    from market_cache import market_cache
+    from watchlist import watchlist
+    from answer_cache import answer_cache
+    from scheduler import grok_scheduler
+    from grok_api import usage_stats
+
+    client = bot.client
+    client._connection.user = BOT_USER
+    tesla_channel = tesla_history(args.send_latency)
+    client.get_channel = lambda channel_id: tesla_channel if channel_id == TESLA_CHANNEL_ID else None
+
+    await http_client.start()
+    await bot.tesla_post_buffer.seed(client)
+    if not args.cold:
+        await market_cache.refresh(force=True)
+        await watchlist.refresh_defaults()
+    market_cache.start()
+    warmup_calls = Counter(calls)
+
+    rng = random.Random(args.seed)
+    users = [FakeUser(100 + i, f"user{i}") for i in range(args.users)]
+    guild = FakeGuild(GUILD_ID)
+    latencies, first_reply = [], []
+
+    async def mention(i):
+        if args.unique_queries:
+            query = f"What does bar {rng.randrange(args.unique_queries)} mean for TSLA?"
+        else:
+            query = f"What does bar {i} mean for TSLA?"
+        channel = FakeChannel(MENTION_CHANNEL_ID, args.send_latency)
+        message = FakeMessage(next_snowflake(), f"<@{BOT_USER_ID}> {query}", rng.choice(users), channel,
+                              mentions=[BOT_USER], guild=guild)
+        started = time.perf_counter()
+        await bot.on_message(message)
+        latencies.append(time.perf_counter() - started)
+        if channel.first_send_at is not None:
+            first_reply.append(channel.first_send_at - started)
+
+    started = time.perf_counter()
+    sent = 0
+    while sent < args.mentions:
+        burst_started = time.perf_counter()
+        size = min(args.burst, args.mentions - sent)
+        await asyncio.gather(*(mention(sent + i) for i in range(size)))
+        sent += size
+        if args.burst_interval and sent < args.mentions:
+            await asyncio.sleep(max(0.0, args.burst_interval - (time.perf_counter() - burst_started)))
+    elapsed = time.perf_counter() - started
+
+    await market_cache.stop()
+    await http_client.close()
+
+    latencies.sort()
+    first_reply.sort()
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        "mentions": args.mentions,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(args.mentions / elapsed, 2),
+        "latency_ms": {f"p{p}": ms(percentile(latencies, p)) for p in (50, 95, 99)} | {"max": ms(latencies[-1])},
+        "first_reply_ms": {f"p{p}": ms(percentile(first_reply, p)) for p in (50, 95, 99)},
+        "upstream_calls": dict(sorted((calls - warmup_calls).items())),
+        "warmup_upstream_calls": dict(sorted(warmup_calls.items())),
+        "answer_cache": answer_cache.stats(),
+        "scheduler": grok_scheduler.stats(),
+        "grok_usage": usage_stats.stats(),
+    }
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="hyperbullish-bench-")
+    port = free_port()
+
+    # config.py reads these at import time, so they must be set before the bot modules load
+    os.environ.update({
+        "TOKEN": "bench",
+        "XAI_API_KEY": "bench",
+        "NEWS_API_KEY": "bench",
+        "TESLA_CHANNEL_ID": str(TESLA_CHANNEL_ID),
+        "GROK_API_URL": f"http://127.0.0.1:{port}/v1/chat/completions",
+        "NEWS_API_URL": f"http://127.0.0.1:{port}/v2/top-headlines",
+        "GROK_STREAMING": "true" if args.stream else "false",
+        "METRICS_PORT": "0",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    # The system prompt and the price store are read relative to the working directory
+    os.chdir(workdir)
+    with open("grokContent", "w", encoding="utf-8") as f:
+        f.write("You are a hyperbullish Tesla analyst. Answer briefly.\n")
+    sys.path.insert(0, REPO_DIR)
+
+    from logging_setup import setup_logging, stop_logging
+    setup_logging(stream=sys.stderr)
+    install_upstream_stubs(args.yfinance_latency)
+
+    server = FakeUpstreamServer(port, args.grok_latency, args.grok_jitter, args.stream_chunks, args.chunk_interval,
+                            args.news_latency, args.seed)
+    server.start()
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        server.stop()
+        stop_logging()
+
+    record = {
+        "commit": git_commit(),
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    print(json.dumps(record, indent=2))
+    if args.output:
+        with open(os.path.join(REPO_DIR, args.output), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,27 @@
+import asyncio
+import logging
 import discord
 from dotenv import load_dotenv
-from config import TOKEN, TESLA_CHANNEL_ID
-from data_fetcher import get_tesla_channel_posts, get_market_and_news_data
-from grok_api import query_grok
+from config import TOKEN, TESLA_CHANNEL_ID, GROK_STREAMING
+from data_fetcher import get_tesla_channel_posts, tesla_post_buffer
+from market_cache import market_cache
+from grok_api import query_grok, stream_grok, usage_stats, NO_RESPONSE
+from http_client import http_client
+from streaming import StreamingReply
+from answer_cache import answer_cache
+from prompt_loader import prompt_loader
+from context_builder import build_context
+from message_normalizer import forget_message
+from reply_index import reply_index
+from scheduler import grok_scheduler, SchedulerBusy
+from logging_setup import setup_logging
+from metrics import metrics
+from news_client import news_client
+from watchlist import watchlist
+from chart_renderer import chart_renderer, wants_chart
 import os
-import re
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables (already handled in config.py, but included for safety)
 load_dotenv()
@@ -13,16 +30,82 @@ load_dotenv()
 intents = discord.Intents.default()
 intents.message_content = True
 intents.messages = True  # Ensure message history intent is enabled
-client = discord.Client(intents=intents)
+
+class HyperbullishClient(discord.Client):
+    async def setup_hook(self):
+        await http_client.start()
+        await metrics.start()
+        chart_renderer.start()
+
+    async def close(self):
+        await metrics.stop()
+        chart_renderer.close()
+        await market_cache.stop()
+        await http_client.close()
+        await super().close()
+
+client = HyperbullishClient(intents=intents)
+
+# Component counters exported next to the stage histograms
+metrics.add_collector("market_cache", market_cache.stats, counters=("hits", "misses"))
+metrics.add_collector("answer_cache", answer_cache.stats,
+                      counters=("hits", "misses", "saved_api_calls", "invalidations", "stale_puts"))
+metrics.add_collector("scheduler", grok_scheduler.stats, counters=("admitted", "shed", "expired"))
+metrics.add_collector("http_pool", http_client.stats, counters=("connections_created", "connections_reused"))
+metrics.add_collector("grok_usage", usage_stats.stats,
+                      counters=("requests", "prompt_tokens", "cached_tokens", "completion_tokens"))
+metrics.add_collector("news", news_client.stats, counters=("not_modified", "downloads", "failures"))
+metrics.add_collector("watchlist", watchlist.stats,
+                      counters=("hits", "late", "batches", "symbols_downloaded", "failures"))
+metrics.add_collector("charts", chart_renderer.stats, counters=("hits", "renders", "failures"))
+
+# The default watchlist tickers are kept fresh next to the market snapshot, off the mention path
+market_cache.add_refresher(watchlist.refresh_defaults)
 
 # === On Ready ===
 @client.event
 async def on_ready():
-    print(f"✅ Logged in as {client.user} (ID: {client.user.id})")
+    logger.info("✅ Logged in as %s (ID: %s)", client.user, client.user.id)
+    market_cache.start()
+    if TESLA_CHANNEL_ID and not tesla_post_buffer.seeded:
+        try:
+            await tesla_post_buffer.seed(client)
+        except (LookupError, discord.errors.Forbidden) as e:
+            logger.error("Failed to seed Tesla post buffer: %s: %s", type(e).__name__, e)
+
+# === Tesla Post Buffer and Reply Index Upkeep ===
+@client.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    forget_message(payload.message_id)
+    reply_index.edit(payload.message)
+    if payload.channel_id == tesla_post_buffer.channel_id:
+        tesla_post_buffer.edit(payload.message)
+
+@client.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    forget_message(payload.message_id)
+    reply_index.delete(payload.message_id)
+    if payload.channel_id == tesla_post_buffer.channel_id:
+        tesla_post_buffer.delete(payload.message_id)
+
+# === Answer Cache Context ===
+def context_version(snapshot, watchlist_defaults):
+    """
+    Identify the data every answer is based on: market snapshot, default watchlist, Tesla posts and system prompt versions.
+    The snapshot and default watchlist versions are the ones read together with the text put into the prompt.
+    """
+    return (snapshot.version, watchlist_defaults, tesla_post_buffer.version, prompt_loader.version)
+
+async def chart_files(chart_task):
+    """Attachments for a reply: the rendered chart if one was requested and rendered, else None."""
+    chart = await chart_task if chart_task is not None else None
+    return [chart] if chart is not None else None
 
 # === On Message: Handle Bot Mentions ===
 @client.event
 async def on_message(message: discord.Message):
+    tesla_post_buffer.add(message)
+    reply_index.add(message)
     if message.author.bot:
         return
 
@@ -31,7 +114,6 @@ async def on_message(message: discord.Message):
     if bot_mentioned:
         # Build the full query with direct message, quoted message, replies, and forwarded messages
         query = message.content
-        context = []
 
         # Clean the direct message
         if client.user in message.mentions:
@@ -39,145 +121,118 @@ async def on_message(message: discord.Message):
             query = query.replace(f"<@!{client.user.id}>", "").strip()
         elif message.content.lower().startswith(client.user.name.lower()):
             query = query[len(client.user.name):].strip()
-        print(f"[DEBUG] Direct query after cleaning: {query}")
+        logger.debug("Direct query after cleaning: %s", query)
 
-        # Add quoted message (if exists)
-        if message.reference and message.reference.message_id:
-            print(f"[DEBUG] Detected quoted message with ID: {message.reference.message_id}")
-            try:
-                quoted_message = await message.channel.fetch_message(message.reference.message_id)
-                if quoted_message:
-                    quoted_text = quoted_message.content.strip() or "No content"
-                    has_embeds = len(quoted_message.embeds) > 0
-                    print(f"[DEBUG] Quoted message by {quoted_message.author.name} - Content: {quoted_text}, Has embeds: {has_embeds}")
-                    if quoted_message.embeds:
-                        for i, embed in enumerate(quoted_message.embeds, 1):
-                            embed_text = []
-                            if embed.title:
-                                embed_text.append(f"Title: {embed.title}")
-                            if embed.description:
-                                embed_text.append(f"Description: {embed.description}")
-                            if embed.fields:
-                                for field in embed.fields:
-                                    embed_text.append(f"Field - {field.name}: {field.value}")
-                            embed_details = "\n".join(embed_text) if embed_text else "No embed details"
-                            print(f"[DEBUG] Quoted embed {i}: {embed_details}")
-                    context.append(f"quote: Quoted by {quoted_message.author.name}: {quoted_text}")
-            except discord.errors.NotFound:
-                print(f"[DEBUG] Quoted message {message.reference.message_id} not found")
-            except discord.errors.Forbidden:
-                print(f"[ERROR] Missing permissions to fetch quoted message in channel {message.channel.id}")
-
-        # Add forwarded messages (detected via embeds with Discord message URLs) and process embeds
-        if message.embeds:
-            print(f"[DEBUG] Detected {len(message.embeds)} embeds in current message")
-            for i, embed in enumerate(message.embeds, 1):
-                if embed.url and "discord.com/channels" in embed.url:
-                    print(f"[DEBUG] Embed {i} contains potential forwarded URL: {embed.url}")
-                    match = re.search(r"https://discord\.com/channels/(\d+)/(\d+)/(\d+)", embed.url)
-                    if match:
-                        guild_id, channel_id, message_id = match.groups()
-                        print(f"[DEBUG] Parsed forwarded message - Guild: {guild_id}, Channel: {channel_id}, Message ID: {message_id}")
-                        if int(channel_id) == message.channel.id:  # Same channel
-                            try:
-                                forwarded_message = await message.channel.fetch_message(int(message_id))
-                                if forwarded_message:
-                                    forwarded_text = forwarded_message.content.strip() or "No content"
-                                    has_embeds = len(forwarded_message.embeds) > 0
-                                    print(f"[DEBUG] Forwarded message by {forwarded_message.author.name} - Content: {forwarded_text}, Has embeds: {has_embeds}")
-                                    # Extract text from embeds in the forwarded message
-                                    embed_text = ""
-                                    if forwarded_message.embeds:
-                                        for j, fwd_embed in enumerate(forwarded_message.embeds, 1):
-                                            embed_parts = []
-                                            if fwd_embed.title:
-                                                embed_parts.append(f"Title: {fwd_embed.title}")
-                                            if fwd_embed.description:
-                                                embed_parts.append(f"Description: {fwd_embed.description}")
-                                            if fwd_embed.fields:
-                                                for field in fwd_embed.fields:
-                                                    embed_parts.append(f"Field - {field.name}: {field.value}")
-                                            embed_details = "\n".join(embed_parts) if embed_parts else "No embed details"
-                                            print(f"[DEBUG] Forwarded embed {j}: {embed_details}")
-                                            embed_text += f"\n{embed_details}" if embed_text else embed_details
-                                    # Combine raw content and embed text
-                                    full_forwarded_text = forwarded_text
-                                    if embed_text:
-                                        full_forwarded_text = f"{forwarded_text}\n{embed_text}" if forwarded_text else embed_text
-                                    if full_forwarded_text:
-                                        context.append(f"forwarded: Forwarded by {forwarded_message.author.name}: {full_forwarded_text}")
-                            except discord.errors.NotFound:
-                                print(f"[DEBUG] Forwarded message {message_id} not found")
-                            except discord.errors.Forbidden:
-                                print(f"[ERROR] Missing permissions to fetch forwarded message in channel {message.channel.id}")
-
-        # Add replies to the original message
-        print(f"[DEBUG] Scanning for replies to message ID: {message.id}")
-        async for reply in message.channel.history(limit=10, around=message.created_at):
-            if reply.reference and reply.reference.message_id == message.id and reply.id != message.id:
-                reply_text = reply.content.strip() or "No content"
-                has_embeds = len(reply.embeds) > 0
-                print(f"[DEBUG] Reply by {reply.author.name} - Content: {reply_text}, Has embeds: {has_embeds}")
-                if reply.embeds:
-                    for i, embed in enumerate(reply.embeds, 1):
-                        embed_text = []
-                        if embed.title:
-                            embed_text.append(f"Title: {embed.title}")
-                        if embed.description:
-                            embed_text.append(f"Description: {embed.description}")
-                        if embed.fields:
-                            for field in embed.fields:
-                                embed_text.append(f"Field - {field.name}: {field.value}")
-                        embed_details = "\n".join(embed_text) if embed_text else "No embed details"
-                        print(f"[DEBUG] Reply embed {i}: {embed_details}")
-                context.append(f"reply: Reply by {reply.author.name}: {reply_text}")
+        # Resolve quoted, forwarded and reply context concurrently under one deadline
+        with metrics.span("context"):
+            context = await build_context(client, message)
 
         # Combine context with the direct query
         full_query = query
         if context:
             full_query = f"{query}\n\nContext:\n" + "\n".join(context)
-        print(f"[DEBUG] Full query to Grok: {full_query}")
+        logger.debug("Full query to Grok: %s", full_query)
 
         if not full_query.strip():
             try:
                 await message.channel.send("Please ask a question after mentioning me!")
             except discord.errors.Forbidden:
-                print(f"[ERROR] Missing permissions to send message in channel {message.channel.id}")
+                logger.error("Missing permissions to send message in channel %s", message.channel.id)
             return
 
+        # Render a requested chart in the process pool while the data is fetched and Grok answers
+        chart_task = asyncio.ensure_future(chart_renderer.file(query)) if wants_chart(query) else None
+
         try:
             async with message.channel.typing():
                 # Fetch data for Grok
-                market_and_news_data = get_market_and_news_data()  # Synchronous call
-                tesla_posts = await get_tesla_channel_posts(client)
-                response = await query_grok(full_query, market_and_news_data, tesla_posts)
-                print(f"[DEBUG] Sending mention response: {response[:50]}...")
-                
-                # Send the response (text only)
-                print("[DEBUG] Sending text response")
-                await message.channel.send(response)
+                with metrics.span("market"):
+                    snapshot = await market_cache.get_snapshot()
+                market_and_news_data = snapshot.text
+                with metrics.span("watchlist"):
+                    watchlist_data, watchlist_version = await watchlist.get_text(full_query)
+                watchlist_defaults = watchlist.version
+                if watchlist_data:
+                    market_and_news_data = f"{market_and_news_data}\n\n{watchlist_data}"
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Market cache stats: %s", market_cache.stats())
+                with metrics.span("posts"):
+                    tesla_posts = await get_tesla_channel_posts(client)
+
+                # Reuse an answer to the same question against the same data, if we have one
+                version = context_version(snapshot, watchlist_defaults)
+                cached_response = answer_cache.get(full_query, version, watchlist_version)
+                if cached_response is not None:
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Answer cache hit for context %s: %s", version, answer_cache.stats())
+                    with metrics.span("send"):
+                        await message.channel.send(cached_response, files=await chart_files(chart_task))
+                    return
+
+                try:
+                    async with grok_scheduler.slot(message.author.id, message.guild.id if message.guild else None):
+                        if GROK_STREAMING:
+                            # Post the answer as soon as the first tokens arrive and edit it as the rest streams in
+                            # The span covers the whole stream, including the edits that send it
+                            with metrics.span("grok_stream"):
+                                reply = StreamingReply(message.channel)
+                                async for chunk in stream_grok(full_query, market_and_news_data, tesla_posts):
+                                    await reply.feed(chunk)
+                                response = await reply.finish()
+                            complete = reply.complete
+                            logger.debug("Streamed mention response (%d characters, first chunk after %ss): %s...",
+                                         len(response), reply.time_to_first_chunk, response[:50])
+                        else:
+                            with metrics.span("grok"):
+                                response = await query_grok(full_query, market_and_news_data, tesla_posts)
+                            complete = response != NO_RESPONSE
+                except SchedulerBusy as e:
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Shedding mention from %s: %s, scheduler: %s", message.author.id, e, grok_scheduler.stats())
+                    await message.channel.send("I'm getting a lot of questions right now, please try again in a minute!")
+                    return
+
+                # Sent after the slot is released, so Discord latency and the chart render do not count
+                # against the Grok limits
+                files = await chart_files(chart_task)
+                if GROK_STREAMING:
+                    if files:
+                        with metrics.span("send"):
+                            await reply.attach(files)
+                else:
+                    logger.debug("Sending mention response: %s...", response[:50])
+                    with metrics.span("send"):
+                        await message.channel.send(response, files=files)
+                # Interrupted streams and empty answers are sent, but not replayed to later askers
+                if complete:
+                    answer_cache.put(full_query, version, response, watchlist_version)
         except discord.errors.Forbidden:
-            print(f"[ERROR] Missing permissions in channel {message.channel.id}")
+            logger.error("Missing permissions in channel %s", message.channel.id)
             try:
                 await message.author.send(
                     f"I can't respond in {message.channel.name} due to missing permissions. "
                     "Please ask a server admin to grant me Send Messages permission, or try another channel."
                 )
             except discord.errors.Forbidden:
-                print(f"[ERROR] Unable to DM user {message.author.id} about permission issue")
+                logger.error("Unable to DM user %s about permission issue", message.author.id)
         except discord.errors.HTTPException as e:
-            print(f"[ERROR] Failed to send mention response: {type(e).__name__}: {str(e)}")
+            logger.error("Failed to send mention response: %s: %s", type(e).__name__, e)
             try:
                 await message.channel.send("Error: Failed to send response.")
             except discord.errors.Forbidden:
-                print(f"[ERROR] Missing permissions to send error message in channel {message.channel.id}")
+                logger.error("Missing permissions to send error message in channel %s", message.channel.id)
         except Exception as e:
-            print(f"[DEBUG] Unexpected error in on_message: {type(e).__name__}: {str(e)}")
+            logger.exception("Unexpected error in on_message: %s: %s", type(e).__name__, e)
             try:
                 await message.channel.send("Error: An unexpected error occurred.")
             except discord.errors.Forbidden:
-                print(f"[ERROR] Missing permissions to send error message in channel {message.channel.id}")
+                logger.error("Missing permissions to send error message in channel %s", message.channel.id)
+        finally:
+            # A chart for an answer that was shed or failed would only keep the render pool busy
+            if chart_task is not None:
+                chart_task.cancel()
 
 # === Start the Bot ===
 if __name__ == "__main__":
-    client.run(TOKEN)
+    setup_logging()
+    client.run(TOKEN, log_handler=None)
@@ -0,0 +1,269 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+import discord
+from config import (
+    CHART_WORKERS, CHART_DEFAULT_RANGE, CHART_CACHE_MAX_BYTES, CHART_RENDER_TIMEOUT, CHART_HISTORY_MAX_AGE,
+)
+from data_fetcher import run_blocking
+from price_store import get_price_store
+from singleflight import flights
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Chart range -> calendar days shown
+CHART_RANGES = {"1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827}
+OVERLAY_SYMBOLS = ("SPY", "^VIX")
+RSI_PERIODS = 14
+# Extra calendar days loaded so the RSI is defined from the first bar shown
+RSI_LOOKBACK_DAYS = 45
+
+_CHART_RE = re.compile(r"\b(chart|graph|plot)s?\b", re.IGNORECASE)
+_PERIOD = r"(\d+)\s*-?\s*(d|days?|w|wk|weeks?|m|mo|mos|months?|y|yr|yrs|years?)"
+# A period only counts as the chart range next to "chart", "range" or "over", so "14-day RSI" does not
+_RANGE_RE = re.compile(
+    rf"\b(?:chart|graph|plot|range|over)s?\s+(?:(?:of|for|the|last|past)\s+)*{_PERIOD}\b"
+    rf"|\b{_PERIOD}\s+(?:chart|graph|plot|range)s?\b",
+    re.IGNORECASE,
+)
+_UNIT_DAYS = {"d": 1, "w": 7, "m": 30.5, "y": 365.25}
+
+def wants_chart(query):
+    """True if the query asks for a chart, graph or plot."""
+    return bool(_CHART_RE.search(query))
+
+def chart_range(query, default=CHART_DEFAULT_RANGE):
+    """
+    Return the CHART_RANGES key for the period a query asks for ("6 month chart", "chart over
+    the last 1y", "ytd", "a year"), rounded up to the nearest supported range, or `default`.
+    """
+    match = _RANGE_RE.search(query)
+    if match:
+        count, unit = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        unit = unit.lower()
+        days = int(count) * _UNIT_DAYS["m" if unit.startswith("mo") else unit[0]]
+    elif re.search(r"\bytd\b", query, re.IGNORECASE):
+        days = pd.Timestamp.now().dayofyear
+    elif re.search(r"\b(a|one|past|last)\s+year\b", query, re.IGNORECASE):
+        days = 366
+    else:
+        return default
+    return next((label for label, span in CHART_RANGES.items() if span >= days), "5y")
+
+# === Rendering (runs in the worker processes) ===
+
+def _init_worker():
+    # Headless backend; import matplotlib once per worker instead of once per chart
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure  # noqa: F401
+
+def _warm_up():
+    return True
+
+def render_chart(ticker, range_label, dates, closes, first, overlays):
+    """
+    Render price, rebased SPY and VIX overlays and RSI as a PNG. Pure function of its arguments,
+    run in a worker process.
+    Args:
+        ticker (str): Main ticker.
+        range_label (str): Range shown in the title.
+        dates (np.ndarray): datetime64 bar dates, including the RSI lookback.
+        closes (np.ndarray): Closes matching `dates`.
+        first (int): Index of the first bar shown.
+        overlays (dict): Symbol -> closes aligned to `dates` (NaN where missing).
+    Returns:
+        bytes: The PNG image.
+    """
+    from matplotlib.figure import Figure
+    from indicators import compute_indicators
+
+    rsi = compute_indicators(closes[np.newaxis, :], rsi_periods=RSI_PERIODS)["rsi"][0][first:]
+    dates, closes = dates[first:], closes[first:]
+    overlays = {symbol: values[first:] for symbol, values in overlays.items()}
+
+    fig = Figure(figsize=(10, 6), dpi=100)
+    price_ax, rsi_ax = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
+    price_ax.plot(dates, closes, color="#e31937", linewidth=1.6, label=ticker)
+    spy = overlays.get("SPY")
+    if spy is not None and np.isfinite(spy).any():
+        # SPY rebased to the ticker's first close, so the lines compare relative performance
+        base = spy[np.isfinite(spy)][0]
+        price_ax.plot(dates, spy / base * closes[0], color="#1f77b4", linewidth=1.0, label="SPY (rebased)")
+    price_ax.set_ylabel(f"{ticker} ($)")
+    price_ax.grid(alpha=0.3)
+    vix = overlays.get("^VIX")
+    if vix is not None and np.isfinite(vix).any():
+        vix_ax = price_ax.twinx()
+        vix_ax.plot(dates, vix, color="#7f7f7f", linewidth=0.8, alpha=0.7, label="VIX")
+        vix_ax.set_ylabel("VIX")
+        handles = price_ax.get_legend_handles_labels()[0] + vix_ax.get_legend_handles_labels()[0]
+        price_ax.legend(handles=handles, loc="upper left", fontsize=8)
+    else:
+        price_ax.legend(loc="upper left", fontsize=8)
+    price_ax.set_title(f"{ticker} daily close, {range_label}")
+
+    rsi_ax.plot(dates, rsi, color="#9467bd", linewidth=1.0)
+    rsi_ax.axhline(70, color="#d62728", linewidth=0.7, linestyle="--")
+    rsi_ax.axhline(30, color="#2ca02c", linewidth=0.7, linestyle="--")
+    rsi_ax.set_ylim(0, 100)
+    rsi_ax.set_ylabel(f"RSI {RSI_PERIODS}")
+    rsi_ax.grid(alpha=0.3)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+# === Chart cache (event loop side) ===
+
+def _open_stores(symbols):
+    """Return the price stores for the symbols, opening them from disk if needed. Blocking."""
+    return [get_price_store(symbol) for symbol in symbols]
+
+class ChartRenderer:
+    """
+    Price/RSI charts with SPY and VIX overlays, built from the local price stores.
+    matplotlib runs in a process pool (Agg backend), so a render never blocks the event loop or
+    holds the GIL. PNGs are cached in memory, LRU-bounded by bytes, keyed by (ticker, range,
+    data version). The version changes whenever a store gains or changes a bar, so a repeated
+    request for the same chart costs a dictionary lookup.
+    Args:
+        workers (int): Worker processes.
+        max_bytes (int): Total PNG bytes kept.
+        timeout (float): Seconds allowed per render.
+        history_max_age (float): Seconds before a store is extended before charting. TSLA and SPY
+            are kept current by the market cache, so this normally only refreshes ^VIX.
+    """
+
+    def __init__(self, workers=CHART_WORKERS, max_bytes=CHART_CACHE_MAX_BYTES, timeout=CHART_RENDER_TIMEOUT,
+                 history_max_age=CHART_HISTORY_MAX_AGE):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.history_max_age = history_max_age
+        self._executor = None
+        self._entries = OrderedDict()  # (ticker, range, version) -> PNG bytes
+        self._bytes = 0
+        self.hits = 0
+        self.renders = 0
+        self.failures = 0
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn, not fork: the bot process has threads (executors, the log listener)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+            )
+        return self._executor
+
+    def start(self):
+        """Start the worker processes so the first chart does not pay for interpreter and matplotlib start-up."""
+        self._pool().submit(_warm_up)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def get(self, range_label=CHART_DEFAULT_RANGE, ticker="TSLA"):
+        """
+        Return the chart PNG for a ticker and range.
+        Raises:
+            LookupError: If there is no stored history for the ticker.
+        """
+        # Opening a store reads its history and replays the indicators, so it happens off the loop
+        stores = await run_blocking(_open_stores, (ticker, *OVERLAY_SYMBOLS))
+        await self._refresh(stores)
+        key = (ticker, range_label, tuple(store.version for store in stores))
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        return await flights.do(("chart",) + key, self._render, key, stores)
+
+    async def file(self, query):
+        """Render the chart a query asks for as a discord.File attachment, or None if it fails."""
+        range_label = chart_range(query)
+        try:
+            data = await self.get(range_label)
+        except Exception as e:
+            self.failures += 1
+            logger.error("Failed to render %s chart: %s: %s", range_label, type(e).__name__, e)
+            return None
+        return discord.File(io.BytesIO(data), filename=f"tsla_{range_label}.png")
+
+    async def _refresh(self, stores):
+        now = time.time()
+        stale = [store for store in stores if store.updated_at is None or now - store.updated_at >= self.history_max_age]
+        results = await asyncio.gather(
+            *(flights.do(("price_store", store.symbol), run_blocking, store.update) for store in stale),
+            return_exceptions=True,
+        )
+        for store, result in zip(stale, results):
+            if isinstance(result, Exception):
+                # Chart what is stored rather than nothing
+                logger.error("Failed to update %s history for chart: %s: %s", store.symbol, type(result).__name__, result)
+
+    async def _render(self, key, stores):
+        ticker, range_label, _ = key
+        args = await run_blocking(self._chart_args, ticker, range_label, stores)
+        loop = asyncio.get_running_loop()
+        with metrics.span("chart_render"):
+            try:
+                data = await asyncio.wait_for(loop.run_in_executor(self._pool(), render_chart, *args), self.timeout)
+            except BrokenProcessPool:
+                # A crashed worker poisons the pool; start a fresh one for the next request
+                self.close()
+                raise
+        self.renders += 1
+        self._store(key, data)
+        return data
+
+    def _chart_args(self, ticker, range_label, stores):
+        """Read the bars from the stores and align the overlays to the ticker's dates. Blocking."""
+        end = pd.Timestamp.now().normalize()
+        shown_from = end - pd.Timedelta(days=CHART_RANGES[range_label])
+        since = (shown_from - pd.Timedelta(days=RSI_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+        main, *others = [store.frame(since)["Close"] for store in stores]
+        if main.empty:
+            raise LookupError(f"No stored history for {ticker}")
+        overlays = {
+            store.symbol: series.reindex(main.index).ffill().to_numpy(dtype=float)
+            for store, series in zip(stores[1:], others)
+        }
+        first = int(np.searchsorted(main.index.to_numpy(), shown_from.to_datetime64()))
+        first = min(first, len(main) - 1)
+        return ticker, range_label, main.index.to_numpy(), main.to_numpy(dtype=float), first, overlays
+
+    def _store(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def stats(self):
+        """Return cache hits, renders, failures and memory use."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "renders": self.renders,
+            "failures": self.failures,
+        }
+
+chart_renderer = ChartRenderer()
@@ -11,5 +11,110 @@ XAI_API_KEY = os.getenv("XAI_API_KEY")
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 TESLA_CHANNEL_ID = int(os.getenv("TESLA_CHANNEL_ID", "0"))
 GROK_CONTENT_FILE = "grokContent"
+PROMPT_CHECK_INTERVAL = float(os.getenv("PROMPT_CHECK_INTERVAL", "5"))
+PROMPT_MAX_CHARS = int(os.getenv("PROMPT_MAX_CHARS", "100000"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_POST_SUMMARY_CHARS = int(os.getenv("PROMPT_POST_SUMMARY_CHARS", "280"))
+# "combined" (static prompt and data in one system message) or "prefix_stable" (see prompt_builder)
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "combined")
+GROK_API_URL = os.getenv("GROK_API_URL", "https://api.x.ai/v1/chat/completions")
+GROK_MODEL = os.getenv("GROK_MODEL", "grok-3-mini")
+GROK_STREAMING = os.getenv("GROK_STREAMING", "false").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+TESLA_POSTS_LIMIT = int(os.getenv("TESLA_POSTS_LIMIT", "10"))
 DISCORD_MAX_MESSAGE_LENGTH = 2000
 CEST = ZoneInfo("Europe/Amsterdam")
+
+# Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "2000"))  # 0 disables truncation
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+# Prometheus metrics endpoint (METRICS_PORT=0 disables it)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Shared HTTP client
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "32"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "8"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+
+# NewsAPI client
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/top-headlines")
+NEWS_RETRY_INTERVAL = float(os.getenv("NEWS_RETRY_INTERVAL", "60"))  # backoff after a failed request
+NEWS_TIMEOUT = float(os.getenv("NEWS_TIMEOUT", "5"))
+
+# In-memory image attachments
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "600"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(8 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "5"))
+
+# Seconds allowed for resolving quoted, forwarded and reply context of a mention
+CONTEXT_DEADLINE = float(os.getenv("CONTEXT_DEADLINE", "2.5"))
+
+# Memoized message normalization
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "2048"))
+
+# In-memory reply index
+REPLY_INDEX_MAX_THREADS = int(os.getenv("REPLY_INDEX_MAX_THREADS", "5000"))
+REPLY_INDEX_MAX_REPLIES = int(os.getenv("REPLY_INDEX_MAX_REPLIES", "20"))
+
+# Market data fetching
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+
+# Local daily price history (one SQLite file per ticker)
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "data")
+PRICE_WINDOW_BARS = int(os.getenv("PRICE_WINDOW_BARS", "22"))
+FUNDAMENTALS_RETRY_INTERVAL = float(os.getenv("FUNDAMENTALS_RETRY_INTERVAL", "86400"))  # while a report is pending
+
+# Market data cache (seconds)
+MARKET_REFRESH_INTERVAL = int(os.getenv("MARKET_REFRESH_INTERVAL", "30"))
+MARKET_SECTION_TTLS = {
+    "quote": int(os.getenv("MARKET_QUOTE_TTL", "60")),
+    "history": int(os.getenv("MARKET_HISTORY_TTL", "900")),
+    "earnings": int(os.getenv("MARKET_EARNINGS_TTL", "21600")),
+    "news": int(os.getenv("MARKET_NEWS_TTL", "600")),
+}
+# Sections that only change while NYSE trades: refreshed at these per-session TTLs, and fetched
+# once more after the close, then left alone until the next session opens
+MARKET_SESSION_SECTIONS = ("quote", "history")
+MARKET_EXTENDED_TTLS = {
+    "quote": int(os.getenv("MARKET_EXTENDED_QUOTE_TTL", "300")),
+    "history": int(os.getenv("MARKET_EXTENDED_HISTORY_TTL", "3600")),
+}
+MARKET_SESSION_TTLS = {
+    "regular": {section: MARKET_SECTION_TTLS[section] for section in MARKET_SESSION_SECTIONS},
+    "pre-market": MARKET_EXTENDED_TTLS,
+    "after-hours": MARKET_EXTENDED_TTLS,
+}
+MARKET_CLOSED_REFRESH_INTERVAL = int(os.getenv("MARKET_CLOSED_REFRESH_INTERVAL", "300"))
+
+# Watchlist: default tickers (refreshed in the background) plus the ones a query mentions
+WATCHLIST_DEFAULT = tuple(s.strip().upper() for s in os.getenv("WATCHLIST_DEFAULT", "QQQ,NVDA").split(",") if s.strip())
+WATCHLIST_MAX_SYMBOLS = int(os.getenv("WATCHLIST_MAX_SYMBOLS", "8"))
+WATCHLIST_TTL = int(os.getenv("WATCHLIST_TTL", "300"))
+WATCHLIST_PERIOD = os.getenv("WATCHLIST_PERIOD", "6mo")
+WATCHLIST_MAX_ENTRIES = int(os.getenv("WATCHLIST_MAX_ENTRIES", "256"))  # mentioned tickers kept
+WATCHLIST_DEADLINE = float(os.getenv("WATCHLIST_DEADLINE", "1.5"))  # seconds a mention waits for uncached tickers
+
+# Chart rendering (matplotlib in worker processes, PNGs cached in memory)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "1"))
+CHART_DEFAULT_RANGE = os.getenv("CHART_DEFAULT_RANGE", "3mo")
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "20"))
+CHART_HISTORY_MAX_AGE = int(os.getenv("CHART_HISTORY_MAX_AGE", os.getenv("MARKET_HISTORY_TTL", "900")))
+
+# Grok answer cache
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "300"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# Grok request scheduler
+GROK_MAX_CONCURRENT = int(os.getenv("GROK_MAX_CONCURRENT", "4"))
+GROK_MAX_QUEUE = int(os.getenv("GROK_MAX_QUEUE", "20"))
+GROK_MAX_QUEUED_PER_USER = int(os.getenv("GROK_MAX_QUEUED_PER_USER", "2"))
+GROK_QUEUE_DEADLINE = float(os.getenv("GROK_QUEUE_DEADLINE", "30"))
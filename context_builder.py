@@ -0,0 +1,132 @@
+import logging
+import asyncio
+import discord
+from config import CONTEXT_DEADLINE
+from singleflight import flights
+from metrics import metrics
+from reply_index import reply_index
+from message_normalizer import normalize_message
+
+logger = logging.getLogger(__name__)
+
+async def _fetch_message(channel, message_id):
+    try:
+        message = await channel.fetch_message(message_id)
+    except discord.errors.HTTPException as e:
+        # A deleted message is an answer, not an upstream failure
+        metrics.upstream("discord", isinstance(e, discord.errors.NotFound))
+        raise
+    metrics.upstream("discord", True)
+    return message
+
+async def fetch_message_once(channel, message_id):
+    """fetch_message() shared by concurrent mentions that reference the same message."""
+    return await flights.do(("message", channel.id, message_id), _fetch_message, channel, message_id)
+
+async def resolve_message(client: discord.Client, channel, message_id, cached=None):
+    """
+    Return a message from the mention's own channel, preferring copies discord.py already holds
+    in memory. Order: the reference's resolved message, the client's message cache, then one
+    shared REST fetch. Only the mention's channel is searched, so a link cannot pull messages
+    from channels or guilds the asking user cannot read into the prompt.
+    """
+    if isinstance(cached, discord.Message) and cached.channel.id == channel.id:
+        return cached
+    cached = discord.utils.get(client.cached_messages, id=message_id)
+    if cached is not None and cached.channel.id == channel.id:
+        return cached
+    return await fetch_message_once(channel, message_id)
+
+async def _quoted_context(client, message):
+    reference = message.reference
+    logger.debug("Detected quoted message with ID: %s", reference.message_id)
+    if reference.channel_id and reference.channel_id != message.channel.id:
+        logger.debug("Ignoring quoted message %s from another channel", reference.message_id)
+        return []
+    try:
+        quoted_message = await resolve_message(client, message.channel, reference.message_id, reference.resolved)
+    except discord.errors.NotFound:
+        logger.debug("Quoted message %s not found", reference.message_id)
+        return []
+    except discord.errors.Forbidden:
+        logger.error("Missing permissions to fetch quoted message in channel %s", message.channel.id)
+        return []
+    quoted = normalize_message(quoted_message)
+    quoted_text = quoted.text or "No content"
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Quoted message by %s - Content: %s, Has embeds: %s", quoted.author, quoted_text, bool(quoted.embeds))
+        for i, embed in enumerate(quoted.embeds, 1):
+            logger.debug("Quoted embed %d: %s", i, embed.details)
+    return [f"quote: Quoted by {quoted.author}: {quoted_text}"]
+
+async def _forwarded_context(client, channel, message_id):
+    try:
+        forwarded_message = await resolve_message(client, channel, message_id)
+    except discord.errors.NotFound:
+        logger.debug("Forwarded message %s not found", message_id)
+        return []
+    except discord.errors.Forbidden:
+        logger.error("Missing permissions to fetch forwarded message in channel %s", channel.id)
+        return []
+    forwarded = normalize_message(forwarded_message)
+    forwarded_text = forwarded.text or "No content"
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Forwarded message by %s - Content: %s, Has embeds: %s",
+                     forwarded.author, forwarded_text, bool(forwarded.embeds))
+        for j, fwd_embed in enumerate(forwarded.embeds, 1):
+            logger.debug("Forwarded embed %d: %s", j, fwd_embed.details)
+    # Combine raw content and embed text
+    full_forwarded_text = "\n".join([forwarded_text] + [embed.details for embed in forwarded.embeds])
+    return [f"forwarded: Forwarded by {forwarded.author}: {full_forwarded_text}"]
+
+def _reply_context(message):
+    logger.debug("Looking up replies to message ID: %s", message.id)
+    context = []
+    for reply in reply_index.replies(message.id):
+        reply_text = reply.text or "No content"
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Reply by %s - Content: %s, Has embeds: %s", reply.author, reply_text, bool(reply.embeds))
+            for i, embed in enumerate(reply.embeds, 1):
+                logger.debug("Reply embed %d: %s", i, embed.details)
+        context.append(f"reply: Reply by {reply.author}: {reply_text}")
+    return context
+
+async def build_context(client: discord.Client, message: discord.Message, deadline=CONTEXT_DEADLINE):
+    """
+    Resolve the quoted message and forwarded message links of a mention concurrently, and add
+    its replies from the reply index. Anything not resolved within `deadline` seconds is dropped
+    instead of delaying the answer.
+    Returns:
+        list: Context lines in the order quote, forwards, replies.
+    """
+    sources = []
+    if message.reference and message.reference.message_id:
+        sources.append(("quote", _quoted_context(client, message)))
+
+    # Forwarded messages are detected via embeds with Discord message URLs
+    for guild_id, channel_id, message_id in normalize_message(message).message_links:
+        logger.debug("Parsed forwarded message - Guild: %s, Channel: %s, Message ID: %s", guild_id, channel_id, message_id)
+        if channel_id != message.channel.id:  # Same channel only
+            continue
+        sources.append((f"forward {message_id}", _forwarded_context(client, message.channel, message_id)))
+
+    tasks = [asyncio.ensure_future(coro) for _, coro in sources]
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+
+    context = []
+    for (name, _), task in zip(sources, tasks):
+        if task in pending:
+            logger.debug("Dropped %s context: not resolved within %ss", name, deadline)
+        elif task.cancelled():
+            logger.debug("Dropped %s context: cancelled", name)
+        elif task.exception() is not None:
+            error = task.exception()
+            logger.error("Failed to resolve %s context: %s: %s", name, type(error).__name__, error)
+        else:
+            context.extend(task.result())
+    context.extend(_reply_context(message))
+    return context
@@ -1,206 +1,278 @@
+import logging
+import asyncio
 import yfinance as yf
-from datetime import datetime
-from config import TESLA_CHANNEL_ID, CEST, NEWS_API_KEY
-from discord import Client, Forbidden
-import re
-import requests
+from concurrent.futures import ThreadPoolExecutor
+import time
+from datetime import datetime, timezone
+from config import TESLA_CHANNEL_ID, CEST, NEWS_API_KEY, FETCH_MAX_WORKERS
+from discord import Client, Message
 import pandas as pd
+from price_store import get_price_store
+from fundamentals import get_fundamentals
+from market_hours import session_at
+from post_buffer import TeslaPostBuffer
+from message_normalizer import normalize_message
+from news_client import news_client
 
-def calculate_rsi(prices):
+logger = logging.getLogger(__name__)
+
+def format_tesla_post(message: Message):
     """
-    Calculate the Relative Strength Index (RSI) for a series of prices.
-    Args:
-        prices (pd.Series): Series of closing prices.
+    Turn a Tesla channel message into its prompt line.
     Returns:
-        pd.Series: RSI values.
+        tuple: (prompt line, image URLs), or None for messages without content.
     """
-    delta = prices.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+    post = normalize_message(message)
+    if not post.text:  # Skip bot messages and empty content
+        return None
+    timestamp = post.timestamp.astimezone(CEST).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Full tweet text and embed details (text only)
+    tweet_text = post.text
+    if post.embeds:
+        tweet_text = "\n".join(
+            f"Embed {i}: Title: {embed.title or 'No title'}, Description: {embed.description or 'No description'}, "
+            f"Fields: {dict(embed.fields) if embed.fields else 'No fields'}, URL: {embed.url or 'No URL'}, "
+            f"Footer: {embed.footer or 'No footer'}"
+            for i, embed in enumerate(post.embeds, 1)
+        )
+
+    # Format message with full details
+    msg_line = f"[{timestamp} CEST] {post.author}: {tweet_text}"
+    if post.x_url:
+        msg_line += f" (URL: {post.x_url})"
+    return msg_line, list(post.image_urls)
+
+tesla_post_buffer = TeslaPostBuffer(format_tesla_post)
 
 async def get_tesla_channel_posts(client: Client):
-    if TESLA_CHANNEL_ID == 0:
-        return "Error: Tesla channel ID not configured in .env."
-    
+    """Return the buffered Tesla channel posts as prompt text. Only the first call before on_ready hits REST."""
     try:
-        channel = client.get_channel(TESLA_CHANNEL_ID)
-        if not channel:
-            return f"Error: Channel with ID {TESLA_CHANNEL_ID} not found or inaccessible."
-        
-        messages = []
-        async for message in channel.history(limit=10):
-            if message.content.strip():  # Skip bot messages and empty content
-                timestamp = message.created_at.astimezone(CEST).strftime("%Y-%m-%d %H:%M:%S")
-                content = message.content.strip()
-                
-                # Extract full tweet text and embed details (text only)
-                tweet_text = content
-                if message.embeds:
-                    embed_details = []
-                    for i, embed in enumerate(message.embeds, 1):
-                        embed_dict = {
-                            "index": i,
-                            "title": embed.title if embed.title else "No title",
-                            "description": embed.description if embed.description else "No description",
-                            "fields": {field.name: field.value for field in embed.fields} if embed.fields else "No fields",
-                            "url": embed.url if embed.url else "No URL",
-                            "footer": embed.footer.text if embed.footer and embed.footer.text else "No footer"
-                        }
-                        embed_details.append(embed_dict)
-                    if embed_details:
-                        tweet_text = "\n".join(
-                            f"Embed {d['index']}: Title: {d['title']}, Description: {d['description']}, "
-                            f"Fields: {d['fields']}, URL: {d['url']}, Footer: {d['footer']}"
-                            for d in embed_details
-                        )
-                
-                # Extract X URL if present
-                url_match = re.search(r'https?://x\.com/[^\s]+/status/(\d+)', content)
-                url = url_match.group(0) if url_match else None
-                
-                # Format message with full details
-                msg_line = f"[{timestamp} CEST] {message.author.name}: {tweet_text}"
-                if url:
-                    msg_line += f" (URL: {url})"
-                
-                messages.append(msg_line)
-        
-        # Log the number of posts imported
-        if messages:
-            print(f"[DEBUG] Imported {len(messages)} Tesla posts from channel {TESLA_CHANNEL_ID}:")
-            for i, msg in enumerate(messages, 1):
-                print(f"[DEBUG] Full Post {i}:\n{msg}")
-        else:
-            print(f"[DEBUG] No valid Tesla posts found in channel {TESLA_CHANNEL_ID}")
-        
-        if not messages:
-            return "No recent Tesla-related posts found in the specified channel."
-        
-        return "Newest Tesla Posts:\n" + "\n".join(messages)
-    except Forbidden:
-        print(f"[ERROR] Missing permissions to read messages in channel {TESLA_CHANNEL_ID}")
-        return f"Error: Missing permissions to read messages in channel {TESLA_CHANNEL_ID}."
+        posts = await tesla_post_buffer.get_text(client)
+        logger.debug("Using %d buffered Tesla posts from channel %s (buffer v%d)",
+                     len(tesla_post_buffer), TESLA_CHANNEL_ID, tesla_post_buffer.version)
+        return posts
     except Exception as e:
-        print(f"[ERROR] Failed to fetch Tesla channel posts: {type(e).__name__}: {str(e)}")
+        logger.error("Failed to fetch Tesla channel posts: %s: %s", type(e).__name__, e)
         return f"Error: Failed to fetch Tesla channel posts - {str(e)}"
 
-def get_market_and_news_data():
-    try:
-        # Get current date and time in CEST (set to 10:30 PM CEST, June 27, 2025)
-        current_time = datetime(2025, 6, 27, 22, 30).replace(tzinfo=CEST).strftime("%Y-%m-%d %H:%M:%S")
-        timestamp = f"Data as of: {current_time} CEST"
-        
-        # Fetch TSLA data
-        tsla = yf.Ticker("TSLA")
-        tsla_info = tsla.info
-        current_price = tsla_info.get("regularMarketPrice", "N/A")
-        previous_close = tsla_info.get("previousClose", "N/A")
-        
-        if current_price == "N/A" or previous_close == "N/A":
-            tsla_data = "Error: Could not retrieve TSLA price data."
-        else:
-            absolute_gain = current_price - previous_close
-            percentage_gain = (absolute_gain / previous_close) * 100
-            absolute_gain = round(absolute_gain, 2)
-            percentage_gain = round(percentage_gain, 2)
-            
-            tsla_hist = tsla.history(period="1mo")
-            if tsla_hist.empty:
-                tsla_data = "Error: Could not retrieve TSLA historical data."
-            else:
-                closing_prices = tsla_hist["Close"].round(2).tail(5).to_dict()
-                price_dev = ", ".join([f"{date.strftime('%Y-%m-%d')}: ${price}" for date, price in closing_prices.items()])
-                rsi = calculate_rsi(tsla_hist["Close"]).iloc[-1]
-                rsi_value = round(rsi, 2) if rsi is not None and not pd.isna(rsi) else "N/A"
-                market_cap = tsla_info.get("marketCap", "N/A")
-                pe_ratio = tsla_info.get("trailingPE", "N/A")
-                if market_cap != "N/A":
-                    market_cap = f"${market_cap / 1e9:.2f}B"
-                if pe_ratio != "N/A":
-                    pe_ratio = f"{pe_ratio:.2f}"
-                
-                tsla_data = (
-                    f"Current $TSLA data: Price: ${current_price:.2f}, "
-                    f"Gain: ${absolute_gain} ({percentage_gain}%), "
-                    f"Market Cap: {market_cap}, P/E Ratio: {pe_ratio}, "
-                    f"14-day RSI: {rsi_value}\n"
-                    f"Recent Price Development (last 5 days): {price_dev}"
-                )
-        
-        earnings = tsla.quarterly_financials
-        if earnings.empty:
-            earnings_data = "Error: Could not retrieve TSLA earnings data."
-        else:
-            latest_quarter = earnings.columns[0]
-            revenue = earnings.loc["Total Revenue", latest_quarter] / 1e9 if "Total Revenue" in earnings.index else "N/A"
-            net_income = earnings.loc["Net Income", latest_quarter] / 1e6 if "Net Income" in earnings.index else "N/A"
-            eps = tsla_info.get("trailingEps", "N/A")
-            if revenue != "N/A":
-                revenue = f"${revenue:.2f}B"
-            if net_income != "N/A":
-                net_income = f"${net_income:.2f}M"
-            if eps != "N/A":
-                eps = f"${eps:.2f}"
-            earnings_data = (
-                f"Q1 2025 Earnings: Revenue: {revenue}, EPS: {eps}, Net Income: {net_income}"
-            )
-        
-        vix = yf.Ticker("^VIX")
-        spy = yf.Ticker("SPY")
-        vix_value = vix.info.get("regularMarketPrice", "N/A")
-        spy_current = spy.info.get("regularMarketPrice", "N/A")
-        spy_previous_close = spy.info.get("previousClose", "N/A")
-        
-        spy_hist = spy.history(period="max")
-        if spy_hist.empty or vix_value == "N/A" or spy_current == "N/A" or spy_previous_close == "N/A":
-            market_mood = "Error: Could not retrieve VIX or SPY data."
-        else:
-            spy_ath = spy_hist["High"].max()
-            spy_percent_from_ath = ((spy_current - spy_ath) / spy_ath) * 100
-            spy_percent_from_ath = round(spy_percent_from_ath, 2)
-            spy_absolute_gain = spy_current - spy_previous_close
-            spy_percentage_gain = (spy_absolute_gain / spy_previous_close) * 100
-            spy_absolute_gain = round(spy_absolute_gain, 2)
-            spy_percentage_gain = round(spy_percentage_gain, 2)
-            vix_sentiment = (
-                "Optimism (low volatility)" if vix_value < 15 else
-                "Normal" if 15 <= vix_value <= 25 else
-                "Turbulence" if 25 < vix_value <= 30 else
-                "High fear"
-            )
-            market_mood = (
-                f"Market Mood: VIX: {vix_value:.2f} ({vix_sentiment}), "
-                f"SPY: ${spy_current:.2f} (Gain: ${spy_absolute_gain} ({spy_percentage_gain}%), "
-                f"{spy_percent_from_ath}% from ATH)"
-            )
-        
-        if not NEWS_API_KEY:
-            news_data = "Error: News API key is not configured."
+QUOTE_SYMBOLS = ("TSLA", "^VIX", "SPY")
+SECTION_LABELS = {"history": "price history", "earnings": "fundamentals", "news": "news"}
+
+# Bounded pool for the blocking yfinance calls so they never run on the event loop
+_fetch_executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="market-fetch")
+
+async def run_blocking(func, *args):
+    """Run a blocking fetch function on the shared fetch executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_fetch_executor, func, *args)
+
+def fetch_quote(symbol):
+    """
+    Fetch the latest price and previous close of one ticker through yfinance's fast_info,
+    which skips the much heavier quoteSummary request behind .info.
+    Returns:
+        dict: "regularMarketPrice" and "previousClose" (each "N/A" if unavailable).
+    """
+    fast_info = yf.Ticker(symbol).fast_info
+    price = fast_info.last_price
+    # previous_close is built from bars that include extended hours; this is the official close
+    previous_close = fast_info.regular_market_previous_close
+    return {
+        "regularMarketPrice": price if price is not None else "N/A",
+        "previousClose": previous_close if previous_close is not None else "N/A",
+    }
+
+def fetch_tsla_history():
+    """
+    Extend the local TSLA store with missing bars.
+    Returns:
+        tuple: (recent, about 1 month, OHLCV DataFrame; latest indicator values kept by the store)
+    """
+    store = get_price_store("TSLA")
+    store.update()
+    return store.window_frame(), store.indicators
+
+def fetch_spy_ath():
+    """Extend the local SPY store with missing bars and return its all-time high, or None if empty."""
+    store = get_price_store("SPY")
+    store.update()
+    return store.ath
+
+def fetch_earnings():
+    """
+    Return the latest TSLA fundamentals from the persistent fundamentals cache; yfinance is only
+    asked again after a report date or quarter boundary.
+    Returns:
+        dict: Quarter label, revenue, net income, trailing EPS and shares outstanding
+            (see FundamentalsCache), or None if unavailable.
+    """
+    return get_fundamentals("TSLA").get()
+
+def format_data_times(fetched_at, now=None):
+    """
+    Render when the data was fetched: the quote time and NYSE session, plus the other sections'
+    fetch times when they differ from it.
+    Args:
+        fetched_at (dict): Section name -> epoch seconds of its last successful fetch.
+    """
+    now = now or time.time()
+
+    def local(epoch):
+        return datetime.fromtimestamp(epoch, CEST).strftime("%Y-%m-%d %H:%M:%S")
+
+    quote_time = fetched_at.get("quote", now)
+    session, _, _ = session_at(datetime.fromtimestamp(quote_time, timezone.utc))
+    timestamp = f"Data as of: {local(quote_time)} CEST (NYSE session: {session})"
+    others = [
+        f"{SECTION_LABELS.get(name, name)} {local(epoch)}"
+        for name, epoch in fetched_at.items() if name != "quote" and abs(epoch - quote_time) >= 60
+    ]
+    if others:
+        timestamp += f"\nOther data as of: {', '.join(others)} CEST"
+    return timestamp
+
+def format_market_and_news_data(sections, fetched_at=None):
+    """
+    Render fetched market sections into the text block passed to Grok.
+    Args:
+        sections (dict): "quote", "history", "earnings" and "news" values as returned
+            by the fetch_* functions. A missing or None section renders as an error line.
+        fetched_at (dict): Section name -> epoch seconds of its fetch; defaults to now for all.
+    Returns:
+        str: TSLA, earnings, market mood, news and timestamp text.
+    """
+    timestamp = format_data_times(fetched_at or {})
+
+    quotes = sections.get("quote") or {}
+    history = sections.get("history") or {}
+    tsla_info = quotes.get("TSLA", {})
+    current_price = tsla_info.get("regularMarketPrice", "N/A")
+    previous_close = tsla_info.get("previousClose", "N/A")
+
+    if current_price == "N/A" or previous_close == "N/A":
+        tsla_data = "Error: Could not retrieve TSLA price data."
+    else:
+        absolute_gain = current_price - previous_close
+        percentage_gain = (absolute_gain / previous_close) * 100
+        absolute_gain = round(absolute_gain, 2)
+        percentage_gain = round(percentage_gain, 2)
+
+        tsla_hist = history.get("tsla")
+        if tsla_hist is None or tsla_hist.empty:
+            tsla_data = "Error: Could not retrieve TSLA historical data."
         else:
-            news_url = (
-                f"https://newsapi.org/v2/top-headlines?"
-                f"category=general&language=en&sortBy=publishedAt&apiKey={NEWS_API_KEY}"
+            closing_prices = tsla_hist["Close"].round(2).tail(5).to_dict()
+            price_dev = ", ".join([f"{date.strftime('%Y-%m-%d')}: ${price}" for date, price in closing_prices.items()])
+            rsi = (history.get("tsla_indicators") or {}).get("rsi")
+            rsi_value = round(rsi, 2) if rsi is not None and not pd.isna(rsi) else "N/A"
+            # Market cap and P/E follow the live price; shares and EPS only change with each report
+            fundamentals = sections.get("earnings") or {}
+            shares = fundamentals.get("shares_outstanding")
+            trailing_eps = fundamentals.get("trailing_eps")
+            market_cap = current_price * shares if shares else "N/A"
+            pe_ratio = current_price / trailing_eps if trailing_eps and trailing_eps > 0 else "N/A"
+            if market_cap != "N/A":
+                market_cap = f"${market_cap / 1e9:.2f}B"
+            if pe_ratio != "N/A":
+                pe_ratio = f"{pe_ratio:.2f}"
+
+            tsla_data = (
+                f"Current $TSLA data: Price: ${current_price:.2f}, "
+                f"Gain: ${absolute_gain} ({percentage_gain}%), "
+                f"Market Cap: {market_cap}, P/E Ratio: {pe_ratio}, "
+                f"14-day RSI: {rsi_value}\n"
+                f"Recent Price Development (last 5 days): {price_dev}"
             )
-            response = requests.get(news_url)
-            if response.status_code == 200:
-                news_json = response.json()
-                articles = news_json.get("articles", [])[:3]
-                if not articles:
-                    news_data = "No recent world news available."
-                else:
-                    news_items = [
-                        f"{i+1}. {article['title']} ({article['source']['name']}, "
-                        f"{datetime.strptime(article['publishedAt'], '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%d')})"
-                        for i, article in enumerate(articles)
-                    ]
-                    news_data = "Recent World News:\n" + "\n".join(news_items)
-            else:
-                news_data = f"Error: Failed to fetch news (status {response.status_code})."
-        
-        return f"{tsla_data}\n\n{earnings_data}\n\n{market_mood}\n\n{news_data}\n\n{timestamp}"
-    except Exception as e:
-        print(f"[ERROR] Failed to fetch market, earnings, news, or timestamp data: {type(e).__name__}: {str(e)}")
-        return "Error: Failed to fetch TSLA, earnings, market, news, or timestamp data."
+
+    earnings = sections.get("earnings")
+    if not earnings:
+        earnings_data = "Error: Could not retrieve TSLA earnings data."
+    else:
+        revenue = earnings["revenue"] / 1e9 if earnings["revenue"] is not None else "N/A"
+        net_income = earnings["net_income"] / 1e6 if earnings["net_income"] is not None else "N/A"
+        eps = earnings["trailing_eps"] if earnings["trailing_eps"] is not None else "N/A"
+        if revenue != "N/A":
+            revenue = f"${revenue:.2f}B"
+        if net_income != "N/A":
+            net_income = f"${net_income:.2f}M"
+        if eps != "N/A":
+            eps = f"${eps:.2f}"
+        earnings_data = (
+            f"{earnings['quarter']} Earnings: Revenue: {revenue}, EPS: {eps}, Net Income: {net_income}"
+        )
+
+    vix_value = quotes.get("^VIX", {}).get("regularMarketPrice", "N/A")
+    spy_current = quotes.get("SPY", {}).get("regularMarketPrice", "N/A")
+    spy_previous_close = quotes.get("SPY", {}).get("previousClose", "N/A")
+    spy_ath = history.get("spy_ath")
+
+    if spy_ath is None or vix_value == "N/A" or spy_current == "N/A" or spy_previous_close == "N/A":
+        market_mood = "Error: Could not retrieve VIX or SPY data."
+    else:
+        spy_percent_from_ath = ((spy_current - spy_ath) / spy_ath) * 100
+        spy_percent_from_ath = round(spy_percent_from_ath, 2)
+        spy_absolute_gain = spy_current - spy_previous_close
+        spy_percentage_gain = (spy_absolute_gain / spy_previous_close) * 100
+        spy_absolute_gain = round(spy_absolute_gain, 2)
+        spy_percentage_gain = round(spy_percentage_gain, 2)
+        vix_sentiment = (
+            "Optimism (low volatility)" if vix_value < 15 else
+            "Normal" if 15 <= vix_value <= 25 else
+            "Turbulence" if 25 < vix_value <= 30 else
+            "High fear"
+        )
+        market_mood = (
+            f"Market Mood: VIX: {vix_value:.2f} ({vix_sentiment}), "
+            f"SPY: ${spy_current:.2f} (Gain: ${spy_absolute_gain} ({spy_percentage_gain}%), "
+            f"{spy_percent_from_ath}% from ATH)"
+        )
+
+    articles = sections.get("news")
+    if not NEWS_API_KEY:
+        news_data = "Error: News API key is not configured."
+    elif articles is None:
+        news_data = "Error: Failed to fetch news."
+    elif not articles:
+        news_data = "No recent world news available."
+    else:
+        news_items = [
+            f"{i+1}. {article['title']} ({article['source']['name']}, "
+            f"{datetime.strptime(article['publishedAt'], '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%d')})"
+            for i, article in enumerate(articles)
+        ]
+        news_data = "Recent World News:\n" + "\n".join(news_items)
+
+    return f"{tsla_data}\n\n{earnings_data}\n\n{market_mood}\n\n{news_data}\n\n{timestamp}"
+
+async def fetch_quotes_async():
+    """
+    Fetch the latest quote fields for TSLA, ^VIX and SPY, one concurrent lookup per ticker.
+    Returns:
+        dict: Ticker symbol -> quote dict as returned by fetch_quote.
+    """
+    quotes = await asyncio.gather(*(run_blocking(fetch_quote, symbol) for symbol in QUOTE_SYMBOLS))
+    return dict(zip(QUOTE_SYMBOLS, quotes))
+
+async def fetch_history_async():
+    """
+    Fetch the price history used for the recent closes, RSI and SPY all-time high; TSLA and SPY
+    are fetched concurrently.
+    Returns:
+        dict: "tsla" -> 1 month TSLA OHLCV DataFrame, "tsla_indicators" -> latest TSLA indicator
+            values (see IndicatorEngine.update), "spy_ath" -> SPY all-time high or None.
+    """
+    (tsla_hist, tsla_indicators), spy_ath = await asyncio.gather(
+        run_blocking(fetch_tsla_history), run_blocking(fetch_spy_ath)
+    )
+    return {"tsla": tsla_hist, "tsla_indicators": tsla_indicators, "spy_ath": spy_ath}
+
+async def fetch_earnings_async():
+    return await run_blocking(fetch_earnings)
+
+async def fetch_news_async():
+    """
+    Fetch the top general headlines through the shared NewsAPI client. Always revalidates (a cheap 304 when
+    nothing changed), so the market snapshot never embeds the previous cycle's headlines.
+    """
+    return await news_client.fetch()
@@ -0,0 +1,152 @@
+import json
+import logging
+import math
+import os
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+import yfinance as yf
+from config import PRICE_STORE_DIR, FUNDAMENTALS_RETRY_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+def quarter_label(quarter_end):
+    """Calendar quarter label of a quarter end date, e.g. 2025-03-31 -> "Q1 2025"."""
+    return f"Q{(quarter_end.month - 1) // 3 + 1} {quarter_end.year}"
+
+def quarter_start(day):
+    """First day of the calendar quarter containing `day`."""
+    return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+
+def next_quarter_start(day):
+    start = quarter_start(day)
+    return date(start.year + 1, 1, 1) if start.month == 10 else date(start.year, start.month + 3, 1)
+
+def _number(value):
+    """Plain float for JSON, or None for missing/NaN values."""
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+def _midnight_utc(day):
+    return datetime.combine(day, time(), tzinfo=timezone.utc)
+
+class FundamentalsCache:
+    """
+    Quarterly fundamentals for one ticker (latest reported quarter, revenue, net income, trailing
+    EPS, shares outstanding and the next report date), persisted as JSON so restarts are warm.
+    A record stays valid until the next expected change:
+    - while the latest reported quarter is current, until the next report date or the next
+      quarter boundary, whichever comes first;
+    - once a quarter has ended but its report is not out yet, it is re-checked every
+      `retry_interval` seconds (and on the report date).
+    Args:
+        symbol (str): Ticker symbol.
+        directory (str): Directory holding the JSON file.
+        retry_interval (float): Seconds between checks while a report is pending.
+    """
+
+    def __init__(self, symbol, directory=PRICE_STORE_DIR, retry_interval=FUNDAMENTALS_RETRY_INTERVAL):
+        self.symbol = symbol
+        self.retry_interval = retry_interval
+        os.makedirs(directory, exist_ok=True)
+        filename = "".join(c if c.isalnum() else "_" for c in symbol) + "_fundamentals.json"
+        self.path = os.path.join(directory, filename)
+        self._lock = threading.Lock()
+        self._record = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error("Ignoring unreadable fundamentals cache %s: %s: %s", self.path, type(e).__name__, e)
+            return None
+
+    def _save(self, record):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(temp_path, self.path)
+
+    def expires_at(self, record, now):
+        """Return when `record`, fetched at `now`, should be re-fetched."""
+        quarter_end = date.fromisoformat(record["quarter_end"])
+        next_report = date.fromisoformat(record["next_report"]) if record.get("next_report") else None
+        if quarter_end < quarter_start(now.date()) - timedelta(days=1):
+            # The last quarter has closed but is not reported yet
+            expiry = now + timedelta(seconds=self.retry_interval)
+        else:
+            expiry = _midnight_utc(next_quarter_start(now.date()))
+        if next_report is not None and next_report >= now.date():
+            # Reports come out after the close; the numbers show up the next day
+            expiry = min(expiry, _midnight_utc(next_report + timedelta(days=1)))
+        return expiry
+
+    def get(self, now=None):
+        """
+        Return the fundamentals record, fetching it only when the cached one has expired.
+        Blocking; call it from the fetch executor.
+        Returns:
+            dict: The record, or None if yfinance has no quarterly financials.
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            record = self._record
+            if record is not None and now < datetime.fromisoformat(record["expires_at"]):
+                return record
+            try:
+                fresh = self._fetch(now)
+            except Exception as e:
+                if record is None:
+                    raise
+                logger.error("Keeping %s fundamentals for %s, refresh failed: %s: %s", self.symbol, record['quarter'], type(e).__name__, e)
+                return record
+            if fresh is None:
+                return record
+            if record is None or fresh["quarter"] != record["quarter"]:
+                logger.info("Loaded %s fundamentals for %s, valid until %s", self.symbol, fresh['quarter'], fresh['expires_at'])
+            self._record = fresh
+            self._save(fresh)
+            return fresh
+
+    def _fetch(self, now):
+        ticker = yf.Ticker(self.symbol)
+        financials = ticker.quarterly_financials
+        if financials.empty:
+            return None
+        latest = financials.columns[0]
+        info = ticker.info
+        next_report = None
+        try:
+            dates = (ticker.calendar or {}).get("Earnings Date") or []
+            upcoming = sorted(day for day in dates if day >= now.date())
+            next_report = upcoming[0].isoformat() if upcoming else None
+        except Exception as e:
+            logger.debug("No earnings calendar for %s: %s: %s", self.symbol, type(e).__name__, e)
+
+        record = {
+            "symbol": self.symbol,
+            "quarter": quarter_label(latest),
+            "quarter_end": latest.date().isoformat(),
+            "revenue": _number(financials.loc["Total Revenue", latest]) if "Total Revenue" in financials.index else None,
+            "net_income": _number(financials.loc["Net Income", latest]) if "Net Income" in financials.index else None,
+            "trailing_eps": _number(info.get("trailingEps")),
+            "shares_outstanding": _number(info.get("sharesOutstanding")),
+            "next_report": next_report,
+            "fetched_at": now.isoformat(),
+        }
+        record["expires_at"] = self.expires_at(record, now).isoformat()
+        return record
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_fundamentals(symbol):
+    """Return the shared FundamentalsCache for a ticker, loading it from disk on first use."""
+    with _caches_lock:
+        if symbol not in _caches:
+            _caches[symbol] = FundamentalsCache(symbol)
+        return _caches[symbol]
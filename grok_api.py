@@ -1,72 +1,200 @@
+import logging
+import asyncio
+import json
+import time
 import aiohttp
-from config import XAI_API_KEY, GROK_CONTENT_FILE, DISCORD_MAX_MESSAGE_LENGTH
+from http_client import http_client
+from logging_setup import log_payload
+from metrics import metrics
+from prompt_loader import prompt_loader, PromptTemplateError
+from prompt_builder import build_messages
+from config import XAI_API_KEY, GROK_CONTENT_FILE, GROK_API_URL, GROK_MODEL, DISCORD_MAX_MESSAGE_LENGTH, PROMPT_LAYOUT
 
-async def query_grok(prompt: str, market_and_news_data: str, tesla_posts: str) -> str:
+logger = logging.getLogger(__name__)
+
+NO_RESPONSE = "No response received from Grok."
+INTERRUPTED_NOTE = "\n... (response interrupted)"
+
+class UsageStats:
+    """
+    Cumulative prompt token usage reported by the API, including the prompt tokens the provider
+    served from its prompt cache (`usage.prompt_tokens_details.cached_tokens`).
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, usage):
+        """Add the `usage` object of one response; returns the cached token count of that response."""
+        if not usage:
+            return 0
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        self.requests += 1
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.cached_tokens += cached
+        self.completion_tokens += usage.get("completion_tokens") or 0
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Grok usage: prompt %s tokens (%d cached), completion %s tokens, totals: %s",
+                         usage.get("prompt_tokens"), cached, usage.get("completion_tokens"), self.stats())
+        return cached
+
+    def stats(self):
+        """Return cumulative token counts and the share of prompt tokens served from cache."""
+        return {
+            "layout": PROMPT_LAYOUT,
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+        }
+
+usage_stats = UsageStats()
+
+def _build_request(prompt: str, market_and_news_data: str, tesla_posts: str, stream: bool = False):
+    """
+    Build the headers and JSON body for a chat completions request.
+    Returns:
+        tuple: (headers, data, None) on success, or (None, None, error message).
+    """
     if not XAI_API_KEY:
-        return "Error: xAI API key is not configured. Please contact the bot administrator."
-    
+        return None, None, "Error: xAI API key is not configured. Please contact the bot administrator."
+
     try:
-        with open(GROK_CONTENT_FILE, "r") as f:
-            static_system_prompt = f.read().strip()
-        print(f"[DEBUG] Loaded system prompt from {GROK_CONTENT_FILE}, length: {len(static_system_prompt)} characters")
+        static_system_prompt = prompt_loader.get()
     except FileNotFoundError:
-        print(f"[ERROR] Failed to read {GROK_CONTENT_FILE}: File not found")
-        return f"Error: {GROK_CONTENT_FILE} not found. Please create it with the system prompt."
+        logger.error("Failed to read %s: File not found", GROK_CONTENT_FILE)
+        return None, None, f"Error: {GROK_CONTENT_FILE} not found. Please create it with the system prompt."
     except IOError as e:
-        print(f"[ERROR] Failed to read {GROK_CONTENT_FILE}: {str(e)}")
-        return f"Error: Failed to read {GROK_CONTENT_FILE} - {str(e)}"
-
-    # Construct enhanced system prompt with fetched data
-    enhanced_system_prompt = (
-        f"{static_system_prompt}\n\n"
-        f"Use the following TSLA, earnings, market, news, and timestamp data in your analysis:\n"
-        f"{market_and_news_data}\n\n"
-        f"{tesla_posts}"
-    )
-    
-    # Log the full prompt
-    full_prompt = (
-        f"[DEBUG] Full prompt sent to Grok API:\n"
-        f"System Prompt:\n{enhanced_system_prompt}\n\n"
-        f"User Query:\n{prompt}"
-    )
-    print(full_prompt)
-    
-    url = "https://api.x.ai/v1/chat/completions"
+        logger.error("Failed to read %s: %s", GROK_CONTENT_FILE, e)
+        return None, None, f"Error: Failed to read {GROK_CONTENT_FILE} - {str(e)}"
+    except PromptTemplateError as e:
+        logger.error("Invalid system prompt in %s: %s", GROK_CONTENT_FILE, e)
+        return None, None, f"Error: Invalid system prompt in {GROK_CONTENT_FILE} - {str(e)}"
+
+    # Construct the messages with fetched data, trimmed to the token budget
+    with metrics.span("prompt_build"):
+        messages, section_tokens, total_tokens = build_messages(
+            static_system_prompt, market_and_news_data, tesla_posts, prompt
+        )
+    logger.debug("Estimated prompt tokens (%s layout): %d %s", PROMPT_LAYOUT, total_tokens, section_tokens)
+
+    # Log the full prompt (sampled, DEBUG only)
+    if logger.isEnabledFor(logging.DEBUG):
+        log_payload(logger, "Full prompt sent to Grok API", "\n\n".join(
+            f"{message['role'].capitalize()} message:\n{message['content']}" for message in messages
+        ))
+
     headers = {
         "Authorization": f"Bearer {XAI_API_KEY}",
         "Content-Type": "application/json"
     }
     data = {
-        "model": "grok-3-mini",
-        "messages": [
-            {"role": "system", "content": enhanced_system_prompt},
-            {"role": "user", "content": prompt}
-        ]
+        "model": GROK_MODEL,
+        "messages": messages
     }
+    if stream:
+        data["stream"] = True
+        # Ask for a final chunk with the usage object so cached tokens are recorded for streams too
+        data["stream_options"] = {"include_usage": True}
+    return headers, data, None
+
+async def query_grok(prompt: str, market_and_news_data: str, tesla_posts: str) -> str:
+    headers, data, error = _build_request(prompt, market_and_news_data, tesla_posts)
+    if error:
+        return error
 
     timeout = aiohttp.ClientTimeout(total=20)
     for attempt in range(3):
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(url, headers=headers, json=data) as response:
-                    print(f"[DEBUG] API request attempt {attempt + 1}, status: {response.status}")
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result.get("choices", [{}])[0].get("message", {}).get("content", "No response received from Grok.")
-                        print(f"[DEBUG] Grok response length: {len(content)} characters")
-                        if len(content) > DISCORD_MAX_MESSAGE_LENGTH:
-                            content = content[:DISCORD_MAX_MESSAGE_LENGTH - 50] + "... (truncated due to length)"
-                        return content
-                    else:
-                        error_body = await response.text()
-                        return f"Error: API request failed with status {response.status}: {response.reason}\nHeaders: {response.headers}\nBody: {error_body[:1000]}"
+            session = await http_client.get_session()
+            async with session.post(GROK_API_URL, headers=headers, json=data, timeout=timeout) as response:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("API request attempt %d, status: %d, connection pool: %s",
+                                 attempt + 1, response.status, http_client.stats())
+                metrics.upstream("grok", response.status == 200)
+                if response.status == 200:
+                    result = await response.json()
+                    usage_stats.record(result.get("usage"))
+                    content = result.get("choices", [{}])[0].get("message", {}).get("content", NO_RESPONSE)
+                    logger.debug("Grok response length: %d characters", len(content))
+                    if len(content) > DISCORD_MAX_MESSAGE_LENGTH:
+                        content = content[:DISCORD_MAX_MESSAGE_LENGTH - 50] + "... (truncated due to length)"
+                    return content
+                else:
+                    error_body = await response.text()
+                    return f"Error: API request failed with status {response.status}: {response.reason}\nHeaders: {response.headers}\nBody: {error_body[:1000]}"
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            print(f"[ERROR] API request attempt {attempt + 1} failed: {type(e).__name__}: {str(e)}")
+            logger.error("API request attempt %s failed: %s: %s", attempt + 1, type(e).__name__, e)
+            metrics.upstream("grok", False)
             if attempt < 2:
                 await asyncio.sleep(2 ** attempt)
             continue
         except Exception as e:
-            print(f"[ERROR] Unexpected error in API request: {type(e).__name__}: {str(e)}")
+            logger.error("Unexpected error in API request: %s: %s", type(e).__name__, e)
+            metrics.upstream("grok", False)
             return f"Error: Failed to connect to Grok API - {str(e)}"
     return "Error: Failed to connect to Grok API after 3 attempts."
+
+async def stream_grok(prompt: str, market_and_news_data: str, tesla_posts: str):
+    """
+    Streaming variant of query_grok: yields the completion text in chunks as server-sent events arrive.
+    Failures before the first chunk are retried like query_grok and end in a single error chunk;
+    a failure mid-stream ends the stream with INTERRUPTED_NOTE. The time from sending the request
+    to the first content chunk is recorded as the "grok_first_token" stage, to measure the effect
+    of the prompt layout and provider-side prompt caching.
+    """
+    headers, data, error = _build_request(prompt, market_and_news_data, tesla_posts, stream=True)
+    if error:
+        yield error
+        return
+
+    # No total timeout: a long answer may stream for longer than the non-streaming limit
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=20)
+    for attempt in range(3):
+        received = False
+        started = time.perf_counter()
+        try:
+            session = await http_client.get_session()
+            async with session.post(GROK_API_URL, headers=headers, json=data, timeout=timeout) as response:
+                logger.debug("Streaming API request attempt %d, status: %d", attempt + 1, response.status)
+                metrics.upstream("grok", response.status == 200)
+                if response.status != 200:
+                    error_body = await response.text()
+                    yield f"Error: API request failed with status {response.status}: {response.reason}\nBody: {error_body[:1000]}"
+                    return
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        return
+                    chunk = json.loads(payload)
+                    if chunk.get("usage"):
+                        usage_stats.record(chunk["usage"])
+                    delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    if delta:
+                        if not received:
+                            metrics.observe("grok_first_token", time.perf_counter() - started)
+                            received = True
+                        yield delta
+                return
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Streaming API request attempt %s failed: %s: %s", attempt + 1, type(e).__name__, e)
+            metrics.upstream("grok", False)
+            if received:
+                yield INTERRUPTED_NOTE
+                return
+            if attempt < 2:
+                await asyncio.sleep(2 ** attempt)
+            continue
+        except Exception as e:
+            logger.error("Unexpected error in streaming API request: %s: %s", type(e).__name__, e)
+            metrics.upstream("grok", False)
+            yield INTERRUPTED_NOTE if received else f"Error: Failed to connect to Grok API - {str(e)}"
+            return
+    yield "Error: Failed to connect to Grok API after 3 attempts."
@@ -0,0 +1,78 @@
+import asyncio
+import aiohttp
+from config import HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT
+
+class HttpClient:
+    """
+    Long-lived aiohttp session shared by all outbound HTTP calls.
+    Keeps a bounded pool of keep-alive connections with DNS caching, and records how much
+    time requests spend setting up new connections.
+    """
+
+    def __init__(self, limit=HTTP_POOL_LIMIT, limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                 dns_cache_ttl=HTTP_DNS_CACHE_TTL, keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+        self._keepalive_timeout = keepalive_timeout
+        self._session = None
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.connect_seconds_total = 0.0
+        self.last_connect_seconds = 0.0
+
+    async def start(self):
+        """Open the session. Called from the bot's setup_hook; safe to call twice."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self._limit,
+            limit_per_host=self._limit_per_host,
+            ttl_dns_cache=self._dns_cache_ttl,
+            keepalive_timeout=self._keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+
+    async def close(self):
+        """Close the session and its pooled connections. Called when the bot shuts down."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def get_session(self):
+        """Return the shared session, opening it first if the bot lifecycle has not done so yet."""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def stats(self):
+        """Return connection pool counters; connect times are for new TCP/TLS connections only."""
+        average = self.connect_seconds_total / self.connections_created if self.connections_created else 0.0
+        return {
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "avg_connect_ms": round(average * 1000, 1),
+            "last_connect_ms": round(self.last_connect_seconds * 1000, 1),
+        }
+
+    def _trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_started = asyncio.get_running_loop().time()
+
+        async def on_connection_create_end(session, context, params):
+            elapsed = asyncio.get_running_loop().time() - context.connect_started
+            self.connections_created += 1
+            self.connect_seconds_total += elapsed
+            self.last_connect_seconds = elapsed
+
+        async def on_connection_reuseconn(session, context, params):
+            self.connections_reused += 1
+
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+http_client = HttpClient()
@@ -0,0 +1,137 @@
+import asyncio
+import io
+import logging
+import time
+from collections import OrderedDict
+import aiohttp
+import discord
+from http_client import http_client
+from singleflight import flights
+from config import IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_TTL, IMAGE_MAX_BYTES, IMAGE_FETCH_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class ImageTooLarge(Exception):
+    """Raised when an image exceeds the per-image size limit."""
+
+class _CachedImage:
+    __slots__ = ("url", "etag", "data", "checked_at")
+
+    def __init__(self, url, etag, data):
+        self.url = url
+        self.etag = etag
+        self.data = data
+        self.checked_at = time.monotonic()
+
+class ImageCache:
+    """
+    In-memory image bytes for response attachments, keyed by (URL, ETag).
+    Images younger than `ttl` seconds are served without a request; older ones are revalidated
+    with If-None-Match, so an unchanged image costs a 304 instead of a download. The cache is
+    LRU-bounded by total bytes, and each download is capped in size and time. Nothing touches disk.
+    Args:
+        max_bytes (int): Total bytes kept.
+        ttl (float): Seconds an image is served without revalidation.
+        max_image_bytes (int): Largest single image accepted.
+        timeout (float): Seconds allowed per download.
+    """
+
+    def __init__(self, max_bytes=IMAGE_CACHE_MAX_BYTES, ttl=IMAGE_CACHE_TTL,
+                 max_image_bytes=IMAGE_MAX_BYTES, timeout=IMAGE_FETCH_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_image_bytes = max_image_bytes
+        self.timeout = timeout
+        self._entries = OrderedDict()  # (url, etag) -> _CachedImage
+        self._current = {}  # url -> (url, etag) key of its latest version
+        self._bytes = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.downloads = 0
+        self.failures = 0
+
+    async def get(self, url):
+        """Return the image bytes for a URL, or None if it cannot be fetched within the limits."""
+        entry = self._lookup(url)
+        if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+            self.hits += 1
+            return entry.data
+        # Concurrent mentions asking for the same image share one request
+        return await flights.do(("image", url), self._fetch, url)
+
+    async def files(self, urls):
+        """Download all images concurrently and wrap the ones that succeeded as discord.File attachments."""
+        images = await asyncio.gather(*(self.get(url) for url in urls))
+        return [
+            discord.File(io.BytesIO(data), filename=f"image{i}.png")
+            for i, data in enumerate(images) if data is not None
+        ]
+
+    def _lookup(self, url):
+        key = self._current.get(url)
+        if key is None:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    async def _fetch(self, url):
+        cached = self._lookup(url)
+        headers = {"If-None-Match": cached.etag} if cached is not None and cached.etag else {}
+        try:
+            session = await http_client.get_session()
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with session.get(url, headers=headers, timeout=timeout) as response:
+                if response.status == 304 and cached is not None:
+                    cached.checked_at = time.monotonic()
+                    self.revalidated += 1
+                    return cached.data
+                if response.status != 200:
+                    logger.error("Failed to download image %s: status %s", url, response.status)
+                    self.failures += 1
+                    return None
+                if (response.content_length or 0) > self.max_image_bytes:
+                    raise ImageTooLarge(f"{response.content_length} bytes")
+                data = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    data += chunk
+                    if len(data) > self.max_image_bytes:
+                        raise ImageTooLarge(f"over {self.max_image_bytes} bytes")
+                etag = response.headers.get("ETag")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ImageTooLarge) as e:
+            logger.error("Failed to download image %s: %s: %s", url, type(e).__name__, e)
+            self.failures += 1
+            # A stale copy beats no image
+            return cached.data if cached is not None else None
+
+        self.downloads += 1
+        data = bytes(data)
+        self._store(url, etag, data)
+        return data
+
+    def _store(self, url, etag, data):
+        old_key = self._current.pop(url, None)
+        if old_key is not None:
+            self._bytes -= len(self._entries.pop(old_key).data)
+        if len(data) > self.max_bytes:
+            return
+        key = (url, etag)
+        self._entries[key] = _CachedImage(url, etag, data)
+        self._current[url] = key
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._current.pop(evicted.url, None)
+            self._bytes -= len(evicted.data)
+
+    def stats(self):
+        """Return hit, revalidation and download counters and memory use."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "downloads": self.downloads,
+            "failures": self.failures,
+        }
+
+image_cache = ImageCache()
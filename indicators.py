@@ -0,0 +1,266 @@
+import math
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# === Streaming state objects: O(1) work per new bar ===
+
+class RSIState:
+    """
+    Incremental RSI.
+    Args:
+        periods (int): Lookback length.
+        smoothing (str): "sma" reproduces utils.calculate_rsi (rolling mean of gains/losses),
+            "wilder" uses Wilder's smoothing seeded with the first `periods` deltas.
+    """
+
+    def __init__(self, periods=14, smoothing="sma"):
+        if smoothing not in ("sma", "wilder"):
+            raise ValueError(f"Unknown RSI smoothing: {smoothing}")
+        self.periods = periods
+        self.smoothing = smoothing
+        self.value = math.nan
+        self._prev = None
+        self._count = 0
+        self._gains = deque(maxlen=periods)
+        self._losses = deque(maxlen=periods)
+        self._gain_sum = 0.0
+        self._loss_sum = 0.0
+        self._avg_gain = math.nan
+        self._avg_loss = math.nan
+
+    def update(self, close):
+        if self._prev is None:
+            # utils.calculate_rsi counts the first (NaN) delta as a zero gain/loss
+            delta = 0.0 if self.smoothing == "sma" else None
+        else:
+            delta = close - self._prev
+            if math.isnan(delta):
+                # Like pandas' where(), a missing close counts as no move
+                delta = 0.0
+        self._prev = close
+        if delta is None:
+            return self.value
+
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        self._count += 1
+        if self.smoothing == "sma" or self._count <= self.periods:
+            if len(self._gains) == self.periods:
+                self._gain_sum -= self._gains[0]
+                self._loss_sum -= self._losses[0]
+            self._gains.append(gain)
+            self._losses.append(loss)
+            self._gain_sum += gain
+            self._loss_sum += loss
+            if self._count < self.periods:
+                return self.value
+            self._avg_gain = self._gain_sum / self.periods
+            self._avg_loss = self._loss_sum / self.periods
+        else:
+            self._avg_gain = (self._avg_gain * (self.periods - 1) + gain) / self.periods
+            self._avg_loss = (self._avg_loss * (self.periods - 1) + loss) / self.periods
+
+        self.value = _rsi_from_averages(self._avg_gain, self._avg_loss)
+        return self.value
+
+class EMAState:
+    """Incremental EMA, equal to pandas ewm(span=span, adjust=False).mean()."""
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = math.nan
+
+    def update(self, value):
+        if math.isnan(self.value):
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+class MACDState:
+    """Incremental MACD line, signal line and histogram."""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self._fast = EMAState(fast)
+        self._slow = EMAState(slow)
+        self._signal = EMAState(signal)
+        self.macd = self.signal = self.histogram = math.nan
+
+    def update(self, close):
+        self.macd = self._fast.update(close) - self._slow.update(close)
+        self.signal = self._signal.update(self.macd)
+        self.histogram = self.macd - self.signal
+        return self.macd, self.signal, self.histogram
+
+class BollingerState:
+    """Incremental Bollinger bands over a rolling window (sample standard deviation, like pandas)."""
+
+    def __init__(self, window=20, num_std=2.0):
+        self.window = window
+        self.num_std = num_std
+        self._values = deque(maxlen=window)
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self.middle = self.upper = self.lower = math.nan
+
+    def update(self, close):
+        if len(self._values) == self.window:
+            old = self._values[0]
+            self._sum -= old
+            self._sum_sq -= old * old
+        self._values.append(close)
+        self._sum += close
+        self._sum_sq += close * close
+        if len(self._values) < self.window:
+            return self.middle, self.upper, self.lower
+
+        self.middle = self._sum / self.window
+        variance = max((self._sum_sq - self.window * self.middle * self.middle) / (self.window - 1), 0.0)
+        band = self.num_std * math.sqrt(variance)
+        self.upper = self.middle + band
+        self.lower = self.middle - band
+        return self.middle, self.upper, self.lower
+
+class ATRState:
+    """Incremental Average True Range with Wilder smoothing, seeded by the mean of the first `periods` ranges."""
+
+    def __init__(self, periods=14):
+        self.periods = periods
+        self.value = math.nan
+        self._prev_close = None
+        self._count = 0
+        self._tr_sum = 0.0
+
+    def update(self, high, low, close):
+        if self._prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self._count += 1
+        if self._count < self.periods:
+            self._tr_sum += true_range
+        elif self._count == self.periods:
+            self.value = (self._tr_sum + true_range) / self.periods
+        else:
+            self.value = (self.value * (self.periods - 1) + true_range) / self.periods
+        return self.value
+
+class IndicatorEngine:
+    """
+    All indicator states for one ticker, updated together once per bar.
+    Args:
+        rsi_smoothing (str): Passed to RSIState.
+    """
+
+    def __init__(self, rsi_smoothing="sma"):
+        self.rsi = RSIState(smoothing=rsi_smoothing)
+        self.macd = MACDState()
+        self.bollinger = BollingerState()
+        self.atr = ATRState()
+
+    def update(self, high, low, close):
+        """
+        Feed one bar and return the latest values.
+        Returns:
+            dict: Same keys as compute_indicators().
+        """
+        rsi = self.rsi.update(close)
+        macd, signal, histogram = self.macd.update(close)
+        middle, upper, lower = self.bollinger.update(close)
+        atr = self.atr.update(high, low, close)
+        return {
+            "rsi": rsi, "macd": macd, "macd_signal": signal, "macd_hist": histogram,
+            "bb_middle": middle, "bb_upper": upper, "bb_lower": lower, "atr": atr,
+        }
+
+# === Vectorized batch path: many tickers at once ===
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - (100 / (1 + np.divide(avg_gain, avg_loss)))
+
+def _ema(values, span):
+    alpha = 2.0 / (span + 1)
+    out = np.empty_like(values)
+    out[:, 0] = values[:, 0]
+    for t in range(1, values.shape[1]):
+        out[:, t] = out[:, t - 1] + alpha * (values[:, t] - out[:, t - 1])
+    return out
+
+def _wilder(values, periods):
+    """Wilder smoothing along the bar axis, seeded by the mean of the first `periods` values."""
+    out = np.full_like(values, np.nan)
+    if values.shape[1] < periods:
+        return out
+    out[:, periods - 1] = values[:, :periods].mean(axis=1)
+    for t in range(periods, values.shape[1]):
+        out[:, t] = (out[:, t - 1] * (periods - 1) + values[:, t]) / periods
+    return out
+
+def _rolling_mean(values, window):
+    out = np.full_like(values, np.nan)
+    if values.shape[1] >= window:
+        out[:, window - 1:] = sliding_window_view(values, window, axis=1).mean(axis=2)
+    return out
+
+def _rolling_std(values, window):
+    out = np.full_like(values, np.nan)
+    if values.shape[1] >= window:
+        out[:, window - 1:] = sliding_window_view(values, window, axis=1).std(axis=2, ddof=1)
+    return out
+
+def compute_indicators(closes, highs=None, lows=None, rsi_periods=14, rsi_smoothing="sma"):
+    """
+    Compute RSI, MACD, Bollinger bands and ATR for many tickers in one vectorized pass.
+    Rows are tickers and columns are bars (oldest first); all rows must share the same bars.
+    Args:
+        closes (array-like): Closing prices, shape (tickers, bars) or (bars,).
+        highs (array-like): High prices, same shape. Defaults to closes.
+        lows (array-like): Low prices, same shape. Defaults to closes.
+        rsi_periods (int): RSI lookback.
+        rsi_smoothing (str): "sma" (matches utils.calculate_rsi) or "wilder".
+    Returns:
+        dict: Indicator name -> array of the input shape, NaN until enough bars are available.
+    """
+    closes = np.asarray(closes, dtype=float)
+    squeeze = closes.ndim == 1
+    closes = np.atleast_2d(closes)
+    highs = closes if highs is None else np.atleast_2d(np.asarray(highs, dtype=float))
+    lows = closes if lows is None else np.atleast_2d(np.asarray(lows, dtype=float))
+
+    # Like pandas' where() in utils.calculate_rsi, missing deltas (first bar, missing closes) count as no move
+    delta = np.nan_to_num(np.diff(closes, axis=1, prepend=np.nan), nan=0.0)
+    if rsi_smoothing == "sma":
+        gains, losses = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+        avg_gain, avg_loss = _rolling_mean(gains, rsi_periods), _rolling_mean(losses, rsi_periods)
+    elif rsi_smoothing == "wilder":
+        gains, losses = np.clip(delta[:, 1:], 0, None), np.clip(-delta[:, 1:], 0, None)
+        avg_gain = np.concatenate([np.full((closes.shape[0], 1), np.nan), _wilder(gains, rsi_periods)], axis=1)
+        avg_loss = np.concatenate([np.full((closes.shape[0], 1), np.nan), _wilder(losses, rsi_periods)], axis=1)
+    else:
+        raise ValueError(f"Unknown RSI smoothing: {rsi_smoothing}")
+
+    macd = _ema(closes, 12) - _ema(closes, 26)
+    signal = _ema(macd, 9)
+    middle = _rolling_mean(closes, 20)
+    band = 2.0 * _rolling_std(closes, 20)
+
+    prev_close = np.concatenate([closes[:, :1], closes[:, :-1]], axis=1)
+    true_range = np.maximum.reduce([highs - lows, np.abs(highs - prev_close), np.abs(lows - prev_close)])
+    true_range[:, 0] = highs[:, 0] - lows[:, 0]
+
+    result = {
+        "rsi": _rsi_from_averages(avg_gain, avg_loss),
+        "macd": macd,
+        "macd_signal": signal,
+        "macd_hist": macd - signal,
+        "bb_middle": middle,
+        "bb_upper": middle + band,
+        "bb_lower": middle - band,
+        "atr": _wilder(true_range, 14),
+    }
+    if squeeze:
+        result = {name: values[0] for name, values in result.items()}
+    return result
@@ -0,0 +1,102 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from config import LOG_LEVEL, LOG_FORMAT, LOG_MAX_CHARS, LOG_PAYLOAD_SAMPLE_RATE
+
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+def truncate(text, max_chars=LOG_MAX_CHARS):
+    """Cut text longer than max_chars, noting how much was dropped."""
+    if max_chars and len(text) > max_chars:
+        return f"{text[:max_chars]}... ({len(text) - max_chars} more characters)"
+    return text
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, exception and any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that only resolves and truncates the message on the calling thread; encoding
+    and the write to stdout happen on the listener thread, off the event loop.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, stream=None):
+    """
+    Route all logging through an unbounded queue to a background listener thread writing to
+    `stream` (stdout by default). Safe to call more than once; later calls are ignored.
+    Args:
+        level (str): Root log level, e.g. "INFO" or "DEBUG".
+        log_format (str): "json" for one JSON object per line, "text" for plain lines.
+    Returns:
+        logging.handlers.QueueListener: The running listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_TruncatingQueueHandler(log_queue))
+    root.setLevel(level.upper())
+    # discord.py is chatty at DEBUG (every gateway event); keep it at INFO unless asked otherwise
+    logging.getLogger("discord").setLevel(max(root.level, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def log_payload(logger, label, text):
+    """
+    Log a large payload (full prompts, message dumps) at DEBUG, sampled at LOG_PAYLOAD_SAMPLE_RATE.
+    Callers should pass cheap-to-build text or check logger.isEnabledFor(logging.DEBUG) first.
+    """
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        logger.debug("%s (%d characters):\n%s", label, len(text), text)
@@ -0,0 +1,234 @@
+import logging
+import asyncio
+import math
+import time
+from singleflight import flights
+from metrics import metrics
+from datetime import datetime, timezone
+from config import (
+    MARKET_REFRESH_INTERVAL, MARKET_SECTION_TTLS, MARKET_SESSION_SECTIONS, MARKET_SESSION_TTLS,
+    MARKET_CLOSED_REFRESH_INTERVAL,
+)
+from market_hours import session_at, CLOSED
+from data_fetcher import (
+    fetch_quotes_async, fetch_history_async, fetch_earnings_async, fetch_news_async,
+    format_market_and_news_data,
+)
+
+logger = logging.getLogger(__name__)
+
+# Upstream service behind each section, for the metrics endpoint (news_client counts its own calls)
+SECTION_UPSTREAMS = {
+    "quote": "yfinance",
+    "history": "yfinance",
+    "earnings": "yfinance",
+}
+
+SECTION_FETCHERS = {
+    "quote": fetch_quotes_async,
+    "history": fetch_history_async,
+    "earnings": fetch_earnings_async,
+    "news": fetch_news_async,
+}
+
+class MarketSnapshot:
+    """
+    Immutable view of the market sections at one point in time.
+    The prompt text is rendered once when the snapshot is built, so readers get it in O(1).
+    """
+    __slots__ = ("version", "sections", "fetched_at", "created_at", "text")
+
+    def __init__(self, version, sections, fetched_at):
+        self.version = version
+        self.sections = sections
+        self.fetched_at = fetched_at
+        self.created_at = time.time()
+        self.text = format_market_and_news_data(sections, fetched_at)
+
+    def age(self, now=None):
+        """Seconds since this snapshot was built."""
+        return (now or time.time()) - self.created_at
+
+    def section_ages(self, now=None):
+        """Seconds since each section was last fetched successfully."""
+        now = now or time.time()
+        return {name: round(now - fetched, 1) for name, fetched in self.fetched_at.items()}
+
+class MarketCache:
+    """
+    Keeps the latest MarketSnapshot and refreshes expired sections in the background.
+    Args:
+        fetchers (dict): Section name -> async fetch function.
+        ttls (dict): Section name -> time to live in seconds.
+        refresh_interval (int): Seconds between background refresh passes while NYSE trades.
+        session_sections (tuple): Sections refreshed by NYSE session (see stale_sections).
+        session_ttls (dict): Session name -> {section name: time to live in seconds}.
+        closed_refresh_interval (int): Seconds between passes while the market is closed.
+    """
+
+    def __init__(self, fetchers=None, ttls=None, refresh_interval=MARKET_REFRESH_INTERVAL,
+                 session_sections=MARKET_SESSION_SECTIONS, session_ttls=MARKET_SESSION_TTLS,
+                 closed_refresh_interval=MARKET_CLOSED_REFRESH_INTERVAL):
+        self._fetchers = fetchers or SECTION_FETCHERS
+        self._ttls = ttls or MARKET_SECTION_TTLS
+        self._refresh_interval = refresh_interval
+        self._session_sections = session_sections
+        self._session_ttls = session_ttls
+        self._closed_refresh_interval = closed_refresh_interval
+        self._snapshot = None
+        self._valid_until = 0.0  # when the first section of the snapshot goes stale
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._refreshers = []
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def section_expiries(self, now=None):
+        """
+        Return when each section goes stale (0 for sections never fetched).
+        Session sections (quotes, history) use the TTL of the current NYSE session and are
+        always re-fetched once when a session starts or ends; while the market is closed they
+        are not re-fetched at all.
+        """
+        now = now or time.time()
+        fetched_at = self._snapshot.fetched_at if self._snapshot else {}
+        session, session_start, session_end = session_at(datetime.fromtimestamp(now, timezone.utc))
+        session_end = session_end.timestamp() if session_end is not None else math.inf
+        expiries = {}
+        for name in self._fetchers:
+            if name not in fetched_at:
+                expiries[name] = 0.0
+            elif name in self._session_sections:
+                if session_start is not None and fetched_at[name] < session_start.timestamp():
+                    expiries[name] = 0.0
+                elif session == CLOSED:
+                    expiries[name] = session_end
+                else:
+                    expiries[name] = min(fetched_at[name] + self._session_ttls[session].get(name, 0), session_end)
+            else:
+                expiries[name] = fetched_at[name] + self._ttls.get(name, 0)
+        return expiries
+
+    def stale_sections(self, now=None):
+        """Return the sections that were never fetched or whose TTL has expired."""
+        now = now or time.time()
+        return [name for name, expiry in self.section_expiries(now).items() if expiry <= now]
+
+    async def refresh(self, force=False):
+        """
+        Re-fetch expired sections (or all of them with force=True) and publish a new snapshot.
+        A section that fails to fetch keeps its previous value and is retried on the next pass.
+        Returns:
+            MarketSnapshot: The latest snapshot.
+        """
+        async with self._lock:
+            stale = list(self._fetchers) if force else self.stale_sections()
+            if not stale and self._snapshot is not None:
+                self._valid_until = min(self.section_expiries().values(), default=math.inf)
+                return self._snapshot
+
+            previous = self._snapshot
+            sections = dict(previous.sections) if previous else {}
+            fetched_at = dict(previous.fetched_at) if previous else {}
+            refreshed = []
+            # Sections are independent, so fetch them concurrently
+            results = await asyncio.gather(*(self._fetch(name) for name in stale), return_exceptions=True)
+            for name, result in zip(stale, results):
+                if name in SECTION_UPSTREAMS:
+                    metrics.upstream(SECTION_UPSTREAMS[name], not isinstance(result, Exception))
+                if isinstance(result, Exception):
+                    logger.error("Failed to refresh market section '%s': %s: %s", name, type(result).__name__, result)
+                    continue
+                sections[name] = result
+                fetched_at[name] = time.time()
+                refreshed.append(name)
+
+            if refreshed or previous is None:
+                version = previous.version + 1 if previous else 1
+                self._snapshot = MarketSnapshot(version, sections, fetched_at)
+                logger.debug("Market snapshot v%d published (refreshed: %s)", version, ", ".join(refreshed) or "none")
+            # Computed once per pass, so readers only compare a timestamp
+            self._valid_until = min(self.section_expiries().values(), default=math.inf)
+            return self._snapshot
+
+    async def _fetch(self, name):
+        with metrics.span(f"market_{name}"):
+            return await self._fetchers[name]()
+
+    async def get_snapshot(self):
+        """
+        Return the latest snapshot, whose text and version always belong together.
+        Only the very first call (before the background task has filled the cache) waits on upstream.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.misses += 1
+            snapshot = await flights.do(("market",), self.refresh)
+        elif time.time() >= self._valid_until:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return snapshot
+
+    async def get_text(self):
+        """Return the prompt text of the latest snapshot."""
+        return (await self.get_snapshot()).text
+
+    def stats(self):
+        """Return snapshot version, age and hit/miss counters."""
+        snapshot = self._snapshot
+        now = time.time()
+        return {
+            "version": snapshot.version if snapshot else 0,
+            "age_seconds": round(snapshot.age(now), 1) if snapshot else None,
+            "section_ages": snapshot.section_ages(now) if snapshot else {},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def add_refresher(self, refresh):
+        """Register an async function run after every background pass, for data kept outside the snapshot."""
+        self._refreshers.append(refresh)
+
+    def start(self):
+        """Start the background refresh task. Safe to call again on reconnect."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def next_refresh_delay(self, now=None):
+        """Seconds until the next background pass: short while NYSE trades, long while it is closed."""
+        now = now or time.time()
+        session, _, session_end = session_at(datetime.fromtimestamp(now, timezone.utc))
+        if session != CLOSED:
+            return self._refresh_interval
+        # Wake up for the next open even if the closed interval has not run out
+        until_open = session_end.timestamp() - now if session_end is not None else self._closed_refresh_interval
+        return max(1.0, min(self._closed_refresh_interval, until_open))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Market cache refresh failed: %s: %s", type(e).__name__, e)
+            for refresh in self._refreshers:
+                try:
+                    await refresh()
+                except Exception as e:
+                    logger.error("Background refresh %s failed: %s: %s", refresh.__qualname__, type(e).__name__, e)
+            await asyncio.sleep(self.next_refresh_delay())
+
+market_cache = MarketCache()
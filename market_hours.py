@@ -0,0 +1,117 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+PRE_MARKET = "pre-market"
+REGULAR = "regular"
+AFTER_HOURS = "after-hours"
+CLOSED = "closed"
+
+PRE_MARKET_OPEN = time(4, 0)
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+AFTER_HOURS_CLOSE = time(20, 0)
+EARLY_AFTER_HOURS_CLOSE = time(17, 0)
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th given weekday (0 = Monday) of a month; n=-1 for the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=8)
+def nyse_holidays(year):
+    """Full-day NYSE closures of a year, from the exchange's holiday rules."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    # New Year's Day on a Saturday is not observed on the Friday before (NYSE rule 7.2)
+    if date(year, 1, 1).weekday() != 5:
+        holidays.add(_observed(date(year, 1, 1)))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+@lru_cache(maxsize=8)
+def nyse_early_closes(year):
+    """Days the regular session closes at 13:00 ET."""
+    early = {
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # Day after Thanksgiving
+        date(year, 12, 24),  # Christmas Eve
+        date(year, 7, 3),  # Day before Independence Day
+    }
+    return frozenset(day for day in early if is_trading_day(day))
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+def _day_sessions(day):
+    """(start, end, session) of the trading sessions of one day, in New York time."""
+    if not is_trading_day(day):
+        return []
+    early = day in nyse_early_closes(day.year)
+    close = EARLY_CLOSE if early else REGULAR_CLOSE
+    after_close = EARLY_AFTER_HOURS_CLOSE if early else AFTER_HOURS_CLOSE
+
+    def at(clock):
+        return datetime.combine(day, clock, tzinfo=NEW_YORK)
+
+    return [
+        (at(PRE_MARKET_OPEN), at(REGULAR_OPEN), PRE_MARKET),
+        (at(REGULAR_OPEN), at(close), REGULAR),
+        (at(close), at(after_close), AFTER_HOURS),
+    ]
+
+def session_at(now=None):
+    """
+    Return the NYSE session at a moment.
+    Returns:
+        tuple: (session name, start, end) with timezone-aware datetimes. For CLOSED, start is the
+            end of the previous session and end is the start of the next one.
+    """
+    now = (now or datetime.now(NEW_YORK)).astimezone(NEW_YORK)
+    today = now.date()
+    previous_end = None
+    # Two weeks either way covers every weekend/holiday gap
+    for offset in range(-14, 15):
+        for start, end, name in _day_sessions(today + timedelta(days=offset)):
+            if start <= now < end:
+                return name, start, end
+            if end <= now:
+                previous_end = end
+            elif start > now:
+                return CLOSED, previous_end, start
+    return CLOSED, previous_end, None
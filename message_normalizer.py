@@ -0,0 +1,79 @@
+import re
+from collections import OrderedDict
+import discord
+from config import NORMALIZE_CACHE_SIZE
+
+X_STATUS_URL_RE = re.compile(r"https?://x\.com/[^\s]+/status/(\d+)")
+DISCORD_MESSAGE_URL_RE = re.compile(r"https://discord\.com/channels/(\d+)/(\d+)/(\d+)")
+
+class EmbedRecord:
+    """Text and image fields of one embed."""
+    __slots__ = ("title", "description", "fields", "url", "footer", "image_url", "details")
+
+    def __init__(self, embed: discord.Embed):
+        self.title = embed.title
+        self.description = embed.description
+        self.fields = tuple((field.name, field.value) for field in embed.fields)
+        self.url = embed.url
+        self.footer = embed.footer.text if embed.footer and embed.footer.text else None
+        self.image_url = embed.image.url if embed.image and embed.image.url else None
+
+        details = []
+        if self.title:
+            details.append(f"Title: {self.title}")
+        if self.description:
+            details.append(f"Description: {self.description}")
+        for name, value in self.fields:
+            details.append(f"Field - {name}: {value}")
+        self.details = "\n".join(details) if details else "No embed details"
+
+class NormalizedMessage:
+    """
+    Compact, immutable view of a discord.Message with everything the prompt code needs
+    already extracted: text, author, timestamp, embeds, X status URL, Discord message links
+    and image URLs.
+    """
+    __slots__ = ("id", "channel_id", "author", "timestamp", "text", "embeds", "x_url", "message_links", "image_urls")
+
+    def __init__(self, message: discord.Message):
+        self.id = message.id
+        self.channel_id = message.channel.id
+        self.author = message.author.name
+        self.timestamp = message.created_at
+        self.text = message.content.strip()
+        self.embeds = tuple(EmbedRecord(embed) for embed in message.embeds)
+
+        url_match = X_STATUS_URL_RE.search(self.text)
+        self.x_url = url_match.group(0) if url_match else None
+        self.message_links = tuple(
+            tuple(int(part) for part in match.groups())
+            for embed in self.embeds if embed.url and "discord.com/channels" in embed.url
+            for match in [DISCORD_MESSAGE_URL_RE.search(embed.url)] if match
+        )
+        self.image_urls = tuple(embed.image_url for embed in self.embeds if embed.image_url)
+
+_cache = OrderedDict()  # message ID -> (edited_at, NormalizedMessage)
+
+def normalize_message(message: discord.Message):
+    """
+    Return the NormalizedMessage for a message, memoized by (message ID, edit time) so repeat
+    references to the same message cost one dictionary lookup. The cache keeps the
+    NORMALIZE_CACHE_SIZE most recently used messages.
+    """
+    entry = _cache.get(message.id)
+    if entry is not None and entry[0] == message.edited_at:
+        _cache.move_to_end(message.id)
+        return entry[1]
+    record = NormalizedMessage(message)
+    _cache[message.id] = (message.edited_at, record)
+    _cache.move_to_end(message.id)
+    if len(_cache) > NORMALIZE_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return record
+
+def forget_message(message_id):
+    """
+    Drop the memoized record of a message. Called on every edit and delete: Discord adds link
+    embeds with a MESSAGE_UPDATE that leaves edited_at unchanged, so the key alone misses them.
+    """
+    _cache.pop(message_id, None)
@@ -0,0 +1,161 @@
+import bisect
+import logging
+import time
+from aiohttp import web
+from config import METRICS_HOST, METRICS_PORT, METRICS_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "hyperbullish"
+
+class Histogram:
+    """Cumulative-bucket latency histogram in seconds, as Prometheus expects it."""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+class _Span:
+    __slots__ = ("_metrics", "_stage", "_started")
+
+    def __init__(self, metrics, stage):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._metrics.observe(self._stage, time.perf_counter() - self._started, error=exc_type is not None)
+        return False
+
+class Metrics:
+    """
+    In-process latency histograms and counters for the mention pipeline.
+    Recording is a perf_counter() call, a bisect and a few integer additions; everything else
+    (rendering, the HTTP endpoint) happens only when the endpoint is scraped.
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._stages = {}  # stage -> Histogram
+        self._stage_errors = {}  # stage -> count
+        self._upstream = {}  # (upstream, outcome) -> count
+        self._collectors = {}  # component -> (callable returning a stats() dict, counter keys)
+        self._runner = None
+
+    def span(self, stage):
+        """
+        Time a block as one observation of `stage`; an exception leaving the block counts as an error.
+        Usage: `with metrics.span("grok"): ...`
+        """
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds, error=False):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            histogram = self._stages[stage] = Histogram(self._buckets)
+            self._stage_errors[stage] = 0
+        histogram.observe(seconds)
+        if error:
+            self._stage_errors[stage] += 1
+
+    def upstream(self, name, ok):
+        """Count one call to an upstream service (yfinance, newsapi, grok, discord)."""
+        key = (name, "ok" if ok else "error")
+        self._upstream[key] = self._upstream.get(key, 0) + 1
+
+    def add_collector(self, component, stats, counters=()):
+        """
+        Export the numeric values of `stats()` (e.g. answer_cache.stats) on every scrape. The keys
+        in `counters` only ever grow and are exported as counters with a _total suffix; the rest
+        are gauges.
+        """
+        self._collectors[component] = (stats, frozenset(counters))
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Duration of mention pipeline stages.",
+            f"# TYPE {PREFIX}_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self._stages.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines += [
+            f"# HELP {PREFIX}_stage_errors_total Pipeline stages that ended with an exception.",
+            f"# TYPE {PREFIX}_stage_errors_total counter",
+        ]
+        for stage, count in sorted(self._stage_errors.items()):
+            lines.append(f'{PREFIX}_stage_errors_total{{stage="{stage}"}} {count}')
+
+        lines += [
+            f"# HELP {PREFIX}_upstream_requests_total Calls to upstream services by outcome.",
+            f"# TYPE {PREFIX}_upstream_requests_total counter",
+        ]
+        for (name, outcome), count in sorted(self._upstream.items()):
+            lines.append(f'{PREFIX}_upstream_requests_total{{upstream="{name}",outcome="{outcome}"}} {count}')
+
+        for component, (stats, counters) in self._collectors.items():
+            try:
+                values = stats()
+            except Exception as e:
+                logger.error("Failed to collect %s stats: %s: %s", component, type(e).__name__, e)
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{PREFIX}_{component}_{key}"
+                if key in counters:
+                    name += "_total"
+                    lines.append(f"# TYPE {name} counter")
+                else:
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def start(self, host=METRICS_HOST, port=METRICS_PORT):
+        """
+        Serve GET /metrics on host:port. A port of 0 disables the endpoint. If the port cannot be
+        bound (e.g. another instance holds it), the error is logged and the bot runs without it.
+        """
+        if not port or self._runner is not None:
+            return
+
+        async def handle(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+        except OSError as e:
+            await runner.cleanup()
+            logger.error("Metrics endpoint disabled, cannot listen on %s:%s: %s: %s", host, port, type(e).__name__, e)
+            return
+        self._runner = runner
+        logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics = Metrics()
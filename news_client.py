@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+import aiohttp
+from http_client import http_client
+from singleflight import flights
+from metrics import metrics
+from config import NEWS_API_KEY, NEWS_API_URL, NEWS_RETRY_INTERVAL, NEWS_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+NEWS_PARAMS = {"category": "general", "language": "en", "sortBy": "publishedAt"}
+
+class NewsClient:
+    """
+    Async NewsAPI top-headlines client that revalidates its copy with If-None-Match/If-Modified-Since,
+    so a refresh of unchanged headlines is a cheap 304. How often to refresh is up to the caller
+    (the market cache's news section TTL). After a failed request it backs off for
+    `retry_interval` seconds instead of hitting NewsAPI again on every refresh.
+    Args:
+        api_key (str): NewsAPI key; without one, fetch() returns None.
+        url (str): Top-headlines endpoint.
+        retry_interval (float): Seconds to wait after a failed request.
+        timeout (float): Seconds allowed per request.
+        limit (int): Headlines kept.
+    """
+
+    def __init__(self, api_key=NEWS_API_KEY, url=NEWS_API_URL, retry_interval=NEWS_RETRY_INTERVAL,
+                 timeout=NEWS_TIMEOUT, limit=3):
+        self.api_key = api_key
+        self.url = url
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.limit = limit
+        self._articles = None
+        self._fetched_at = None
+        self._etag = None
+        self._last_modified = None
+        self._retry_at = 0.0
+        self.not_modified = 0
+        self.downloads = 0
+        self.failures = 0
+
+    @property
+    def age(self):
+        """Seconds since the headlines were last confirmed current, or None."""
+        return time.monotonic() - self._fetched_at if self._fetched_at is not None else None
+
+    async def fetch(self):
+        """
+        Revalidate the headlines now (a 304 if unchanged) and return them. Callers keep their own
+        copy and timestamp, like the market cache's news section.
+        Returns:
+            list: Up to `limit` article dicts, or None if no API key is configured.
+        Raises:
+            RuntimeError: If NewsAPI cannot be reached (or is backed off); the caller keeps its
+                previous headlines instead of re-stamping stale ones as current.
+        """
+        if not self.api_key:
+            return None
+        attempt = time.monotonic()
+        if self._articles is not None and attempt < self._retry_at:
+            raise RuntimeError("Failed to fetch news: backing off after a failed request")
+        articles = await flights.do(("news",), self.refresh)
+        if self._fetched_at is None or self._fetched_at < attempt:
+            raise RuntimeError("Failed to fetch news: serving headlines from before the failed request")
+        return articles
+
+    async def refresh(self):
+        """Request the headlines (conditionally if we have a copy) and return the current ones."""
+        headers = {"X-Api-Key": self.api_key}
+        if self._articles is not None:
+            if self._etag:
+                headers["If-None-Match"] = self._etag
+            if self._last_modified:
+                headers["If-Modified-Since"] = self._last_modified
+        try:
+            session = await http_client.get_session()
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with session.get(self.url, params=NEWS_PARAMS, headers=headers, timeout=timeout) as response:
+                if response.status == 304 and self._articles is not None:
+                    metrics.upstream("newsapi", True)
+                    self.not_modified += 1
+                    self._fetched_at = time.monotonic()
+                    return self._articles
+                if response.status != 200:
+                    raise RuntimeError(f"Failed to fetch news (status {response.status})")
+                payload = await response.json()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError, ValueError) as e:
+            metrics.upstream("newsapi", False)
+            self.failures += 1
+            # Back off instead of retrying on every request while NewsAPI is down
+            self._retry_at = time.monotonic() + self.retry_interval
+            if self._articles is None:
+                raise RuntimeError(f"Failed to fetch news: {type(e).__name__}: {str(e)}") from e
+            logger.error("Serving headlines from %ss ago, refresh failed: %s: %s", round(self.age), type(e).__name__, e)
+            return self._articles
+
+        metrics.upstream("newsapi", True)
+        self.downloads += 1
+        self._articles = payload.get("articles", [])[:self.limit]
+        self._etag = etag
+        self._last_modified = last_modified
+        self._fetched_at = time.monotonic()
+        return self._articles
+
+    def stats(self):
+        """Return request counters and the age of the headlines."""
+        age = self.age
+        return {
+            "age_seconds": round(age, 1) if age is not None else None,
+            "not_modified": self.not_modified,
+            "downloads": self.downloads,
+            "failures": self.failures,
+        }
+
+news_client = NewsClient()
@@ -0,0 +1,121 @@
+import logging
+from collections import OrderedDict
+from discord import Client, Forbidden, Message
+from config import TESLA_CHANNEL_ID, TESLA_POSTS_LIMIT
+from singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+class TeslaPost:
+    """One normalized post from the Tesla channel."""
+    __slots__ = ("id", "line", "image_urls")
+
+    def __init__(self, message_id, line, image_urls):
+        self.id = message_id
+        self.line = line
+        self.image_urls = image_urls
+
+class TeslaPostBuffer:
+    """
+    Bounded ring buffer of the newest posts in the Tesla channel.
+    Seeded once from channel history, then kept current from gateway events, so the
+    prompt text can be rendered without any REST call.
+    Args:
+        format_post (callable): Message -> (prompt line, image URLs), or None to skip the message.
+        channel_id (int): Channel to track.
+        size (int): Number of posts kept.
+    """
+
+    def __init__(self, format_post, channel_id=TESLA_CHANNEL_ID, size=TESLA_POSTS_LIMIT):
+        self._format_post = format_post
+        self.channel_id = channel_id
+        self.size = size
+        self._posts = OrderedDict()  # message id -> TeslaPost, oldest first
+        self._rendered = None
+        self.seeded = False
+        self.version = 0
+
+    def __len__(self):
+        return len(self._posts)
+
+    async def seed(self, client: Client):
+        """
+        Fill the buffer from channel history. Called from on_ready; later calls are no-ops.
+        Raises:
+            LookupError: If the channel is not found or inaccessible.
+            Forbidden: If the bot cannot read the channel history.
+        """
+        if self.seeded:
+            return
+        channel = client.get_channel(self.channel_id)
+        if not channel:
+            raise LookupError(f"Channel with ID {self.channel_id} not found or inaccessible.")
+        async for message in channel.history(limit=self.size):
+            self.add(message)
+        self.seeded = True
+        logger.debug("Seeded Tesla post buffer with %d posts from channel %s", len(self._posts), self.channel_id)
+
+    def add(self, message: Message):
+        """Insert or replace a post. Messages from other channels are ignored."""
+        if message.channel.id != self.channel_id:
+            return
+        post = self._format_post(message)
+        if post is None:
+            self._remove(message.id)
+            return
+        line, image_urls = post
+        out_of_order = bool(self._posts) and message.id not in self._posts and message.id < next(reversed(self._posts))
+        self._posts[message.id] = TeslaPost(message.id, line, image_urls)
+        if out_of_order:
+            # History arrives newest first; keep the buffer ordered by snowflake (= creation time)
+            self._posts = OrderedDict(sorted(self._posts.items()))
+        while len(self._posts) > self.size:
+            self._posts.popitem(last=False)
+        self._changed()
+
+    def edit(self, message: Message):
+        """
+        Apply an edit. A message skipped when it arrived (an embed-only link before it unfurled)
+        is inserted once it has content, if it is new enough to be among the buffered posts.
+        """
+        if message.id not in self._posts and len(self._posts) >= self.size and message.id < next(iter(self._posts)):
+            return
+        self.add(message)
+
+    def delete(self, message_id):
+        self._remove(message_id)
+
+    def _remove(self, message_id):
+        if self._posts.pop(message_id, None) is not None:
+            self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._rendered = None
+
+    def latest(self):
+        """Return the newest buffered post, or None."""
+        return self._posts[next(reversed(self._posts))] if self._posts else None
+
+    def render(self):
+        """Return the prompt text for the buffered posts, newest first."""
+        if self._rendered is None:
+            if not self._posts:
+                self._rendered = "No recent Tesla-related posts found in the specified channel."
+            else:
+                self._rendered = "Newest Tesla Posts:\n" + "\n".join(post.line for post in reversed(self._posts.values()))
+        return self._rendered
+
+    async def get_text(self, client: Client):
+        """Render the buffered posts, seeding from history first if on_ready has not done so yet."""
+        if self.channel_id == 0:
+            return "Error: Tesla channel ID not configured in .env."
+        if not self.seeded:
+            try:
+                await flights.do(("tesla-posts", self.channel_id), self.seed, client)
+            except LookupError as e:
+                return f"Error: {str(e)}"
+            except Forbidden:
+                logger.error("Missing permissions to read messages in channel %s", self.channel_id)
+                return f"Error: Missing permissions to read messages in channel {self.channel_id}."
+        return self.render()
@@ -0,0 +1,191 @@
+import logging
+import os
+import sqlite3
+import copy
+import threading
+import time
+from collections import deque
+import pandas as pd
+import yfinance as yf
+from config import PRICE_STORE_DIR, PRICE_WINDOW_BARS
+from indicators import IndicatorEngine
+
+logger = logging.getLogger(__name__)
+
+ACTION_COLUMNS = ("Dividends", "Stock Splits")
+
+def _action_dates(hist):
+    """Dates (ISO strings) of the splits and dividends in a history() frame."""
+    columns = [column for column in ACTION_COLUMNS if column in hist.columns]
+    if not columns:
+        return []
+    mask = (hist[columns].fillna(0) != 0).any(axis=1)
+    return [index.strftime("%Y-%m-%d") for index in hist.index[mask]]
+
+class PriceStore:
+    """
+    Persistent daily OHLCV history for one ticker, kept in its own SQLite file.
+    The full history is downloaded once; later updates only request bars from the last
+    stored date onwards (the last bar is re-fetched because it may still be forming).
+    The all-time high, the recent window and the indicators (RSI, MACD, Bollinger bands, ATR)
+    are maintained incrementally: each new bar is one IndicatorEngine update.
+    yfinance adjusts every earlier bar for splits and dividends, so when an update brings a
+    split or dividend newer than the last one seen, the whole history is downloaded again
+    instead of mixing two adjustment bases.
+    Args:
+        symbol (str): Ticker symbol, e.g. "SPY".
+        directory (str): Directory holding the SQLite files.
+        window (int): Number of most recent bars kept in memory.
+    """
+
+    def __init__(self, symbol, directory=PRICE_STORE_DIR, window=PRICE_WINDOW_BARS):
+        self.symbol = symbol
+        os.makedirs(directory, exist_ok=True)
+        filename = "".join(c if c.isalnum() else "_" for c in symbol) + ".sqlite"
+        self.path = os.path.join(directory, filename)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bars ("
+            "date TEXT PRIMARY KEY, open REAL, high REAL, low REAL, close REAL, volume REAL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # Stores written before NaN bars were dropped may hold them as NULLs
+        self._conn.execute(
+            "DELETE FROM bars WHERE open IS NULL OR high IS NULL OR low IS NULL OR close IS NULL"
+        )
+        self._conn.commit()
+        self._window_size = window
+
+        # Cold start: aggregates come from disk, no network
+        self.ath = self._conn.execute("SELECT MAX(high) FROM bars").fetchone()[0]
+        rows = self._conn.execute(
+            "SELECT date, open, high, low, close, volume FROM bars ORDER BY date DESC LIMIT ?", (window,)
+        ).fetchall()
+        self._window = deque(reversed(rows), maxlen=window)
+        # Fed every stored bar except the newest, which may still be forming and be replaced
+        self._engine = IndicatorEngine()
+        for high, low, close in self._conn.execute("SELECT high, low, close FROM bars ORDER BY date").fetchall()[:-1]:
+            self._engine.update(high, low, close)
+        self.indicators = self._latest_indicators()
+        # Date of the newest split/dividend the stored bars are adjusted for ("" for none). None for
+        # stores written before it was recorded; their basis is unknown, so they are rebuilt once.
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_action'").fetchone()
+        self._last_action = row[0] if row else None
+        # Bumped whenever a bar is added or changes; identifies the stored data for caches
+        self.version = 0
+        self.updated_at = None
+
+    @property
+    def last_date(self):
+        return self._window[-1][0] if self._window else None
+
+    def _latest_indicators(self):
+        """Indicator values including the newest bar, computed on a copy so it can still be replaced."""
+        if not self._window:
+            return {}
+        _, _, high, low, close, _ = self._window[-1]
+        return copy.deepcopy(self._engine).update(high, low, close)
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM bars").fetchone()[0]
+
+    def update(self):
+        """
+        Download the bars missing from the store and fold them into the aggregates.
+        Blocking; call it from the fetch executor.
+        Returns:
+            int: Number of bars written.
+        """
+        with self._lock:
+            ticker = yf.Ticker(self.symbol)
+            rebuild = self.last_date is None or self._last_action is None
+            if rebuild:
+                hist = ticker.history(period="max")
+            else:
+                hist = ticker.history(start=self.last_date)
+                if max(_action_dates(hist), default="") > self._last_action:
+                    logger.info("%s split or paid a dividend; downloading its adjusted history again", self.symbol)
+                    hist = ticker.history(period="max")
+                    rebuild = True
+            self.updated_at = time.time()
+            # yfinance returns NaN rows for holidays and partial days (often for ^VIX); SQLite
+            # would store them as NULLs the indicators cannot replay
+            hist = hist.dropna(subset=["Open", "High", "Low", "Close"])
+            if hist.empty:
+                return 0
+
+            if rebuild:
+                self._conn.execute("DELETE FROM bars")
+                self._window = deque(maxlen=self._window_size)
+                self._engine = IndicatorEngine()
+                self.ath = None
+                self.version += 1
+                self._last_action = max(_action_dates(hist), default="")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('last_action', ?)", (self._last_action,)
+                )
+
+            rows = [
+                (
+                    index.strftime("%Y-%m-%d"),
+                    float(bar["Open"]), float(bar["High"]), float(bar["Low"]),
+                    float(bar["Close"]), 0.0 if pd.isna(bar["Volume"]) else float(bar["Volume"]),
+                )
+                for index, bar in hist.iterrows()
+            ]
+            rows = [row for row in rows if self.last_date is None or row[0] >= self.last_date]
+            self._conn.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+            for row in rows:
+                if self._window and self._window[-1][0] == row[0]:
+                    if self._window[-1] != row:
+                        self.version += 1
+                    self._window[-1] = row
+                else:
+                    if self._window:
+                        # The previous newest bar is final now
+                        _, _, high, low, close, _ = self._window[-1]
+                        self._engine.update(high, low, close)
+                    self._window.append(row)
+                    self.version += 1
+                if self.ath is None or row[2] > self.ath:
+                    self.ath = row[2]
+            self.indicators = self._latest_indicators()
+            return len(rows)
+
+    def window_frame(self):
+        """
+        Return the in-memory recent window as an OHLCV DataFrame indexed by date,
+        shaped like yfinance history() output.
+        """
+        with self._lock:
+            rows = list(self._window)
+        frame = pd.DataFrame(rows, columns=["Date", "Open", "High", "Low", "Close", "Volume"])
+        frame["Date"] = pd.to_datetime(frame["Date"])
+        return frame.set_index("Date")
+
+    def frame(self, since=None):
+        """
+        Return the stored bars from `since` (an ISO date string) onwards, or all of them,
+        as an OHLCV DataFrame indexed by date.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, open, high, low, close, volume FROM bars WHERE date >= ? ORDER BY date",
+                (since or "",),
+            ).fetchall()
+        frame = pd.DataFrame(rows, columns=["Date", "Open", "High", "Low", "Close", "Volume"])
+        frame["Date"] = pd.to_datetime(frame["Date"])
+        return frame.set_index("Date")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_price_store(symbol):
+    """Return the shared PriceStore for a ticker, opening it from disk on first use."""
+    with _stores_lock:
+        if symbol not in _stores:
+            _stores[symbol] = PriceStore(symbol)
+        return _stores[symbol]
@@ -0,0 +1,172 @@
+import logging
+import math
+import re
+from config import PROMPT_TOKEN_BUDGET, PROMPT_POST_SUMMARY_CHARS, PROMPT_LAYOUT
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_POST_START_RE = re.compile(r"^\[\d{4}-\d{2}-\d{2} ", re.MULTILINE)
+
+NEWS_HEADER = "Recent World News:"
+POSTS_HEADER = "Newest Tesla Posts:"
+DATA_INTRO = "Use the following TSLA, earnings, market, news, and timestamp data in your analysis:"
+
+def estimate_tokens(text):
+    """
+    Approximate the token count of a text without a model tokenizer: every punctuation mark is
+    one token and every word one token per started 4 characters, which tracks BPE tokenizers
+    closely enough for budgeting.
+    """
+    return sum(math.ceil(len(token) / 4) for token in _TOKEN_RE.findall(text))
+
+class PromptSection:
+    """
+    One part of the system prompt.
+    Sections with items can be trimmed: items are ordered from most to least valuable, and
+    trimming first shortens ("summarizes") and then drops items from the end.
+    Args:
+        name (str): Name used in the token log.
+        text (str): Fixed text, used when the section has no items.
+        header (str): Line rendered above the items.
+        items (list): Trimmable entries, most valuable first.
+    """
+
+    def __init__(self, name, text="", header=None, items=None):
+        self.name = name
+        self.text = text
+        self.header = header
+        self.items = list(items or [])
+        self.trimmed = 0
+        self.summarized = 0
+
+    @property
+    def trimmable(self):
+        return bool(self.items)
+
+    def render(self):
+        if self.header is None:
+            return self.text
+        return "\n".join([self.header] + self.items)
+
+    def drop_last(self):
+        self.items.pop()
+        self.trimmed += 1
+
+    def summarize_last_unsummarized(self, max_chars):
+        """Shorten the least valuable item that is still over max_chars. Returns False if none is left."""
+        for i in range(len(self.items) - 1, -1, -1):
+            if len(self.items[i]) > max_chars:
+                self.items[i] = self.items[i][:max_chars - 2].rstrip() + " …"
+                self.summarized += 1
+                return True
+        return False
+
+def split_market_data(market_and_news_data):
+    """Split the market text into (blocks, index of the news block or None)."""
+    blocks = market_and_news_data.split("\n\n")
+    for i, block in enumerate(blocks):
+        if block.startswith(NEWS_HEADER):
+            return blocks, i
+    return blocks, None
+
+def split_tesla_posts(tesla_posts):
+    """Split the Tesla posts text into posts, newest first; returns None for error/empty messages."""
+    if not tesla_posts.startswith(POSTS_HEADER + "\n"):
+        return None
+    body = tesla_posts[len(POSTS_HEADER) + 1:]
+    starts = [match.start() for match in _POST_START_RE.finditer(body)] or [0]
+    if starts[0] != 0:
+        starts.insert(0, 0)
+    return [body[start:end].rstrip("\n") for start, end in zip(starts, starts[1:] + [len(body)])]
+
+def build_prompt_data(market_and_news_data, tesla_posts, budget=PROMPT_TOKEN_BUDGET, reserved_tokens=0):
+    """
+    Assemble the data part of the prompt (market data, news and Tesla posts) within a token budget.
+    Market data is always kept. When over budget, news headlines are dropped first (last headline
+    first), then the oldest posts are shortened to PROMPT_POST_SUMMARY_CHARS characters, then the
+    oldest posts are dropped.
+    Args:
+        reserved_tokens (int): Tokens of the budget already used by the rest of the prompt.
+    Returns:
+        tuple: (data text, {section name: estimated tokens}, total estimated tokens incl. reserved)
+    """
+    blocks, news_index = split_market_data(market_and_news_data)
+    news = PromptSection("news", header=NEWS_HEADER)
+    if news_index is not None:
+        news.items = blocks[news_index].split("\n")[1:]
+    posts_items = split_tesla_posts(tesla_posts)
+    posts = PromptSection("posts", header=POSTS_HEADER, items=posts_items) if posts_items else PromptSection("posts", tesla_posts)
+
+    def market_text():
+        rendered = list(blocks)
+        if news_index is not None:
+            rendered[news_index] = news.render() if news.items else None
+        return "\n\n".join(block for block in rendered if block is not None)
+
+    def assemble():
+        return f"{DATA_INTRO}\n{market_text()}\n\n{posts.render()}"
+
+    data = assemble()
+    total = reserved_tokens + estimate_tokens(data)
+    while total > budget:
+        if news.trimmable:
+            news.drop_last()
+        elif posts.trimmable and posts.summarize_last_unsummarized(PROMPT_POST_SUMMARY_CHARS):
+            pass
+        elif len(posts.items) > 1:
+            posts.drop_last()
+        else:
+            logger.debug("Prompt still over budget after trimming: %d > %d tokens", total, budget)
+            break
+        data = assemble()
+        total = reserved_tokens + estimate_tokens(data)
+
+    news_tokens = estimate_tokens(news.render()) if news.items else 0
+    report = {
+        "market": estimate_tokens(market_text()) - news_tokens,
+        "news": news_tokens,
+        "posts": estimate_tokens(posts.render()),
+    }
+    if news.trimmed or posts.trimmed or posts.summarized:
+        logger.debug("Trimmed prompt to budget %d: dropped %d headlines, summarized %d and dropped %d posts",
+                     budget, news.trimmed, posts.summarized, posts.trimmed)
+    return data, report, total
+
+def build_system_prompt(static_prompt, market_and_news_data, tesla_posts, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Assemble the static prompt and the budgeted data into one system prompt.
+    Returns:
+        tuple: (system prompt, {section name: estimated tokens}, total estimated tokens)
+    """
+    static_tokens = estimate_tokens(static_prompt)
+    data, report, total = build_prompt_data(market_and_news_data, tesla_posts, budget, static_tokens)
+    return f"{static_prompt}\n\n{data}", {"static": static_tokens, **report}, total
+
+def build_messages(static_prompt, market_and_news_data, tesla_posts, prompt, layout=PROMPT_LAYOUT, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Build the chat messages for a Grok request.
+    Layouts:
+        "combined": one system message with the static prompt followed by the data.
+        "prefix_stable": the system message is the static prompt alone, byte-identical across
+            requests so the provider can reuse its cached prefix; the data follows in its own message.
+    Returns:
+        tuple: (messages, {section name: estimated tokens}, total estimated tokens)
+    """
+    if layout == "prefix_stable":
+        static_tokens = estimate_tokens(static_prompt)
+        data, report, total = build_prompt_data(market_and_news_data, tesla_posts, budget, static_tokens)
+        messages = [
+            {"role": "system", "content": static_prompt},
+            {"role": "system", "content": data},
+            {"role": "user", "content": prompt},
+        ]
+        return messages, {"static": static_tokens, **report}, total
+    if layout != "combined":
+        raise ValueError(f"Unknown prompt layout: {layout}")
+    system_prompt, report, total = build_system_prompt(static_prompt, market_and_news_data, tesla_posts, budget)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+    return messages, report, total
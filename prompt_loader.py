@@ -0,0 +1,76 @@
+import logging
+import hashlib
+import os
+import time
+from config import GROK_CONTENT_FILE, PROMPT_CHECK_INTERVAL, PROMPT_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+class PromptTemplateError(Exception):
+    """Raised when a system prompt file fails validation."""
+
+def validate_prompt(text):
+    """
+    Check a system prompt before it is put into service.
+    Raises:
+        PromptTemplateError: If the prompt is empty or longer than PROMPT_MAX_CHARS.
+    """
+    if not text:
+        raise PromptTemplateError("system prompt is empty")
+    if len(text) > PROMPT_MAX_CHARS:
+        raise PromptTemplateError(f"system prompt is {len(text)} characters, limit is {PROMPT_MAX_CHARS}")
+
+class PromptLoader:
+    """
+    In-memory copy of the system prompt file that reloads itself when the file changes.
+    At most once per `check_interval` seconds the file is stat()ed; it is only re-read when its
+    mtime or size changed, and only swapped in when the content hash differs and the new text
+    validates. If a reload fails, the previous prompt stays in service.
+    Args:
+        path (str): Prompt file.
+        check_interval (float): Minimum seconds between stat() calls.
+    """
+
+    def __init__(self, path=GROK_CONTENT_FILE, check_interval=PROMPT_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self._text = None
+        self._digest = None
+        self._stat_key = None
+        self._last_check = 0.0
+
+    def get(self):
+        """
+        Return the current system prompt.
+        Raises:
+            FileNotFoundError, IOError, PromptTemplateError: Only while no prompt has loaded yet.
+        """
+        now = time.monotonic()
+        if self._text is None or now - self._last_check >= self.check_interval:
+            self._last_check = now
+            try:
+                self._reload_if_changed()
+            except (IOError, PromptTemplateError) as e:
+                if self._text is None:
+                    raise
+                logger.error("Keeping previous system prompt, reload of %s failed: %s: %s", self.path, type(e).__name__, e)
+        return self._text
+
+    def _reload_if_changed(self):
+        stat = os.stat(self.path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stat_key:
+            return
+
+        with open(self.path, "r") as f:
+            text = f.read().strip()
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if digest != self._digest:
+            validate_prompt(text)
+            self._text, self._digest = text, digest
+            self.version += 1
+            logger.debug("Loaded system prompt v%d from %s, length: %d characters", self.version, self.path, len(text))
+        self._stat_key = stat_key
+
+prompt_loader = PromptLoader()
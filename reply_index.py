@@ -0,0 +1,72 @@
+from collections import OrderedDict
+import discord
+from config import REPLY_INDEX_MAX_THREADS, REPLY_INDEX_MAX_REPLIES
+from message_normalizer import normalize_message
+
+class ReplyIndex:
+    """
+    Bounded in-memory map of message ID -> replies, fed from gateway events.
+    Threads (parent messages) are evicted least-recently-used once `max_threads` is exceeded,
+    and each thread keeps at most `max_replies` of its newest replies.
+    Args:
+        max_threads (int): Parent messages tracked.
+        max_replies (int): Replies kept per parent.
+    """
+
+    def __init__(self, max_threads=REPLY_INDEX_MAX_THREADS, max_replies=REPLY_INDEX_MAX_REPLIES):
+        self.max_threads = max_threads
+        self.max_replies = max_replies
+        self._threads = OrderedDict()  # parent id -> OrderedDict(reply id -> NormalizedMessage)
+        self._parents = {}  # reply id -> parent id
+
+    def __len__(self):
+        return len(self._threads)
+
+    def add(self, message: discord.Message):
+        """Index a message if it replies to another one."""
+        reference = message.reference
+        if not reference or not reference.message_id:
+            return
+        if reference.type is discord.MessageReferenceType.forward:
+            return
+        parent_id = reference.message_id
+        replies = self._threads.get(parent_id)
+        if replies is None:
+            replies = self._threads[parent_id] = OrderedDict()
+        self._threads.move_to_end(parent_id)
+        replies[message.id] = normalize_message(message)
+        self._parents[message.id] = parent_id
+        while len(replies) > self.max_replies:
+            reply_id, _ = replies.popitem(last=False)
+            self._parents.pop(reply_id, None)
+        while len(self._threads) > self.max_threads:
+            _, evicted = self._threads.popitem(last=False)
+            for reply_id in evicted:
+                self._parents.pop(reply_id, None)
+
+    def edit(self, message: discord.Message):
+        """Refresh an indexed reply after an edit."""
+        if message.id in self._parents:
+            self.add(message)
+
+    def delete(self, message_id):
+        """Forget a deleted reply, or a deleted parent together with its replies."""
+        parent_id = self._parents.pop(message_id, None)
+        if parent_id is not None:
+            replies = self._threads.get(parent_id)
+            if replies is not None:
+                replies.pop(message_id, None)
+                if not replies:
+                    del self._threads[parent_id]
+        for reply_id in self._threads.pop(message_id, {}):
+            self._parents.pop(reply_id, None)
+
+    def replies(self, message_id):
+        """Return the indexed replies to a message, oldest first."""
+        replies = self._threads.get(message_id)
+        if not replies:
+            return []
+        self._threads.move_to_end(message_id)
+        return list(replies.values())
+
+reply_index = ReplyIndex()
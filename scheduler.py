@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from config import GROK_MAX_CONCURRENT, GROK_MAX_QUEUE, GROK_MAX_QUEUED_PER_USER, GROK_QUEUE_DEADLINE
+
+class SchedulerBusy(Exception):
+    """Raised when a request is shed because the queue is over budget or its deadline passed."""
+
+class _Waiter:
+    __slots__ = ("future", "user_id", "guild_id", "enqueued_at")
+
+    def __init__(self, future, user_id, guild_id):
+        self.future = future
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.enqueued_at = time.monotonic()
+
+class GrokScheduler:
+    """
+    Admission control in front of the Grok API.
+    At most `max_concurrent` requests run at once. Others wait in a bounded queue that is served
+    round-robin across guilds and, within a guild, across users, so one busy server or user cannot
+    starve the rest. Requests are shed with SchedulerBusy when the queue is full, when a user already
+    has too many queued requests, or when a request waits longer than its deadline.
+    Args:
+        max_concurrent (int): Concurrent Grok calls.
+        max_queue (int): Total queued requests.
+        max_queued_per_user (int): Queued requests per user.
+        deadline (float): Seconds a request may wait for a slot.
+    """
+
+    def __init__(self, max_concurrent=GROK_MAX_CONCURRENT, max_queue=GROK_MAX_QUEUE,
+                 max_queued_per_user=GROK_MAX_QUEUED_PER_USER, deadline=GROK_QUEUE_DEADLINE):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.deadline = deadline
+        self._active = 0
+        self._depth = 0
+        self._queues = OrderedDict()  # guild id -> OrderedDict(user id -> deque of _Waiter)
+        self.admitted = 0
+        self.shed = 0
+        self.expired = 0
+        self.max_depth_seen = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self, user_id, guild_id=None, deadline=None):
+        """
+        Hold one Grok slot for the duration of the block.
+        Raises:
+            SchedulerBusy: If the request is shed.
+        """
+        await self._acquire(user_id, guild_id, self.deadline if deadline is None else deadline)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, user_id, guild_id, deadline):
+        if self._active < self.max_concurrent and self._depth == 0:
+            self._active += 1
+            self._record_wait(0.0)
+            return
+
+        if self._depth >= self.max_queue:
+            self.shed += 1
+            raise SchedulerBusy("queue is full")
+        users = self._queues.setdefault(guild_id, OrderedDict())
+        queue = users.setdefault(user_id, deque())
+        if len(queue) >= self.max_queued_per_user:
+            self.shed += 1
+            self._drop_empty(guild_id, user_id)
+            raise SchedulerBusy("too many queued requests for this user")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), user_id, guild_id)
+        queue.append(waiter)
+        self._depth += 1
+        self.max_depth_seen = max(self.max_depth_seen, self._depth)
+        # asyncio.wait, not wait_for: on 3.11 wait_for swallows a cancellation that arrives together
+        # with the slot, and the cancelled mention would go on to call Grok
+        try:
+            await asyncio.wait((waiter.future,), timeout=deadline)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(waiter)
+            self.expired += 1
+            raise SchedulerBusy(f"no Grok slot within {deadline}s")
+
+    def _abandon(self, waiter):
+        if waiter.future.done() and not waiter.future.cancelled():
+            # The slot was granted just as we gave up; hand it to the next waiter
+            self._release()
+        else:
+            self._remove(waiter)
+            waiter.future.cancel()
+
+    def _release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._active < self.max_concurrent and self._depth:
+            waiter = self._pop_next()
+            if waiter.future.done():
+                continue
+            self._active += 1
+            self._record_wait(time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _pop_next(self):
+        """Take the oldest request of the next user in the next guild, then rotate both to the back."""
+        guild_id, users = next(iter(self._queues.items()))
+        user_id, queue = next(iter(users.items()))
+        waiter = queue.popleft()
+        self._depth -= 1
+        users.move_to_end(user_id)
+        self._queues.move_to_end(guild_id)
+        self._drop_empty(guild_id, user_id)
+        return waiter
+
+    def _remove(self, waiter):
+        queue = self._queues.get(waiter.guild_id, {}).get(waiter.user_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._depth -= 1
+            self._drop_empty(waiter.guild_id, waiter.user_id)
+
+    def _drop_empty(self, guild_id, user_id):
+        users = self._queues.get(guild_id)
+        if users is None:
+            return
+        if not users.get(user_id, True):
+            del users[user_id]
+        if not users:
+            del self._queues[guild_id]
+
+    def _record_wait(self, seconds):
+        self.admitted += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def stats(self):
+        """Return queue depth, wait times and shedding counters."""
+        return {
+            "active": self._active,
+            "queued": self._depth,
+            "max_queued": self.max_depth_seen,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "expired": self.expired,
+            "avg_wait_ms": round(self.wait_seconds_total / self.admitted * 1000, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(self.wait_seconds_max * 1000, 1),
+        }
+
+grok_scheduler = GrokScheduler()
@@ -0,0 +1,64 @@
+import asyncio
+from collections import Counter
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent requests for the same resource into one upstream call.
+    Keys are tuples whose first element names the resource kind (e.g. ("message", channel_id, message_id));
+    counters are kept per kind.
+    A caller that is cancelled stops waiting without affecting the others; the shared call is
+    only cancelled once every caller has gone away.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = Counter()
+        self.coalesced = Counter()
+
+    async def do(self, key, func, *args):
+        """
+        Await func(*args), sharing the result with every concurrent caller using the same key.
+        Exceptions raised by func propagate to all of them.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func(*args)))
+            self._calls[key] = call
+            self.executions[key[0]] += 1
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+        else:
+            self.coalesced[key[0]] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                # Forget the call now: a caller arriving before the done callback runs
+                # must start a new one, not join a cancelled task
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        """Return upstream executions and coalesced callers per resource kind."""
+        return {kind: {"executions": self.executions[kind], "coalesced": self.coalesced[kind]}
+                for kind in self.executions}
+
+flights = SingleFlight()
@@ -0,0 +1,97 @@
+import logging
+import time
+import discord
+from config import DISCORD_MAX_MESSAGE_LENGTH, STREAM_EDIT_INTERVAL
+from grok_api import NO_RESPONSE, INTERRUPTED_NOTE
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_NOTE = "... (truncated due to length)"
+TYPING_MARKER = " ▌"
+
+class StreamingReply:
+    """
+    Progressively renders a streamed Grok answer into one Discord message.
+    The message is sent as soon as the first chunk arrives and then edited at most once
+    per `edit_interval` seconds, which keeps well inside Discord's edit rate limits.
+    Args:
+        channel (discord.abc.Messageable): Where to post the reply.
+        edit_interval (float): Minimum seconds between edits.
+    """
+
+    def __init__(self, channel, edit_interval=STREAM_EDIT_INTERVAL):
+        self.channel = channel
+        self.edit_interval = edit_interval
+        self.message = None
+        self.text = ""
+        self.first_chunk_at = None
+        # Set by finish(): False for empty, failed or interrupted streams, whose text must not be cached
+        self.complete = False
+        self._started_at = time.monotonic()
+        self._last_edit = 0.0
+        self._shown = ""
+
+    @property
+    def time_to_first_chunk(self):
+        """Seconds from creation until the first chunk arrived, or None."""
+        return self.first_chunk_at - self._started_at if self.first_chunk_at is not None else None
+
+    def _render(self, final):
+        text = self.text
+        if len(text) > DISCORD_MAX_MESSAGE_LENGTH:
+            return text[:DISCORD_MAX_MESSAGE_LENGTH - 50] + TRUNCATION_NOTE
+        return text if final else text + TYPING_MARKER
+
+    async def feed(self, chunk: str):
+        """Append a chunk; posts the placeholder or edits it when the throttle allows."""
+        if not chunk:
+            return
+        self.text += chunk
+        now = time.monotonic()
+        if self.message is None:
+            self.first_chunk_at = now
+            self._shown = self._render(final=False)
+            self.message = await self.channel.send(self._shown)
+            self._last_edit = now
+        elif now - self._last_edit >= self.edit_interval and len(self._shown) < DISCORD_MAX_MESSAGE_LENGTH:
+            await self._edit(self._render(final=False))
+            self._last_edit = now
+
+    async def finish(self):
+        """
+        Write the final text into the message (or send it if nothing was streamed).
+        Returns:
+            str: The final message content.
+        """
+        final = self._render(final=True) or NO_RESPONSE
+        self.complete = bool(self.text) and not self.text.startswith("Error:") and not self.text.endswith(INTERRUPTED_NOTE)
+        if self.message is None:
+            self.message = await self.channel.send(final)
+            self._shown = final
+        elif final != self._shown:
+            await self._edit(final)
+        return final
+
+    async def attach(self, files):
+        """
+        Add attachments to the finished message.
+        Args:
+            files (list): discord.File attachments.
+        """
+        try:
+            # Attachments can only be added by an edit that also carries the text
+            await self.message.edit(content=self._shown, attachments=files)
+        except discord.errors.HTTPException as e:
+            # The answer is already visible; send the files on their own
+            logger.error("Failed to attach files to streaming response: %s: %s", type(e).__name__, e)
+            for file in files:
+                file.reset()
+            await self.channel.send(files=files)
+
+    async def _edit(self, content):
+        try:
+            await self.message.edit(content=content)
+            self._shown = content
+        except discord.errors.HTTPException as e:
+            # A missed intermediate edit is harmless; the next one or finish() catches up
+            logger.error("Failed to edit streaming response: %s: %s", type(e).__name__, e)
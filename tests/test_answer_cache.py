@@ -0,0 +1,36 @@
+from answer_cache import AnswerCache
+
+V1 = (1, 0, 3, 1)
+V2 = (2, 0, 3, 1)
+
+def test_answer_is_served_for_the_same_context():
+    cache = AnswerCache()
+    assert cache.get("Why is TSLA up?", V1) is None
+    cache.put("Why is TSLA up?", V1, "Deliveries beat.")
+    assert cache.get("why is tsla up", V1) == "Deliveries beat."
+    assert cache.get("why is tsla up", V1, data_key=(("NVDA", 1.0),)) is None
+
+def test_newer_context_drops_older_answers():
+    cache = AnswerCache()
+    cache.get("q1", V1)
+    cache.put("q1", V1, "a1")
+    assert cache.get("q1", V2) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["invalidations"] == 1
+
+def test_late_answer_for_an_older_context_is_dropped():
+    cache = AnswerCache()
+    cache.get("q3", V1)  # asked before the snapshot refreshed
+    cache.get("q2", V2)
+    cache.put("q2", V2, "a2")
+    cache.put("q3", V1, "a3")  # finished after the refresh
+    assert cache.get("q2", V2) == "a2"
+    assert cache.get("q3", V1) is None
+    assert cache.stats()["stale_puts"] == 1
+
+def test_lookup_with_an_older_context_does_not_reset_the_cache():
+    cache = AnswerCache()
+    cache.get("q2", V2)
+    cache.put("q2", V2, "a2")
+    assert cache.get("q2", V1) is None
+    assert cache.get("q2", V2) == "a2"
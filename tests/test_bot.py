@@ -0,0 +1,92 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import pytest
+import bot
+from answer_cache import AnswerCache
+from scheduler import GrokScheduler
+
+BOT_USER = SimpleNamespace(id=1, name="hyperbullish")
+
+class Channel:
+    id = 10
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.sent = []
+
+    @asynccontextmanager
+    async def typing(self):
+        yield
+
+    async def send(self, content=None, files=None):
+        # What the scheduler looks like while Discord is sending
+        self.sent.append((content, self.scheduler.stats()["active"]))
+
+@pytest.fixture
+def mention(monkeypatch):
+    scheduler = GrokScheduler(max_concurrent=1, max_queue=1, max_queued_per_user=1, deadline=1)
+    channel = Channel(scheduler)
+
+    async def no_context(client, message):
+        return []
+
+    async def snapshot():
+        return SimpleNamespace(text="market data", version=1)
+
+    async def no_watchlist(query):
+        return "", None
+
+    async def posts(client):
+        return "posts"
+
+    async def query_grok(query, market_and_news_data, tesla_posts):
+        assert scheduler.stats()["active"] == 1
+        return "TSLA is up 3%."
+
+    monkeypatch.setattr(bot, "client", SimpleNamespace(user=BOT_USER))
+    monkeypatch.setattr(bot, "grok_scheduler", scheduler)
+    monkeypatch.setattr(bot, "answer_cache", AnswerCache())
+    monkeypatch.setattr(bot, "GROK_STREAMING", False)
+    monkeypatch.setattr(bot, "build_context", no_context)
+    monkeypatch.setattr(bot.market_cache, "get_snapshot", snapshot)
+    monkeypatch.setattr(bot.watchlist, "get_text", no_watchlist)
+    monkeypatch.setattr(bot, "get_tesla_channel_posts", posts)
+    monkeypatch.setattr(bot, "query_grok", query_grok)
+    return SimpleNamespace(
+        id=100, content="<@1> How is TSLA doing?", mentions=[BOT_USER], reference=None, embeds=[],
+        channel=channel, guild=None, author=SimpleNamespace(id=2, bot=False),
+    )
+
+def test_reply_is_sent_after_the_grok_slot_is_released(mention):
+    asyncio.run(bot.on_message(mention))
+    assert mention.channel.sent == [("TSLA is up 3%.", 0)]
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_chart_is_awaited_after_the_grok_slot_is_released(mention, monkeypatch, streaming):
+    scheduler = mention.channel.scheduler
+    chart_waits = []
+
+    async def chart_file(query):
+        await asyncio.sleep(0.01)
+        chart_waits.append(scheduler.stats()["active"])
+        return "chart.png"
+
+    async def stream_grok(query, market_and_news_data, tesla_posts):
+        yield "TSLA is up 3%."
+
+    attached = []
+
+    async def attach(self, files):
+        attached.append((files, scheduler.stats()["active"]))
+
+    monkeypatch.setattr(bot, "GROK_STREAMING", streaming)
+    monkeypatch.setattr(bot, "stream_grok", stream_grok)
+    monkeypatch.setattr(bot.chart_renderer, "file", chart_file)
+    monkeypatch.setattr(bot.StreamingReply, "attach", attach)
+    mention.content = "<@1> chart TSLA"
+    asyncio.run(bot.on_message(mention))
+
+    assert chart_waits == [0]
+    if streaming:
+        assert attached == [(["chart.png"], 0)]
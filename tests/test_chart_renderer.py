@@ -0,0 +1,20 @@
+import pytest
+from chart_renderer import chart_range, wants_chart
+
+@pytest.mark.parametrize("query, expected", [
+    ("6 month chart please", "6mo"),
+    ("chart over the last 2 years", "2y"),
+    ("show me a chart for 1y", "1y"),
+    ("plot 5-day", "1mo"),
+    ("chart for the past 6 mo with the 14-day RSI", "6mo"),
+])
+def test_range_next_to_chart_words(query, expected):
+    assert chart_range(query) == expected
+
+@pytest.mark.parametrize("query", ["chart TSLA with its 14-day RSI", "Is the 50-day average on the chart?"])
+def test_indicator_periods_are_not_chart_ranges(query):
+    assert chart_range(query, default="3mo") == "3mo"
+
+def test_wants_chart():
+    assert wants_chart("Can you plot TSLA?")
+    assert not wants_chart("What is the 14-day RSI?")
@@ -0,0 +1,92 @@
+from datetime import date, datetime, timedelta, timezone
+import pandas as pd
+import pytest
+import fundamentals
+from fundamentals import FundamentalsCache
+
+RETRY = 3600
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+class FakeTicker:
+    """Serves quarterly financials, info and the earnings calendar like yfinance, and counts fetches."""
+    quarter_end = "2025-09-30"
+    next_report = None
+    error = None
+    fetches = 0
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    @property
+    def quarterly_financials(self):
+        FakeTicker.fetches += 1
+        if FakeTicker.error is not None:
+            raise FakeTicker.error
+        return pd.DataFrame(
+            {pd.Timestamp(FakeTicker.quarter_end): [28.1e9, 1.4e9]}, index=["Total Revenue", "Net Income"],
+        )
+
+    @property
+    def info(self):
+        return {"trailingEps": 1.5, "sharesOutstanding": 3.2e9}
+
+    @property
+    def calendar(self):
+        return {"Earnings Date": [FakeTicker.next_report] if FakeTicker.next_report else []}
+
+@pytest.fixture
+def fake_yfinance(monkeypatch):
+    monkeypatch.setattr(fundamentals.yf, "Ticker", FakeTicker)
+    monkeypatch.setattr(FakeTicker, "quarter_end", "2025-09-30")
+    monkeypatch.setattr(FakeTicker, "next_report", None)
+    monkeypatch.setattr(FakeTicker, "error", None)
+    monkeypatch.setattr(FakeTicker, "fetches", 0)
+    return FakeTicker
+
+@pytest.mark.parametrize("quarter_end, next_report, now, expires", [
+    # Current quarter reported: valid until the next quarter starts...
+    ("2025-09-30", date(2026, 1, 28), utc(2025, 11, 1), utc(2026, 1, 1)),
+    # ...or the day after the next report, if that comes first
+    ("2025-06-30", date(2025, 9, 20), utc(2025, 9, 15), utc(2025, 9, 21)),
+    # The quarter has ended but its report is not out: re-checked every retry interval
+    ("2025-09-30", date(2026, 1, 28), utc(2026, 1, 10), utc(2026, 1, 10) + timedelta(seconds=RETRY)),
+    # ...and on the report date
+    ("2025-09-30", date(2026, 1, 28), utc(2026, 1, 28, 23, 30), utc(2026, 1, 29)),
+])
+def test_expiry(tmp_path, fake_yfinance, quarter_end, next_report, now, expires):
+    fake_yfinance.quarter_end = quarter_end
+    fake_yfinance.next_report = next_report
+    record = FundamentalsCache("TSLA", directory=str(tmp_path), retry_interval=RETRY).get(now)
+    assert datetime.fromisoformat(record["expires_at"]) == expires
+
+def test_record_is_reused_until_it_expires(tmp_path, fake_yfinance):
+    cache = FundamentalsCache("TSLA", directory=str(tmp_path), retry_interval=RETRY)
+    cache.get(utc(2025, 11, 1))
+    cache.get(utc(2025, 12, 31, 23, 59))
+    assert fake_yfinance.fetches == 1
+
+    # The next quarter starts and Q4 is not reported yet: checked again, then once per retry interval
+    cache.get(utc(2026, 1, 1))
+    cache.get(utc(2026, 1, 1, 0, 59))
+    assert fake_yfinance.fetches == 2
+    fake_yfinance.quarter_end = "2025-12-31"
+    assert cache.get(utc(2026, 1, 1, 1))["quarter"] == "Q4 2025"
+    assert fake_yfinance.fetches == 3
+
+def test_failed_refresh_keeps_the_previous_record(tmp_path, fake_yfinance):
+    cache = FundamentalsCache("TSLA", directory=str(tmp_path), retry_interval=RETRY)
+    record = cache.get(utc(2025, 11, 1))
+    fake_yfinance.error = RuntimeError("yfinance down")
+    assert cache.get(utc(2026, 1, 2)) == record
+
+    with pytest.raises(RuntimeError):
+        FundamentalsCache("SPY", directory=str(tmp_path)).get(utc(2026, 1, 2))
+
+def test_record_is_reloaded_from_disk_after_a_restart(tmp_path, fake_yfinance):
+    record = FundamentalsCache("TSLA", directory=str(tmp_path), retry_interval=RETRY).get(utc(2025, 11, 1))
+
+    reopened = FundamentalsCache("TSLA", directory=str(tmp_path), retry_interval=RETRY)
+    assert reopened.get(utc(2025, 11, 2)) == record
+    assert fake_yfinance.fetches == 1
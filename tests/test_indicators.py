@@ -0,0 +1,132 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from indicators import compute_indicators, IndicatorEngine, RSIState
+from utils import calculate_rsi
+
+# === pandas references ===
+
+def wilder_reference(values, periods):
+    """Wilder smoothing seeded by the mean of the first `periods` values, via pandas ewm."""
+    values = pd.Series(values, dtype=float)
+    out = pd.Series(np.nan, index=values.index)
+    if len(values) < periods:
+        return out
+    seeded = pd.concat([pd.Series([values.iloc[:periods].mean()]), values.iloc[periods:]], ignore_index=True)
+    out.iloc[periods - 1:] = seeded.ewm(alpha=1 / periods, adjust=False).mean().to_numpy()
+    return out
+
+def wilder_rsi_reference(closes, periods=14):
+    delta = pd.Series(closes).diff().fillna(0.0).iloc[1:]
+    avg_gain = wilder_reference(delta.clip(lower=0).to_numpy(), periods)
+    avg_loss = wilder_reference((-delta).clip(lower=0).to_numpy(), periods)
+    rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    return np.concatenate([[np.nan], rsi.to_numpy()])
+
+def pandas_indicators(closes, highs, lows):
+    close = pd.Series(closes)
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    signal = macd.ewm(span=9, adjust=False).mean()
+    middle = close.rolling(20).mean()
+    std = close.rolling(20).std()
+    prev_close = close.shift(1)
+    true_range = pd.concat([
+        pd.Series(highs) - pd.Series(lows),
+        (pd.Series(highs) - prev_close).abs(),
+        (pd.Series(lows) - prev_close).abs(),
+    ], axis=1).max(axis=1)
+    return {
+        "rsi": calculate_rsi(close).to_numpy(),
+        "macd": macd.to_numpy(),
+        "macd_signal": signal.to_numpy(),
+        "macd_hist": (macd - signal).to_numpy(),
+        "bb_middle": middle.to_numpy(),
+        "bb_upper": (middle + 2 * std).to_numpy(),
+        "bb_lower": (middle - 2 * std).to_numpy(),
+        "atr": wilder_reference(true_range.to_numpy(), 14).to_numpy(),
+    }
+
+def random_bars(seed, bars=120):
+    rng = np.random.default_rng(seed)
+    closes = 250 + rng.normal(0, 5, bars).cumsum()
+    highs = closes + rng.uniform(0, 4, bars)
+    lows = closes - rng.uniform(0, 4, bars)
+    return closes, highs, lows
+
+def assert_same(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype=float), np.asarray(expected, dtype=float),
+                               rtol=1e-9, atol=1e-9, equal_nan=True)
+
+# === Batch path ===
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_matches_pandas(seed):
+    closes, highs, lows = random_bars(seed)
+    actual = compute_indicators(closes, highs, lows)
+    for name, expected in pandas_indicators(closes, highs, lows).items():
+        assert_same(actual[name], expected)
+
+def test_batch_rows_are_independent():
+    bars = [random_bars(seed) for seed in range(4)]
+    closes, highs, lows = (np.stack(column) for column in zip(*bars))
+    batch = compute_indicators(closes, highs, lows)
+    for row, (c, h, l) in enumerate(bars):
+        single = compute_indicators(c, h, l)
+        for name in batch:
+            assert_same(batch[name][row], single[name])
+
+def test_batch_wilder_rsi_matches_pandas():
+    closes, _, _ = random_bars(3)
+    assert_same(compute_indicators(closes, rsi_smoothing="wilder")["rsi"], wilder_rsi_reference(closes))
+
+def test_unknown_rsi_smoothing_is_rejected():
+    with pytest.raises(ValueError):
+        compute_indicators(np.arange(30.0), rsi_smoothing="ema")
+    with pytest.raises(ValueError):
+        RSIState(smoothing="ema")
+
+@pytest.mark.parametrize("bars", [1, 5, 13])
+def test_short_input_is_nan(bars):
+    closes, highs, lows = random_bars(4, bars)
+    actual = compute_indicators(closes, highs, lows)
+    for name in ("rsi", "bb_middle", "bb_upper", "bb_lower", "atr"):
+        assert actual[name].shape == (bars,)
+        assert np.isnan(actual[name]).all()
+    for name, expected in pandas_indicators(closes, highs, lows).items():
+        assert_same(actual[name], expected)
+
+def test_missing_closes_match_pandas_rsi_and_bollinger():
+    closes, _, _ = random_bars(5)
+    closes[[30, 31, 70]] = np.nan
+    actual = compute_indicators(closes)
+    expected = pandas_indicators(closes, closes, closes)
+    for name in ("rsi", "bb_middle", "bb_upper", "bb_lower"):
+        assert_same(actual[name], expected[name])
+    # A gap does not poison the RSI for the rest of the series
+    assert not np.isnan(actual["rsi"][-1])
+
+# === Incremental path ===
+
+@pytest.mark.parametrize("smoothing", ["sma", "wilder"])
+def test_incremental_matches_batch(smoothing):
+    closes, highs, lows = random_bars(6)
+    batch = compute_indicators(closes, highs, lows, rsi_smoothing=smoothing)
+    engine = IndicatorEngine(rsi_smoothing=smoothing)
+    steps = [engine.update(h, l, c) for c, h, l in zip(closes, highs, lows)]
+    for name in batch:
+        assert_same([step[name] for step in steps], batch[name])
+
+def test_incremental_rsi_matches_pandas():
+    closes, _, _ = random_bars(7)
+    state = RSIState()
+    assert_same([state.update(close) for close in closes], calculate_rsi(pd.Series(closes)).to_numpy())
+
+@pytest.mark.parametrize("smoothing", ["sma", "wilder"])
+def test_incremental_rsi_recovers_from_missing_closes(smoothing):
+    closes, _, _ = random_bars(8)
+    closes[40] = np.nan
+    state = RSIState(smoothing=smoothing)
+    values = [state.update(close) for close in closes]
+    assert_same(values, compute_indicators(closes, rsi_smoothing=smoothing)["rsi"])
+    assert not math.isnan(values[-1])
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import date, datetime
+from types import SimpleNamespace
+import pytest
+import market_cache
+from market_cache import MarketCache
+from market_hours import (
+    NEW_YORK, PRE_MARKET, REGULAR, AFTER_HOURS, CLOSED, is_trading_day, nyse_early_closes, session_at,
+)
+
+def ny(*args):
+    return datetime(*args, tzinfo=NEW_YORK)
+
+@pytest.mark.parametrize("day, trading", [
+    (date(2025, 7, 4), False),  # Independence Day
+    (date(2026, 7, 3), False),  # Independence Day on a Saturday, observed on Friday
+    (date(2025, 4, 18), False),  # Good Friday
+    (date(2025, 11, 27), False),  # Thanksgiving
+    (date(2025, 6, 19), False),  # Juneteenth
+    (date(2021, 12, 31), True),  # New Year's Day 2022 is a Saturday and not observed
+    (date(2025, 11, 28), True),  # Day after Thanksgiving, early close
+    (date(2025, 11, 29), False),  # Saturday
+])
+def test_trading_days(day, trading):
+    assert is_trading_day(day) == trading
+
+def test_early_closes():
+    assert nyse_early_closes(2025) == {date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24)}
+    # Christmas Eve 2022 is a Saturday
+    assert date(2022, 12, 24) not in nyse_early_closes(2022)
+
+@pytest.mark.parametrize("now, session, start, end", [
+    (ny(2025, 11, 25, 3, 59), CLOSED, ny(2025, 11, 24, 20, 0), ny(2025, 11, 25, 4, 0)),
+    (ny(2025, 11, 25, 4, 0), PRE_MARKET, ny(2025, 11, 25, 4, 0), ny(2025, 11, 25, 9, 30)),
+    (ny(2025, 11, 25, 9, 30), REGULAR, ny(2025, 11, 25, 9, 30), ny(2025, 11, 25, 16, 0)),
+    (ny(2025, 11, 25, 16, 0), AFTER_HOURS, ny(2025, 11, 25, 16, 0), ny(2025, 11, 25, 20, 0)),
+    (ny(2025, 11, 25, 20, 0), CLOSED, ny(2025, 11, 25, 20, 0), ny(2025, 11, 26, 4, 0)),
+    # Thanksgiving is closed from Wednesday's after-hours close to Friday's pre-market
+    (ny(2025, 11, 27, 12, 0), CLOSED, ny(2025, 11, 26, 20, 0), ny(2025, 11, 28, 4, 0)),
+    # The day after Thanksgiving closes at 13:00 and its after-hours session at 17:00
+    (ny(2025, 11, 28, 12, 59), REGULAR, ny(2025, 11, 28, 9, 30), ny(2025, 11, 28, 13, 0)),
+    (ny(2025, 11, 28, 13, 0), AFTER_HOURS, ny(2025, 11, 28, 13, 0), ny(2025, 11, 28, 17, 0)),
+    (ny(2025, 11, 28, 17, 0), CLOSED, ny(2025, 11, 28, 17, 0), ny(2025, 12, 1, 4, 0)),
+])
+def test_session_boundaries(now, session, start, end):
+    assert session_at(now) == (session, start, end)
+
+TTLS = {"quote": 60, "history": 900, "earnings": 21600, "news": 600}
+SESSION_TTLS = {
+    REGULAR: {"quote": 60, "history": 900},
+    PRE_MARKET: {"quote": 300, "history": 3600},
+    AFTER_HOURS: {"quote": 300, "history": 3600},
+}
+
+def cache_fetched_at(fetched_at):
+    cache = MarketCache(fetchers={name: None for name in TTLS}, ttls=TTLS, refresh_interval=30,
+                        session_ttls=SESSION_TTLS, closed_refresh_interval=300)
+    cache._snapshot = SimpleNamespace(fetched_at={name: moment.timestamp() for name, moment in fetched_at.items()})
+    return cache
+
+@pytest.mark.parametrize("fetched, now, stale", [
+    # Regular session: quotes expire after a minute, history after 15
+    (ny(2025, 11, 25, 10, 0), ny(2025, 11, 25, 10, 0, 59), []),
+    (ny(2025, 11, 25, 10, 0), ny(2025, 11, 25, 10, 1), ["quote"]),
+    (ny(2025, 11, 25, 10, 0), ny(2025, 11, 25, 10, 15), ["quote", "history", "news"]),
+    # Pre-market: longer TTLs
+    (ny(2025, 11, 25, 5, 0), ny(2025, 11, 25, 5, 4), []),
+    (ny(2025, 11, 25, 5, 0), ny(2025, 11, 25, 5, 5), ["quote"]),
+    # The open makes every session section stale, whatever its TTL
+    (ny(2025, 11, 25, 9, 29), ny(2025, 11, 25, 9, 30), ["quote", "history"]),
+    # After the close: fetched once more, then left alone until the next session
+    (ny(2025, 11, 25, 19, 59), ny(2025, 11, 25, 20, 0), ["quote", "history"]),
+    (ny(2025, 11, 25, 20, 0), ny(2025, 11, 26, 1, 59), ["news"]),
+    # Closed over Thanksgiving: only the sections with plain TTLs expire
+    (ny(2025, 11, 26, 20, 1), ny(2025, 11, 27, 20, 1), ["earnings", "news"]),
+])
+def test_stale_sections(fetched, now, stale):
+    cache = cache_fetched_at({name: fetched for name in TTLS})
+    assert cache.stale_sections(now.timestamp()) == stale
+
+def test_unfetched_sections_are_stale():
+    cache = cache_fetched_at({"quote": ny(2025, 11, 27, 12, 0)})
+    assert cache.stale_sections(ny(2025, 11, 27, 12, 0).timestamp()) == ["history", "earnings", "news"]
+
+@pytest.mark.parametrize("now, delay", [
+    (ny(2025, 11, 25, 10, 0), 30),  # trading
+    (ny(2025, 11, 25, 21, 0), 300),  # closed, next open hours away
+    (ny(2025, 11, 26, 3, 58), 120),  # closed, wakes up for the pre-market open
+    (ny(2025, 11, 26, 3, 59, 59, 900000), 1.0),  # never busy-loops
+])
+def test_next_refresh_delay(now, delay):
+    assert cache_fetched_at({}).next_refresh_delay(now.timestamp()) == pytest.approx(delay)
+
+def test_reads_count_hits_without_a_calendar_lookup(monkeypatch):
+    lookups = []
+
+    def counting_session_at(now):
+        lookups.append(now)
+        return session_at(now)
+
+    async def fetch():
+        return None
+
+    async def scenario():
+        cache = MarketCache(fetchers={name: fetch for name in TTLS}, ttls=TTLS, session_ttls=SESSION_TTLS)
+        await cache.refresh()
+        refresh_lookups = len(lookups)
+        for _ in range(10):
+            await cache.get_snapshot()
+        return cache, refresh_lookups
+
+    monkeypatch.setattr(market_cache, "session_at", counting_session_at)
+    cache, refresh_lookups = asyncio.run(scenario())
+    assert len(lookups) == refresh_lookups
+    assert (cache.hits, cache.misses) == (10, 0)
@@ -0,0 +1,12 @@
+from metrics import Metrics, PREFIX
+
+def test_collector_counters_are_exported_as_counters():
+    metrics = Metrics()
+    metrics.add_collector("charts", lambda: {"entries": 3, "hits": 7, "label": "x"}, counters=("hits",))
+    lines = metrics.render().splitlines()
+
+    assert f"# TYPE {PREFIX}_charts_hits_total counter" in lines
+    assert f"{PREFIX}_charts_hits_total 7" in lines
+    assert f"# TYPE {PREFIX}_charts_entries gauge" in lines
+    assert f"{PREFIX}_charts_entries 3" in lines
+    assert not any("label" in line for line in lines)
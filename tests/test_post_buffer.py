@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+from post_buffer import TeslaPostBuffer
+
+CHANNEL = SimpleNamespace(id=7)
+
+def post(message_id, content):
+    return SimpleNamespace(id=message_id, channel=CHANNEL, content=content)
+
+def make_buffer(size=3):
+    return TeslaPostBuffer(lambda message: (message.content, ()) if message.content else None,
+                           channel_id=CHANNEL.id, size=size)
+
+def test_edit_inserts_a_post_that_arrived_empty():
+    buffer = make_buffer()
+    buffer.add(post(1, "post 1"))
+    buffer.add(post(2, ""))
+    buffer.add(post(3, "post 3"))
+    assert len(buffer) == 2
+
+    buffer.edit(post(2, "post 2"))
+    assert buffer.render() == "Newest Tesla Posts:\npost 3\npost 2\npost 1"
+
+def test_edit_of_a_post_older_than_a_full_buffer_is_ignored():
+    buffer = make_buffer(size=2)
+    for message_id in (2, 3):
+        buffer.add(post(message_id, f"post {message_id}"))
+    version = buffer.version
+
+    buffer.edit(post(1, "post 1"))
+    assert buffer.render() == "Newest Tesla Posts:\npost 3\npost 2"
+    assert buffer.version == version
+
+def test_edit_that_empties_a_post_removes_it():
+    buffer = make_buffer()
+    buffer.add(post(1, "post 1"))
+    buffer.edit(post(1, ""))
+    assert len(buffer) == 0
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+import price_store
+from indicators import compute_indicators
+from price_store import PriceStore
+from utils import calculate_rsi
+
+def bars(start, count, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=count)
+    close = 200 + np.cumsum(rng.normal(0, 4, count))
+    return pd.DataFrame({
+        "Open": close - 1, "High": close + 3, "Low": close - 3, "Close": close,
+        "Volume": rng.integers(1_000_000, 5_000_000, count).astype(float),
+        "Dividends": 0.0, "Stock Splits": 0.0,
+    }, index=index)
+
+class FakeTicker:
+    """Serves `history` like yfinance: everything for period="max", else the bars from `start`."""
+    history_frame = None
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, period=None, start=None):
+        frame = FakeTicker.history_frame
+        return frame if start is None else frame[frame.index >= start]
+
+@pytest.fixture
+def fake_yfinance(monkeypatch):
+    monkeypatch.setattr(price_store.yf, "Ticker", FakeTicker)
+    return FakeTicker
+
+def reference(frame):
+    """Indicators recomputed over the whole history, the way data_fetcher used to."""
+    values = compute_indicators(frame["Close"].to_numpy(), frame["High"].to_numpy(), frame["Low"].to_numpy())
+    return {name: series[-1] for name, series in values.items()}
+
+def assert_matches(store, frame):
+    expected = reference(frame)
+    for name, value in expected.items():
+        assert store.indicators[name] == pytest.approx(value, rel=1e-9), name
+    assert store.indicators["rsi"] == pytest.approx(calculate_rsi(store.window_frame()["Close"]).iloc[-1], rel=1e-9)
+
+def test_incremental_indicators_match_a_full_recompute(tmp_path, fake_yfinance):
+    history = bars("2025-01-02", 120)
+    fake_yfinance.history_frame = history.iloc[:100]
+    store = PriceStore("TSLA", directory=str(tmp_path))
+    store.update()
+    assert_matches(store, history.iloc[:100])
+
+    # The newest bar is still forming: its close changes, then new bars arrive
+    forming = history.iloc[:100].copy()
+    forming.iloc[-1, forming.columns.get_loc("Close")] += 5
+    fake_yfinance.history_frame = forming
+    store.update()
+    assert_matches(store, forming)
+
+    fake_yfinance.history_frame = history
+    store.update()
+    assert_matches(store, history)
+
+def test_cold_start_seeds_indicators_from_disk(tmp_path, fake_yfinance):
+    history = bars("2025-01-02", 80, seed=1)
+    fake_yfinance.history_frame = history
+    PriceStore("SPY", directory=str(tmp_path)).update()
+
+    reopened = PriceStore("SPY", directory=str(tmp_path))
+    assert_matches(reopened, history)
+
+def test_nan_bars_are_not_stored(tmp_path, fake_yfinance):
+    history = bars("2025-01-02", 60, seed=2)
+    holiday = history.index[30]
+    with_gap = history.copy()
+    with_gap.loc[holiday, ["Open", "High", "Low", "Close", "Volume"]] = np.nan
+    fake_yfinance.history_frame = with_gap
+    PriceStore("^VIX", directory=str(tmp_path)).update()
+
+    # Reopening replays the stored bars through the indicators
+    reopened = PriceStore("^VIX", directory=str(tmp_path))
+    assert len(reopened) == 59
+    assert holiday not in reopened.frame().index
+    assert_matches(reopened, history.drop(holiday))
+
+def test_all_time_high_follows_incremental_updates(tmp_path, fake_yfinance):
+    history = bars("2025-01-02", 80, seed=3)
+    fake_yfinance.history_frame = history.iloc[:60]
+    store = PriceStore("SPY", directory=str(tmp_path))
+    store.update()
+    assert store.ath == pytest.approx(history["High"].iloc[:60].max())
+
+    rally = history.copy()
+    rally.iloc[70, rally.columns.get_loc("High")] = history["High"].max() + 50
+    fake_yfinance.history_frame = rally
+    store.update()
+    assert store.ath == pytest.approx(history["High"].max() + 50)
+    assert PriceStore("SPY", directory=str(tmp_path)).ath == store.ath
+
+def test_split_rebuilds_the_adjusted_history(tmp_path, fake_yfinance):
+    history = bars("2025-01-02", 80, seed=4)
+    fake_yfinance.history_frame = history.iloc[:60]
+    store = PriceStore("TSLA", directory=str(tmp_path))
+    store.update()
+    version = store.version
+
+    # A 2:1 split: yfinance halves every earlier bar and reports the split on its date
+    adjusted = history.copy()
+    adjusted[["Open", "High", "Low", "Close"]] /= 2
+    adjusted.iloc[70, adjusted.columns.get_loc("Stock Splits")] = 2.0
+    fake_yfinance.history_frame = adjusted
+    store.update()
+
+    assert len(store) == 80
+    pd.testing.assert_series_equal(store.frame()["Close"], adjusted["Close"], check_names=False, check_freq=False)
+    assert store.ath == pytest.approx(adjusted["High"].max())
+    assert store.version > version
+    assert_matches(store, adjusted)
+
+    # The split is recorded, so the next update is incremental again
+    fake_yfinance.history_frame = adjusted
+    assert store.update() == 1
@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from scheduler import GrokScheduler, SchedulerBusy
+
+async def hold(scheduler, user_id, guild_id, order, release):
+    """Take a slot, record who got it, and keep it until `release` is set."""
+    async with scheduler.slot(user_id, guild_id):
+        order.append((guild_id, user_id))
+        await release.wait()
+
+async def served_in_order(scheduler, requests):
+    """Queue `requests` behind a held slot and return the order they are admitted in."""
+    order = []
+    release = asyncio.Event()
+    release.set()
+    blocker = asyncio.Event()
+    holder = asyncio.ensure_future(hold(scheduler, "holder", "holder", [], blocker))
+    await asyncio.sleep(0)
+    tasks = []
+    for guild_id, user_id in requests:
+        tasks.append(asyncio.ensure_future(hold(scheduler, user_id, guild_id, order, release)))
+        await asyncio.sleep(0)
+    blocker.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+def test_guilds_are_served_round_robin():
+    async def scenario():
+        scheduler = GrokScheduler(max_concurrent=1, max_queue=10, max_queued_per_user=5, deadline=5)
+        order = await served_in_order(scheduler, [("a", 1), ("a", 1), ("a", 1), ("b", 2)])
+        return scheduler, order
+
+    scheduler, order = asyncio.run(scenario())
+    assert order == [("a", 1), ("b", 2), ("a", 1), ("a", 1)]
+    assert scheduler.stats()["active"] == 0
+    assert scheduler.stats()["queued"] == 0
+
+def test_users_within_a_guild_are_served_round_robin():
+    async def scenario():
+        scheduler = GrokScheduler(max_concurrent=1, max_queue=10, max_queued_per_user=5, deadline=5)
+        return await served_in_order(scheduler, [("a", 1), ("a", 1), ("a", 2), ("a", 3)])
+
+    assert asyncio.run(scenario()) == [("a", 1), ("a", 2), ("a", 3), ("a", 1)]
+
+def test_per_user_cap_sheds_excess_requests():
+    async def scenario():
+        scheduler = GrokScheduler(max_concurrent=1, max_queue=10, max_queued_per_user=2, deadline=5)
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(hold(scheduler, 1, "a", [], release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # One running and two queued; another user is still admitted to the queue
+        with pytest.raises(SchedulerBusy):
+            await hold(scheduler, 1, "a", [], release)
+        other = asyncio.ensure_future(hold(scheduler, 2, "a", [], release))
+        await asyncio.sleep(0)
+        stats = scheduler.stats()
+        release.set()
+        await asyncio.gather(*tasks, other)
+        return scheduler, stats
+
+    scheduler, stats = asyncio.run(scenario())
+    assert stats["queued"] == 3
+    assert scheduler.shed == 1
+    assert scheduler.admitted == 4
+
+def test_full_queue_sheds_requests():
+    async def scenario():
+        scheduler = GrokScheduler(max_concurrent=1, max_queue=1, max_queued_per_user=5, deadline=5)
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(hold(scheduler, user_id, "a", [], release)) for user_id in (1, 2)]
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy):
+            await hold(scheduler, 3, "b", [], release)
+        release.set()
+        await asyncio.gather(*tasks)
+        return scheduler
+
+    assert asyncio.run(scenario()).shed == 1
+
+def test_deadline_expiry_raises_and_frees_the_queue_entry():
+    async def scenario():
+        scheduler = GrokScheduler(max_concurrent=1, max_queue=10, max_queued_per_user=5, deadline=0.01)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(scheduler, 1, "a", [], release))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy):
+            await hold(scheduler, 2, "a", [], release)
+        queued = scheduler.stats()["queued"]
+        release.set()
+        await holder
+        # The slot is free again, so the next request is admitted at once
+        await hold(scheduler, 2, "a", [], release)
+        return scheduler, queued
+
+    scheduler, queued = asyncio.run(scenario())
+    assert queued == 0
+    assert scheduler.expired == 1
+    assert scheduler.stats()["active"] == 0
+
+def test_slot_granted_to_a_cancelled_waiter_goes_to_the_next_one():
+    async def scenario():
+        scheduler = GrokScheduler(max_concurrent=1, max_queue=10, max_queued_per_user=5, deadline=5)
+        order = []
+        blocker, release = asyncio.Event(), asyncio.Event()
+        release.set()
+        async with scheduler.slot(1, "a"):
+            leaving = asyncio.ensure_future(hold(scheduler, 2, "a", order, release))
+            next_waiter = asyncio.ensure_future(hold(scheduler, 3, "b", order, blocker))
+            await asyncio.sleep(0)
+        # The slot was handed to `leaving`, which is cancelled before it wakes up
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        await asyncio.sleep(0)
+        active = scheduler.stats()["active"]
+        blocker.set()
+        await next_waiter
+        return scheduler, order, active
+
+    scheduler, order, active = asyncio.run(scenario())
+    assert order == [("b", 3)]
+    assert active == 1
+    assert scheduler.stats()["active"] == 0
+    assert scheduler.stats()["queued"] == 0
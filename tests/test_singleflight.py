@@ -0,0 +1,217 @@
+import asyncio
+import pytest
+from singleflight import SingleFlight
+
+N = 20
+
+class Upstream:
+    """Counts calls and holds each one open until released."""
+
+    def __init__(self, result="answer", error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def test_concurrent_callers_share_one_upstream_call():
+    async def scenario():
+        flights = SingleFlight()
+        upstream = Upstream()
+        tasks = [asyncio.ensure_future(flights.do(("message", 1, 2), upstream)) for _ in range(N)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*tasks)
+        return flights, upstream, results
+
+    flights, upstream, results = asyncio.run(scenario())
+    assert upstream.calls == 1
+    assert results == ["answer"] * N
+    assert flights.stats() == {"message": {"executions": 1, "coalesced": N - 1}}
+    assert flights.in_flight() == 0
+
+def test_exception_reaches_every_caller():
+    async def scenario():
+        flights = SingleFlight()
+        upstream = Upstream(error=RuntimeError("upstream down"))
+        tasks = [asyncio.ensure_future(flights.do(("news",), upstream)) for _ in range(N)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return upstream, await asyncio.gather(*tasks, return_exceptions=True)
+
+    upstream, results = asyncio.run(scenario())
+    assert upstream.calls == 1
+    assert len(results) == N
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+        upstream = Upstream()
+        leaving = asyncio.ensure_future(flights.do(("message", 1, 2), upstream))
+        staying = asyncio.ensure_future(flights.do(("message", 1, 2), upstream))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        result = await staying
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return upstream, result
+
+    upstream, result = asyncio.run(scenario())
+    assert result == "answer"
+    assert upstream.calls == 1
+    assert not upstream.cancelled
+
+def test_last_caller_leaving_cancels_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+        upstream = Upstream()
+        task = asyncio.ensure_future(flights.do(("message", 1, 2), upstream))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        return flights, upstream
+
+    flights, upstream = asyncio.run(scenario())
+    assert upstream.cancelled
+    assert flights.in_flight() == 0
+
+def test_caller_arriving_after_cancellation_starts_a_new_call():
+    async def scenario():
+        flights = SingleFlight()
+        upstream = Upstream()
+        leaving = asyncio.ensure_future(flights.do(("message", 1, 2), upstream))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        # The shared call is cancelled but has not finished unwinding yet
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return upstream, await flights.do(("message", 1, 2), upstream)
+
+    upstream, result = asyncio.run(scenario())
+    assert result == "answer"
+    assert upstream.calls == 2
+
+def test_new_call_after_completion_goes_upstream_again():
+    async def scenario():
+        flights = SingleFlight()
+        upstream = Upstream()
+        upstream.release.set()
+        await flights.do(("news",), upstream)
+        await flights.do(("news",), upstream)
+        return upstream
+
+    assert asyncio.run(scenario()).calls == 2
+
+def test_concurrent_mentions_fetch_a_referenced_message_once():
+    from context_builder import fetch_message_once
+
+    class Channel:
+        id = 5
+        fetches = 0
+
+        async def fetch_message(self, message_id):
+            self.fetches += 1
+            await asyncio.sleep(0.01)
+            return f"message {message_id}"
+
+    async def scenario():
+        channel = Channel()
+        results = await asyncio.gather(*(fetch_message_once(channel, 42) for _ in range(N)))
+        return channel, results
+
+    channel, results = asyncio.run(scenario())
+    assert channel.fetches == 1
+    assert results == ["message 42"] * N
+
+def test_concurrent_cold_mentions_refresh_market_data_once():
+    from market_cache import MarketCache
+
+    calls = {}
+
+    def counting(name):
+        async def fetch():
+            calls[name] = calls.get(name, 0) + 1
+            await asyncio.sleep(0.01)
+            return None
+        return fetch
+
+    async def scenario():
+        cache = MarketCache(fetchers={name: counting(name) for name in ("quote", "history", "earnings", "news")})
+        return await asyncio.gather(*(cache.get_snapshot() for _ in range(N)))
+
+    snapshots = asyncio.run(scenario())
+    assert calls == {"quote": 1, "history": 1, "earnings": 1, "news": 1}
+    assert len({snapshot.version for snapshot in snapshots}) == 1
+
+def test_concurrent_mentions_before_on_ready_seed_the_post_buffer_once():
+    from types import SimpleNamespace
+    from post_buffer import TeslaPostBuffer
+
+    class Channel:
+        id = 7
+        reads = 0
+
+        async def history(self, limit):
+            self.reads += 1
+            await asyncio.sleep(0.01)
+            for i in range(limit, 0, -1):
+                yield SimpleNamespace(id=i, channel=self, content=f"post {i}")
+
+    channel = Channel()
+    client = SimpleNamespace(get_channel=lambda channel_id: channel)
+    buffer = TeslaPostBuffer(lambda message: (message.content, ()), channel_id=channel.id, size=3)
+
+    async def scenario():
+        return await asyncio.gather(*(buffer.get_text(client) for _ in range(N)))
+
+    texts = asyncio.run(scenario())
+    assert channel.reads == 1
+    assert len(buffer) == 3
+    assert set(texts) == {"Newest Tesla Posts:\npost 3\npost 2\npost 1"}
+
+def test_concurrent_mentions_download_an_image_once():
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from http_client import http_client
+    from image_cache import ImageCache
+
+    requests = []
+
+    async def image(request):
+        requests.append(request.path)
+        await asyncio.sleep(0.01)
+        return web.Response(body=b"\x89PNG fake", headers={"ETag": '"v1"'})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/chart.png", image)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            cache = ImageCache()
+            url = str(server.make_url("/chart.png"))
+            return cache, await asyncio.gather(*(cache.get(url) for _ in range(N)))
+        finally:
+            await http_client.close()
+            await server.close()
+
+    cache, images = asyncio.run(scenario())
+    assert requests == ["/chart.png"]
+    assert images == [b"\x89PNG fake"] * N
+    assert cache.stats()["downloads"] == 1
@@ -0,0 +1,152 @@
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+import discord
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import grok_api
+from grok_api import INTERRUPTED_NOTE, stream_grok, usage_stats
+from http_client import http_client
+from metrics import metrics
+from streaming import StreamingReply
+
+CHUNKS = ["TSLA ", "is ", "up ", "3%."]
+USAGE = {"prompt_tokens": 1200, "completion_tokens": 40, "prompt_tokens_details": {"cached_tokens": 1024}}
+
+def sse(data):
+    return f"data: {data}\n\n".encode("utf-8")
+
+class GrokStandIn:
+    """Local SSE server speaking the chat completions streaming format."""
+
+    def __init__(self, drop_after=None, disconnect_first=0):
+        self.drop_after = drop_after
+        self.disconnect_first = disconnect_first
+        self.requests = []
+
+    async def handle(self, request):
+        self.requests.append(await request.json())
+        if len(self.requests) <= self.disconnect_first:
+            request.transport.close()
+            return web.Response()
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, chunk in enumerate(CHUNKS):
+            if i == self.drop_after:
+                request.transport.close()
+                return response
+            await response.write(sse(json.dumps({"choices": [{"delta": {"content": chunk}}]})))
+        await response.write(sse(json.dumps({"choices": [], "usage": USAGE})))
+        await response.write(sse("[DONE]"))
+        return response
+
+@pytest.fixture
+def grok_server(monkeypatch):
+    monkeypatch.setattr(grok_api, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_api.prompt_loader, "get", lambda: "You are a Tesla market bot.")
+
+    def run(stand_in):
+        async def scenario():
+            app = web.Application()
+            app.router.add_post("/v1/chat/completions", stand_in.handle)
+            server = TestServer(app)
+            await server.start_server()
+            monkeypatch.setattr(grok_api, "GROK_API_URL", str(server.make_url("/v1/chat/completions")))
+            try:
+                return [chunk async for chunk in stream_grok("How is TSLA doing?", "market data", "posts")]
+            finally:
+                await http_client.close()
+                await server.close()
+        return asyncio.run(scenario())
+    return run
+
+def first_token_count():
+    prefix = 'hyperbullish_stage_seconds_count{stage="grok_first_token"} '
+    return next((int(line[len(prefix):]) for line in metrics.render().splitlines() if line.startswith(prefix)), 0)
+
+def test_stream_yields_deltas_and_records_cached_tokens(grok_server):
+    cached_before = usage_stats.cached_tokens
+    first_tokens_before = first_token_count()
+    stand_in = GrokStandIn()
+    chunks = grok_server(stand_in)
+    assert chunks == CHUNKS
+    assert usage_stats.cached_tokens - cached_before == 1024
+    assert first_token_count() - first_tokens_before == 1
+    assert stand_in.requests[0]["stream"] is True
+
+def test_stream_dropped_midway_ends_with_interruption_note(grok_server):
+    stand_in = GrokStandIn(drop_after=2)
+    chunks = grok_server(stand_in)
+    assert chunks == CHUNKS[:2] + [INTERRUPTED_NOTE]
+    assert len(stand_in.requests) == 1
+
+def test_failure_before_first_chunk_is_retried(grok_server):
+    stand_in = GrokStandIn(disconnect_first=1)
+    chunks = grok_server(stand_in)
+    assert chunks == CHUNKS
+    assert len(stand_in.requests) == 2
+
+class FakeMessage:
+    def __init__(self, fail_attachments=False):
+        self.edits = []
+        self.fail_attachments = fail_attachments
+
+    async def edit(self, content=None, attachments=None):
+        if attachments and self.fail_attachments:
+            raise discord.errors.HTTPException(SimpleNamespace(status=413, reason="Payload Too Large"), "too large")
+        self.edits.append(content)
+
+class FakeChannel:
+    def __init__(self, message=None):
+        self.message = message or FakeMessage()
+        self.sent = []
+
+    async def send(self, content=None, files=None):
+        self.sent.append((content, files))
+        return self.message
+
+async def stream_into(reply, chunks):
+    for chunk in chunks:
+        await reply.feed(chunk)
+
+def test_reply_throttles_edits_and_marks_complete():
+    channel = FakeChannel()
+    reply = StreamingReply(channel, edit_interval=60)
+
+    async def scenario():
+        await stream_into(reply, CHUNKS)
+        return await reply.finish()
+
+    final = asyncio.run(scenario())
+    assert final == "".join(CHUNKS)
+    assert len(channel.sent) == 1  # the first chunk; later ones wait for the throttle
+    assert channel.message.edits == [final]
+    assert reply.complete
+
+@pytest.mark.parametrize("chunks", [[], ["TSLA ", INTERRUPTED_NOTE], ["Error: API request failed with status 500"]])
+def test_reply_is_incomplete_for_empty_interrupted_or_failed_streams(chunks):
+    reply = StreamingReply(FakeChannel(), edit_interval=0)
+
+    async def scenario():
+        await stream_into(reply, chunks)
+        await reply.finish()
+
+    asyncio.run(scenario())
+    assert not reply.complete
+
+def test_failed_attachment_edit_sends_files_separately():
+    channel = FakeChannel(FakeMessage(fail_attachments=True))
+    reply = StreamingReply(channel, edit_interval=60)
+    files = [discord.File(io.BytesIO(b"png"), filename="tsla_3mo.png")]
+
+    async def scenario():
+        await stream_into(reply, CHUNKS)
+        final = await reply.finish()
+        await reply.attach(files)
+        return final
+
+    final = asyncio.run(scenario())
+    assert channel.message.edits == [final]
+    assert channel.sent[-1] == (None, files)
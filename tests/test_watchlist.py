@@ -0,0 +1,18 @@
+import pytest
+from watchlist import extract_tickers
+
+@pytest.mark.parametrize("query, tickers", [
+    ("How do $NVDA and $lcid compare?", ["NVDA", "LCID"]),
+    ("Is NVDA or Rivian the better buy?", ["NVDA", "RIVN"]),
+    ("nvidia vs microsoft", ["NVDA", "MSFT"]),
+    # Names that are also ordinary words need capitals or a $
+    ("An apple a day, a lucid answer please", []),
+    ("I'll google it on amazon", []),
+    ("Compare APPLE and $google", ["AAPL", "GOOGL"]),
+    ("How is $Lucid doing?", ["LCID"]),
+    # Whole words only, and TSLA is covered by the main market data
+    ("pineapples and nvidias for TSLA", []),
+    ("Is nvda up today?", []),
+])
+def test_extract_tickers(query, tickers):
+    assert extract_tickers(query, known={"NVDA", "QQQ"}) == tickers
@@ -1,16 +1,19 @@
 import pandas as pd
 
-def calculate_rsi(prices):
+def calculate_rsi(prices, periods=14):
     """
     Calculate the Relative Strength Index (RSI) for a series of prices.
+    This is the pandas reference; indicators.RSIState and indicators.compute_indicators
+    produce the same values incrementally and for many tickers at once.
     Args:
         prices (pd.Series): Series of closing prices.
+        periods (int): Lookback length.
     Returns:
         pd.Series: RSI values.
     """
     delta = prices.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    gain = (delta.where(delta > 0, 0)).rolling(window=periods).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=periods).mean()
     rs = gain / loss
     rsi = 100 - (100 / (1 + rs))
     return rsi
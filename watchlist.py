@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+import numpy as np
+import yfinance as yf
+from config import (
+    CEST, WATCHLIST_DEFAULT, WATCHLIST_TTL, WATCHLIST_PERIOD, WATCHLIST_MAX_SYMBOLS, WATCHLIST_MAX_ENTRIES,
+    WATCHLIST_DEADLINE,
+)
+from data_fetcher import run_blocking
+from indicators import compute_indicators
+from market_hours import session_at, CLOSED
+from metrics import metrics
+from singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+WATCHLIST_HEADER = "Watchlist (daily bars):"
+
+# Company names users write instead of the ticker
+TICKER_ALIASES = {
+    "NVIDIA": "NVDA",
+    "BYD": "BYDDY",
+    "APPLE": "AAPL",
+    "MICROSOFT": "MSFT",
+    "GOOGLE": "GOOGL",
+    "AMAZON": "AMZN",
+    "RIVIAN": "RIVN",
+    "LUCID": "LCID",
+    "PANASONIC": "PCRFY",
+    "ALBEMARLE": "ALB",
+    "NASDAQ": "QQQ",
+}
+# Names that are also ordinary words; they only count written in capitals or as a $cashtag
+AMBIGUOUS_ALIASES = {"APPLE", "AMAZON", "GOOGLE", "LUCID"}
+# Tickers already covered by the main market data
+EXCLUDED_SYMBOLS = {"TSLA"}
+# Fewer bars than this and a ticker gets a price but no indicators (MACD needs 26 + 9)
+MIN_INDICATOR_BARS = 35
+
+_CASHTAG_RE = re.compile(r"\$([A-Za-z]{1,5}(?:[.-][A-Za-z]{1,2})?)\b")
+_WORD_RE = re.compile(r"\b[A-Za-z]{2,10}\b")
+
+def extract_tickers(query, known=None):
+    """
+    Return the tickers a query mentions, in order: $cashtags, known tickers written in
+    capitals (e.g. "NVDA") and company names from TICKER_ALIASES as whole words (any case,
+    except AMBIGUOUS_ALIASES, which need capitals or a $).
+    """
+    known = set(WATCHLIST_DEFAULT) | set(TICKER_ALIASES.values()) if known is None else known
+    found = [TICKER_ALIASES.get(tag.upper(), tag.upper()) for tag in _CASHTAG_RE.findall(query)]
+    for match in _WORD_RE.finditer(query):
+        word, name = match.group(), match.group().upper()
+        if word.isupper() and word in known:
+            found.append(word)
+        elif name in TICKER_ALIASES and (
+            word.isupper() or name not in AMBIGUOUS_ALIASES or query[match.start() - 1:match.start()] == "$"
+        ):
+            found.append(TICKER_ALIASES[name])
+    return [symbol for symbol in dict.fromkeys(found) if symbol not in EXCLUDED_SYMBOLS]
+
+class WatchlistEntry:
+    """Latest daily price, change and indicator values of one ticker."""
+    __slots__ = ("symbol", "fetched_at", "price", "change_pct", "indicators")
+
+    def __init__(self, symbol, fetched_at, price=None, change_pct=None, indicators=None):
+        self.symbol = symbol
+        self.fetched_at = fetched_at
+        self.price = price
+        self.change_pct = change_pct
+        self.indicators = indicators or {}
+
+    def render(self):
+        if self.price is None:
+            return f"{self.symbol}: no data available"
+        line = f"{self.symbol}: ${self.price:.2f}"
+        if self.change_pct is not None:
+            line += f" ({self.change_pct:+.2f}%)"
+        values = self.indicators
+        if values:
+            line += (
+                f", 14-day RSI: {values['rsi']:.2f}, MACD histogram: {values['macd_hist']:.2f}, "
+                f"Bollinger: ${values['bb_lower']:.2f}-${values['bb_upper']:.2f}, 14-day ATR: {values['atr']:.2f}"
+            )
+        return line
+
+def download_watchlist(symbols, period=WATCHLIST_PERIOD):
+    """
+    Download daily bars for all symbols in one yf.download call and compute their indicators
+    in one vectorized pass. Blocking; call it from the fetch executor.
+    Returns:
+        dict: Symbol -> WatchlistEntry (entries without data have price None).
+    """
+    data = yf.download(list(symbols), period=period, interval="1d", group_by="column",
+                       auto_adjust=False, progress=False, threads=True)
+    fetched_at = time.time()
+    entries = {symbol: WatchlistEntry(symbol, fetched_at) for symbol in symbols}
+    if data is None or data.empty:
+        return entries
+
+    # Holidays differ between exchanges; carry the last close over missing days
+    closes = data["Close"].reindex(columns=list(symbols)).ffill()
+    highs = data["High"].reindex(columns=list(symbols)).fillna(closes)
+    lows = data["Low"].reindex(columns=list(symbols)).fillna(closes)
+
+    eligible = []
+    for symbol in symbols:
+        series = closes[symbol].dropna()
+        if series.empty:
+            continue
+        entry = entries[symbol]
+        entry.price = float(series.iloc[-1])
+        if len(series) > 1:
+            entry.change_pct = (series.iloc[-1] / series.iloc[-2] - 1) * 100
+        if len(series) >= MIN_INDICATOR_BARS:
+            eligible.append(symbol)
+
+    if eligible:
+        # Common window in which every eligible ticker has bars
+        window = min(closes[symbol].notna().sum() for symbol in eligible)
+        frame = slice(len(closes) - window, None)
+        values = compute_indicators(
+            closes[eligible].to_numpy().T[:, frame],
+            highs[eligible].to_numpy().T[:, frame],
+            lows[eligible].to_numpy().T[:, frame],
+        )
+        for row, symbol in enumerate(eligible):
+            latest = {name: float(series[row, -1]) for name, series in values.items()}
+            if not any(np.isnan(value) for value in latest.values()):
+                entries[symbol].indicators = latest
+    return entries
+
+class Watchlist:
+    """
+    Per-symbol cache of watchlist data.
+    The default tickers are refreshed by the market cache's background task (refresh_defaults),
+    so mentions normally render them from memory. Tickers a query mentions that are not cached
+    yet, or have expired, are fetched together in one batched download that a mention waits
+    for at most `deadline` seconds; if it takes longer the answer goes out without them and
+    they are cached for the next question. Entries expire after `ttl` seconds while NYSE
+    trades and are kept through closed periods once they were fetched after the close.
+    Args:
+        default (tuple): Tickers always included.
+        ttl (float): Seconds an entry is served while the market is open.
+        max_symbols (int): Most tickers rendered per query.
+        max_entries (int): Most mentioned (non-default) tickers kept, least recently used first out.
+        deadline (float): Seconds a mention waits for tickers that are not cached.
+    """
+
+    def __init__(self, default=WATCHLIST_DEFAULT, ttl=WATCHLIST_TTL, max_symbols=WATCHLIST_MAX_SYMBOLS,
+                 max_entries=WATCHLIST_MAX_ENTRIES, deadline=WATCHLIST_DEADLINE):
+        self.default = tuple(default)
+        self.ttl = ttl
+        self.max_symbols = max_symbols
+        self.max_entries = max_entries
+        self.deadline = deadline
+        self._entries = OrderedDict()  # symbol -> WatchlistEntry, least recently used first
+        # Bumped when the default tickers are re-downloaded; part of the answer-cache context
+        self.version = 0
+        self.hits = 0
+        self.late = 0
+        self.batches = 0
+        self.symbols_downloaded = 0
+        self.failures = 0
+
+    def symbols_for(self, query):
+        """Tickers mentioned in the query first, then the default set, capped at max_symbols."""
+        symbols = list(dict.fromkeys(extract_tickers(query) + list(self.default)))
+        return symbols[:self.max_symbols]
+
+    def _expired(self, entry, now):
+        session, session_start, _ = session_at(datetime.fromtimestamp(now, timezone.utc))
+        if session_start is not None and entry.fetched_at < session_start.timestamp():
+            return True
+        return session != CLOSED and now - entry.fetched_at >= self.ttl
+
+    def _stale(self, symbols, now):
+        return [s for s in symbols if s not in self._entries or self._expired(self._entries[s], now)]
+
+    async def refresh_defaults(self):
+        """Download the default tickers if they have expired. Run by the market cache's background task."""
+        stale = self._stale(self.default, time.time())
+        if stale:
+            await self._download_once(stale)
+
+    async def _download_once(self, symbols):
+        # Mentions asking for the same missing tickers at once share one download
+        await flights.do(("watchlist",) + tuple(sorted(symbols)), self._download, symbols)
+
+    async def _download(self, symbols):
+        try:
+            entries = await run_blocking(download_watchlist, symbols)
+        except Exception as e:
+            metrics.upstream("yfinance", False)
+            self.failures += 1
+            logger.error("Failed to download watchlist %s: %s: %s", ', '.join(symbols), type(e).__name__, e)
+            return
+        metrics.upstream("yfinance", True)
+        self.batches += 1
+        self.symbols_downloaded += len(symbols)
+        for symbol, entry in entries.items():
+            self._entries[symbol] = entry
+            self._entries.move_to_end(symbol)
+        if any(symbol in self.default for symbol in symbols):
+            self.version += 1
+        self._evict()
+
+    def _evict(self):
+        extra = len(self._entries) - len(self.default) - self.max_entries
+        for symbol in [s for s in self._entries if s not in self.default][:max(extra, 0)]:
+            del self._entries[symbol]
+
+    async def get(self, symbols):
+        """
+        Return the cached WatchlistEntry of each symbol. Mentioned tickers (and defaults the
+        background task has not fetched yet) that are missing or expired are downloaded in one
+        batch, waited for at most `deadline` seconds. Expired defaults are served as they are.
+        """
+        now = time.time()
+        wanted = [s for s in symbols if s not in self.default or s not in self._entries]
+        stale = self._stale(wanted, now)
+        if not stale:
+            self.hits += 1
+        else:
+            download = asyncio.ensure_future(self._download_once(stale))
+            # Not cancelled on timeout: the download finishes in the background and fills the cache
+            done, _ = await asyncio.wait({download}, timeout=self.deadline)
+            if not done:
+                self.late += 1
+                logger.debug("Answering without watchlist %s: not downloaded within %ss", ", ".join(stale), self.deadline)
+        entries = []
+        for symbol in symbols:
+            if symbol in self._entries:
+                self._entries.move_to_end(symbol)
+                entries.append(self._entries[symbol])
+        return entries
+
+    async def get_text(self, query):
+        """
+        Return the watchlist block for a query and the version of the mentioned tickers in it.
+        Returns:
+            tuple: (text or "" if there is nothing to show, tuple of (symbol, fetched_at) for the
+                rendered non-default tickers). The defaults are versioned by `version`.
+        """
+        symbols = self.symbols_for(query)
+        entries = await self.get(symbols) if symbols else []
+        if not entries:
+            return "", ()
+        as_of = datetime.fromtimestamp(min(entry.fetched_at for entry in entries), CEST).strftime("%Y-%m-%d %H:%M")
+        lines = [entry.render() for entry in entries]
+        text = f"{WATCHLIST_HEADER}\n" + "\n".join(lines) + f"\nWatchlist data as of: {as_of} CEST"
+        mentioned = tuple((entry.symbol, entry.fetched_at) for entry in entries if entry.symbol not in self.default)
+        return text, mentioned
+
+    def stats(self):
+        """Return cache size and batching counters."""
+        return {
+            "symbols_cached": len(self._entries),
+            "hits": self.hits,
+            "late": self.late,
+            "batches": self.batches,
+            "symbols_downloaded": self.symbols_downloaded,
+            "failures": self.failures,
+            "version": self.version,
+        }
+
+watchlist = Watchlist()